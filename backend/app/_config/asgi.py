@@ -11,6 +11,17 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', '_config.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.DEBUG:
+    # uvicorn does not serve static files itself; runserver did this in development
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler  # noqa: E402
+    application = ASGIStaticFilesHandler(application)
+
+# build the in-process search indexes once the app registry is ready
+from search.indexes import warm_indexes_in_background  # noqa: E402
+warm_indexes_in_background()
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
     'knox',
     'mock',
     'chatbot',
+    'search',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -209,6 +210,87 @@ EMAIL_HOST_PASSWORD = 'hohx auae gpkv fwxq'
 # Site URL for email invitations
 SITE_URL = os.environ.get('SITE_URL', 'http://localhost:3000')
 
+# Real-time action plan edits are coalesced per plan and written at most once per this many ms
+ACTION_PLAN_EDIT_FLUSH_MS = int(os.environ.get('ACTION_PLAN_EDIT_FLUSH_MS', '500'))
+
+# Google Docs create/update/share calls are queued and run by `manage.py run_google_docs_worker`;
+# a failed job is retried after BACKOFF * 2^(attempt-1) seconds (up to MAX_BACKOFF), MAX_ATTEMPTS times
+GOOGLE_DOCS_JOB_MAX_ATTEMPTS = int(os.environ.get('GOOGLE_DOCS_JOB_MAX_ATTEMPTS', '5'))
+GOOGLE_DOCS_JOB_BACKOFF = float(os.environ.get('GOOGLE_DOCS_JOB_BACKOFF', '30'))
+GOOGLE_DOCS_JOB_MAX_BACKOFF = float(os.environ.get('GOOGLE_DOCS_JOB_MAX_BACKOFF', '3600'))
+# a job still marked running after this many seconds is assumed lost and run again
+GOOGLE_DOCS_JOB_LOCK_TIMEOUT = int(os.environ.get('GOOGLE_DOCS_JOB_LOCK_TIMEOUT', '600'))
+
 # OpenAI Configuration
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
-OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
\ No newline at end of file
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+# Connection pool size of the shared OpenAI HTTP session
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', '100'))
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', '30'))
+# At most this many non-streaming OpenAI calls per process at once; others queue up to the timeout
+CHATBOT_LLM_CONCURRENCY = int(os.environ.get('CHATBOT_LLM_CONCURRENCY', '16'))
+CHATBOT_LLM_QUEUE_TIMEOUT = float(os.environ.get('CHATBOT_LLM_QUEUE_TIMEOUT', '10'))
+# Streamed answers (chat_stream, served by uvicorn) open at once per process; they wait
+# on the event loop without a thread, so the limit is much higher. Beyond it the
+# answer falls back to the local one.
+CHATBOT_STREAM_CONCURRENCY = int(os.environ.get('CHATBOT_STREAM_CONCURRENCY', '1000'))
+
+# Chatbot database searches run concurrently; each corpus gets this many seconds
+CHATBOT_SEARCH_WORKERS = int(os.environ.get('CHATBOT_SEARCH_WORKERS', '8'))
+CHATBOT_SEARCH_TIMEOUT = float(os.environ.get('CHATBOT_SEARCH_TIMEOUT', '2.0'))
+# Searches queued or running in that pool; beyond this, new ones count as timed out
+CHATBOT_SEARCH_MAX_PENDING = int(os.environ.get('CHATBOT_SEARCH_MAX_PENDING', '32'))
+
+# Chat messages and search logs are written in batches by a background thread once
+# this many are queued or after this many seconds (and at exit); 1 writes them inline
+CHATBOT_WRITE_BUFFER_SIZE = int(os.environ.get('CHATBOT_WRITE_BUFFER_SIZE', '100'))
+CHATBOT_WRITE_FLUSH_INTERVAL = float(os.environ.get('CHATBOT_WRITE_FLUSH_INTERVAL', '1.0'))
+
+# Recent messages per chat session kept in the chatbot cache for prompts and history
+CHATBOT_HISTORY_SIZE = int(os.environ.get('CHATBOT_HISTORY_SIZE', '20'))
+CHATBOT_HISTORY_TTL = int(os.environ.get('CHATBOT_HISTORY_TTL', '86400'))
+
+# Weights for ranking chatbot database results; keys override chatbot.ranking.DEFAULT_RANKING
+CHATBOT_RANKING = {
+    'title_weight': float(os.environ.get('CHATBOT_RANK_TITLE_WEIGHT', '3.0')),
+    'detail_weight': float(os.environ.get('CHATBOT_RANK_DETAIL_WEIGHT', '1.0')),
+    'phrase_weight': float(os.environ.get('CHATBOT_RANK_PHRASE_WEIGHT', '2.0')),
+    'sdg_weight': float(os.environ.get('CHATBOT_RANK_SDG_WEIGHT', '1.5')),
+    'top_n': int(os.environ.get('CHATBOT_RANK_TOP_N', '9')),
+}
+
+# Offline TF-IDF passage index used as grounded context for OpenAI answers
+# (build with `manage.py build_chatbot_index`); the top K passages above MIN_SCORE are sent
+CHATBOT_RAG_INDEX_PATH = os.environ.get('CHATBOT_RAG_INDEX_PATH', str(BASE_DIR / 'chatbot_rag.npz'))
+CHATBOT_RAG_TOP_K = int(os.environ.get('CHATBOT_RAG_TOP_K', '3'))
+CHATBOT_RAG_MIN_SCORE = float(os.environ.get('CHATBOT_RAG_MIN_SCORE', '0.1'))
+
+# Chatbot response cache. Set CHATBOT_CACHE_URL (redis://...) to share it between
+# processes (needs the redis package; configure maxmemory-policy allkeys-lru on the
+# server), otherwise each process keeps an LRU cache in memory.
+CHATBOT_CACHE_ALIAS = 'chatbot'
+CHATBOT_CACHE_TTL = int(os.environ.get('CHATBOT_CACHE_TTL', '3600'))
+CHATBOT_CACHE_URL = os.environ.get('CHATBOT_CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    CHATBOT_CACHE_ALIAS: {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CHATBOT_CACHE_URL,
+        'TIMEOUT': CHATBOT_CACHE_TTL,
+    } if CHATBOT_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chatbot-responses',
+        'TIMEOUT': CHATBOT_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CHATBOT_CACHE_MAX_ENTRIES', '5000'))},
+    },
+}
+# Build the in-process search indexes in the background when the server starts
+SEARCH_WARM_ON_STARTUP = os.environ.get('SEARCH_WARM_ON_STARTUP', 'True') == 'True'
+# Worker processes for batch SDG tagging, and the batch size at which a request uses them
+SDG_TAGGING_WORKERS = int(os.environ.get('SDG_TAGGING_WORKERS', os.cpu_count() or 1))
+SDG_TAGGING_PARALLEL_MIN_DOCS = int(os.environ.get('SDG_TAGGING_PARALLEL_MIN_DOCS', '500'))
+# Longest CSV field (characters) the batch tagger accepts, e.g. a whole report
+SDG_TAGGING_CSV_FIELD_LIMIT = int(os.environ.get('SDG_TAGGING_CSV_FIELD_LIMIT', str(16 * 1024 * 1024)))
@@ -36,4 +36,5 @@ urlpatterns = [
     path('api/sdg-education/', include('sdg_education.urls')),
     path('api/sdg_keywords/', include('sdg_keywords.urls')),
     path('api/chatbot/', include('chatbot.urls')),
+    path('api/search/', include('search.urls')),
 ]
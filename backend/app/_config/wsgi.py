@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# build the in-process search indexes once the app registry is ready
+from search.indexes import warm_indexes_in_background  # noqa: E402
+warm_indexes_in_background()
@@ -2,4 +2,20 @@ from django.apps import AppConfig
 
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'chatbot' 
\ No newline at end of file
+    name = 'chatbot'
+
+    def ready(self):
+        # 数据库内容变化时让回答缓存失效
+        from django.db.models.signals import post_delete, post_save
+        from sdg_actions.models import ActionDb
+        from sdg_education.models import EducationDb
+        from sdg_keywords.models import Keyword
+        from .services import response_cache
+        from .write_buffer import install_signal_handlers, write_buffer
+        for model in (Keyword, ActionDb, EducationDb):
+            uid = f'chatbot-cache-{model._meta.label}'
+            post_save.connect(response_cache.bump_version, sender=model, weak=False, dispatch_uid=uid)
+            post_delete.connect(response_cache.bump_version, sender=model, weak=False, dispatch_uid=uid)
+
+        # 进程被 SIGTERM 停止时先写入缓冲中的消息和搜索日志
+        install_signal_handlers(write_buffer)
@@ -0,0 +1,153 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+FILLER = (
+    "The Sustainable Development Goals call for action by all countries to promote prosperity "
+    "while protecting the planet, ending poverty alongside strategies that build economic growth "
+    "and address education, health, social protection and job opportunities."
+).split()
+
+
+class FakeOpenAIConfig:
+    """假 OpenAI 服务的行为：延迟（毫秒）、回答长度（词）和错误率"""
+
+    def __init__(self, latency: float = 200, jitter: float = 50, token_delay: float = 10,
+                 tokens: int = 60, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def draw(self):
+        """本次请求的 (首字延迟秒数, 是否返回错误)"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)) / 1000
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return delay, failed
+
+    def answer_words(self, messages: List[Dict]) -> List[str]:
+        question = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+        words = ['Stub', 'answer', 'to:'] + question.split()[:12] + ['--']
+        while len(words) < self.tokens:
+            words.extend(FILLER)
+        return words[:max(self.tokens, 1)]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """实现 POST /chat/completions（可带 /v1 前缀），支持 stream=true"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeOpenAI/1.0'
+
+    @property
+    def config(self) -> FakeOpenAIConfig:
+        return self.server.config
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path.rstrip('/') not in ('/chat/completions', '/v1/chat/completions'):
+            return self.send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'invalid_request_error'}})
+        try:
+            payload = json.loads(body or b'{}')
+            messages = payload['messages']
+        except (ValueError, KeyError):
+            return self.send_json(400, {'error': {'message': 'Invalid request body', 'type': 'invalid_request_error'}})
+
+        delay, failed = self.config.draw()
+        time.sleep(delay)
+        if failed:
+            code = self.config.random.choice([429, 500, 503])
+            return self.send_json(code, {'error': {'message': 'Injected failure', 'type': 'server_error', 'code': code}})
+
+        words = self.config.answer_words(messages)
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        model = payload.get('model', 'gpt-3.5-turbo')
+        if payload.get('stream'):
+            self.stream(completion_id, model, words)
+        else:
+            prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in messages)
+            self.send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ' '.join(words)},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': len(words),
+                    'total_tokens': prompt_tokens + len(words),
+                },
+            })
+
+    def send_json(self, code: int, data: Dict):
+        raw = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def stream(self, completion_id: str, model: str, words: List[str]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for i, word in enumerate(words):
+                chunk = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': word if i == 0 else f' {word}'}, 'finish_reason': None}],
+                }
+                self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+                if self.config.token_delay:
+                    time.sleep(self.config.token_delay / 1000)
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开
+            pass
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: FakeOpenAIConfig, verbose: bool = False):
+        super().__init__(address, FakeOpenAIHandler)
+        self.config = config
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start_background(self) -> threading.Thread:
+        """在后台线程中运行（基准测试使用），用 shutdown() 停止"""
+        thread = threading.Thread(target=self.serve_forever, name='fake-openai', daemon=True)
+        thread.start()
+        return thread
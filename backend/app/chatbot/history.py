@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import ChatMessage, ChatSession
+from .write_buffer import session_messages
+
+
+def message_entry(msg: ChatMessage) -> Dict:
+    """历史记录接口返回的单条消息格式"""
+    return {
+        'id': msg.id,
+        'type': msg.message_type,
+        'content': msg.content,
+        'timestamp': msg.timestamp.isoformat(),
+        'metadata': msg.metadata
+    }
+
+
+class ConversationCache:
+    """
+    每个会话最近 CHATBOT_HISTORY_SIZE 条消息的环形缓冲，存放在 CHATBOT_CACHE_ALIAS
+    缓存中（本地内存或Redis，与回答缓存相同）。
+
+    save_message 每保存一条消息就追加一条；缓存中没有该会话时（首次访问、过期或被淘汰）
+    从数据库加上写入队列读取一次。写入队列中的消息追加时还没有id（id为None），
+    历史接口读到这样的条目时先写入队列再 reload()，之后条目带有id。
+
+    同一会话的两条消息几乎同时保存时可能丢失一条。每次追加都会刷新过期时间，
+    所以丢失的条目不会因过期而恢复，要等到下一次 reload()（例如历史接口读取时）；
+    在此之前只影响发给模型的上下文。
+    """
+    KEY_PREFIX = 'chatbot:history:'
+
+    def __init__(self, alias: Optional[str] = None):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias or getattr(settings, 'CHATBOT_CACHE_ALIAS', 'default')]
+
+    @property
+    def size(self) -> int:
+        return getattr(settings, 'CHATBOT_HISTORY_SIZE', 20)
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, 'CHATBOT_HISTORY_TTL', 86400)
+
+    def key(self, session_id: str) -> str:
+        return f'{self.KEY_PREFIX}{session_id}'
+
+    def recent(self, session: ChatSession, limit: Optional[int] = None) -> List[Dict]:
+        """最近的 limit 条消息（不超过 size），按时间正序"""
+        limit = min(limit or self.size, self.size)
+        try:
+            entries = self.cache.get(self.key(session.session_id))
+        except Exception as e:
+            print(f"Chatbot history cache read failed: {e}")
+            entries = None
+        if entries is None:
+            entries = self.reload(session)
+        return entries[-limit:]
+
+    def reload(self, session: ChatSession) -> List[Dict]:
+        """从数据库加上写入队列重新读取会话最近的消息并写入缓存"""
+        entries = [message_entry(msg) for msg in session_messages(session, self.size)]
+        self._set(session.session_id, entries)
+        return entries
+
+    def append(self, session_id: str, msg: ChatMessage):
+        """追加一条新保存的消息；会话不在缓存中时跳过，下次读取时会从数据库加载"""
+        try:
+            entries = self.cache.get(self.key(session_id))
+        except Exception as e:
+            print(f"Chatbot history cache read failed: {e}")
+            return
+        if entries is None:
+            return
+        entries.append(message_entry(msg))
+        self._set(session_id, entries[-self.size:])
+
+    def _set(self, session_id: str, entries: List[Dict]):
+        try:
+            self.cache.set(self.key(session_id), entries, timeout=self.timeout)
+        except Exception as e:
+            print(f"Chatbot history cache store failed: {e}")
+
+
+conversation_cache = ConversationCache()
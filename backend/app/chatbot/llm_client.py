@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class LLMError(Exception):
+    """OpenAI请求失败（连接错误、非200响应或无法解析的流）"""
+
+
+class _Flight:
+    """一次进行中的上游调用，相同请求的其他线程等待它的结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[Exception] = None
+
+
+class LLMGate:
+    """
+    进程内的上游调用闸门。
+
+    - 并发上限：最多 CHATBOT_LLM_CONCURRENCY 个非流式调用同时进行，其余排队，
+      排队超过 CHATBOT_LLM_QUEUE_TIMEOUT 秒放弃（LLMError）。流式回答不经过这里，
+      见 stream_limit。
+    - 单飞合并：相同请求（同一个key）正在进行时，后来的线程不再发请求，
+      直接等待并共用第一个调用的结果或错误。
+    - 指标：当前/最大排队数、等待时间、合并次数、拒绝次数，见 metrics()。
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, queue_timeout: Optional[float] = None):
+        self._concurrency = concurrency
+        self._queue_timeout = queue_timeout
+        self._semaphore: Optional[threading.BoundedSemaphore] = None
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._waits = deque(maxlen=1000)
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    @property
+    def concurrency(self) -> int:
+        if self._concurrency is not None:
+            return self._concurrency
+        return getattr(settings, 'CHATBOT_LLM_CONCURRENCY', 16)
+
+    @property
+    def queue_timeout(self) -> float:
+        if self._queue_timeout is not None:
+            return self._queue_timeout
+        return getattr(settings, 'CHATBOT_LLM_QUEUE_TIMEOUT', 10.0)
+
+    @property
+    def semaphore(self) -> threading.BoundedSemaphore:
+        if self._semaphore is None:
+            with self._lock:
+                if self._semaphore is None:
+                    self._semaphore = threading.BoundedSemaphore(self.concurrency)
+        return self._semaphore
+
+    def run(self, key: str, func: Callable):
+        """执行 func()（或等待相同 key 的进行中调用），返回其结果"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(self.queue_timeout + getattr(settings, 'OPENAI_TIMEOUT', 30)):
+                raise LLMError("Timed out waiting for an identical in-flight request")
+            if flight.error is not None:
+                raise LLMError(str(flight.error))
+            return flight.result
+
+        try:
+            flight.result = self._call(func)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _call(self, func: Callable):
+        with self.slot():
+            return func()
+
+    @contextmanager
+    def slot(self):
+        """占用一个并发名额直到退出（不合并请求）；排队超时抛出 LLMError"""
+        started = time.monotonic()
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        acquired = self.semaphore.acquire(timeout=self.queue_timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self.queued -= 1
+            self._waits.append(waited)
+            if not acquired:
+                self.rejected += 1
+            else:
+                self.in_flight += 1
+                self.calls += 1
+        if not acquired:
+            raise LLMError(f"LLM queue wait exceeded {self.queue_timeout}s")
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+            with self._lock:
+                self.in_flight -= 1
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._waits)
+
+            def percentile(p):
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else None
+
+            return {
+                'concurrency': self.concurrency,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queued,
+                'max_queue_depth': self.max_queued,
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'wait_ms_p50': percentile(0.5),
+                'wait_ms_p95': percentile(0.95),
+                'wait_ms_max': round(waits[-1] * 1000, 1) if waits else None,
+            }
+
+
+llm_gate = LLMGate()
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """进程内共享的 requests.Session，连接保持复用（连接池大小见 settings.OPENAI_MAX_CONNECTIONS）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = getattr(settings, 'OPENAI_MAX_CONNECTIONS', 100)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+class LLMClient:
+    """
+    OpenAI兼容接口的同步客户端，用于WSGI请求中的回答。
+    所有调用经过 llm_gate：限制并发、排队，并合并完全相同的进行中请求。
+    流式回答见 AsyncLLMClient。
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 model: Optional[str] = None):
+        self.api_key = api_key if api_key is not None else getattr(settings, 'OPENAI_API_KEY', None)
+        self.base_url = (base_url or getattr(settings, 'OPENAI_BASE_URL', 'https://api.openai.com/v1')).rstrip('/')
+        self.model = model or getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo')
+
+    def chat(self, messages: List[Dict], max_tokens: int = 800, temperature: float = 0.7) -> str:
+        """返回模型的完整回答"""
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+        }
+        raw = json.dumps([self.base_url, payload], sort_keys=True, ensure_ascii=False)
+        key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return llm_gate.run(key, lambda: self._post(payload))
+
+    def _post(self, payload: Dict) -> str:
+        try:
+            response = get_session().post(
+                f'{self.base_url}/chat/completions',
+                json=payload,
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                timeout=getattr(settings, 'OPENAI_TIMEOUT', 30),
+            )
+        except requests.RequestException as e:
+            raise LLMError(str(e)) from e
+        if response.status_code != 200:
+            raise LLMError(f"OpenAI API error {response.status_code}: {response.text[:200]}")
+        try:
+            return response.json()['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Malformed response: {e}")
+
+
+class StreamLimit:
+    """
+    进程内同时进行的流式回答数上限（CHATBOT_STREAM_CONCURRENCY）。
+
+    流式回答在ASGI事件循环中进行，等待上游时只占一个连接、不占线程，所以不计入
+    llm_gate 的短调用并发，而是单独计数，上限也大得多。达到上限时不排队，
+    直接抛出 LLMError，由调用方回退到本地回答。
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self._limit = limit
+        self._lock = threading.Lock()
+        self.open = 0
+        self.max_open = 0
+        self.streams = 0
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        if self._limit is not None:
+            return self._limit
+        return getattr(settings, 'CHATBOT_STREAM_CONCURRENCY', 1000)
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self.open >= self.limit:
+                self.rejected += 1
+                raise LLMError(f"Too many streamed answers in progress ({self.limit})")
+            self.open += 1
+            self.max_open = max(self.max_open, self.open)
+            self.streams += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.open -= 1
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'open': self.open,
+                'max_open': self.max_open,
+                'streams': self.streams,
+                'rejected': self.rejected,
+            }
+
+
+stream_limit = StreamLimit()
+
+_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    当前事件循环共享的 AsyncClient（连接池大小见 settings.OPENAI_MAX_CONNECTIONS）。
+    ASGI服务器（uvicorn）只有一个事件循环，所以整个进程共用一个连接池。
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        for other in [l for l in _clients if l.is_closed()]:
+            del _clients[other]
+        limits = httpx.Limits(
+            max_connections=getattr(settings, 'OPENAI_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=getattr(settings, 'OPENAI_MAX_KEEPALIVE', 20),
+        )
+        timeout = httpx.Timeout(getattr(settings, 'OPENAI_TIMEOUT', 30), connect=5.0)
+        client = _clients[loop] = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return client
+
+
+class AsyncLLMClient:
+    """
+    OpenAI兼容接口的异步客户端，用于流式回答。
+    每个流占用 stream_limit 的一个名额，连接来自共享的 AsyncClient。
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 model: Optional[str] = None):
+        self.api_key = api_key if api_key is not None else getattr(settings, 'OPENAI_API_KEY', None)
+        self.base_url = (base_url or getattr(settings, 'OPENAI_BASE_URL', 'https://api.openai.com/v1')).rstrip('/')
+        self.model = model or getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo')
+
+    async def stream_chat(self, messages: List[Dict], max_tokens: int = 800,
+                          temperature: float = 0.7) -> AsyncIterator[str]:
+        """逐个产出模型生成的文本片段（OpenAI stream=true 的 SSE 响应）"""
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'stream': True,
+        }
+        headers = {'Authorization': f'Bearer {self.api_key}'}
+        try:
+            with stream_limit.slot():
+                async with get_http_client().stream('POST', f'{self.base_url}/chat/completions',
+                                                    json=payload, headers=headers) as response:
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        raise LLMError(f"OpenAI API error {response.status_code}: {body[:200]!r}")
+                    async for line in response.aiter_lines():
+                        if not line.startswith('data:'):
+                            continue
+                        data = line[len('data:'):].strip()
+                        if data == '[DONE]':
+                            break
+                        try:
+                            delta = json.loads(data)['choices'][0].get('delta', {})
+                        except (ValueError, KeyError, IndexError) as e:
+                            raise LLMError(f"Malformed stream chunk: {e}")
+                        if delta.get('content'):
+                            yield delta['content']
+        except httpx.HTTPError as e:
+            raise LLMError(str(e)) from e
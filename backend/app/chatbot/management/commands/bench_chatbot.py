@@ -0,0 +1,205 @@
+import contextlib
+import io
+import json
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from chatbot.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from chatbot.llm_client import llm_gate
+from chatbot.services import response_cache
+
+# Typical questions; with --unique the ones the database cannot answer go to the LLM
+DEFAULT_QUERIES = [
+    'climate action',
+    'renewable energy',
+    'gender equality',
+    'ocean plastic pollution',
+    'quality education',
+    'clean water and sanitation',
+    'how can cities reduce food waste',
+    'what is the role of youth in peacebuilding',
+    'explain circular economy business models',
+    'zero hunger',
+    # questions that match nothing in the three databases (not even by
+    # trigram similarity), so the turn goes to the LLM
+    'recommend a jazz playlist',
+    'merci beaucoup',
+    '你好',
+    '可持续发展目标是什么',
+]
+
+
+def percentile(values, p):
+    """nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the chat endpoint: sends --requests chat turns from --concurrency "
+        "threads through the full Django stack and reports latency percentiles, "
+        "throughput and database queries per turn. Use --fake-llm to answer the "
+        "LLM path from an in-process stand-in instead of OpenAI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Total chat turns (default: 200)")
+        parser.add_argument('--concurrency', type=int, default=10, help="Client threads (default: 10)")
+        parser.add_argument('--queries', help="File with one question per line (default: built-in mix)")
+        parser.add_argument('--unique', action='store_true',
+                            help="Make every question distinct so the response cache never hits")
+        parser.add_argument('--fake-llm', action='store_true',
+                            help="Start a fake OpenAI server and point the chatbot at it")
+        parser.add_argument('--latency', type=float, default=200,
+                            help="Fake LLM latency in milliseconds (default: 200)")
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Fraction of fake LLM calls that fail (default: 0)")
+        parser.add_argument('--inline-search', action='store_true',
+                            help="Run corpus searches on the request thread (CHATBOT_SEARCH_WORKERS=1) "
+                                 "so their queries are counted too")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+        parser.add_argument('--verbose', action='store_true', help="Keep the chatbot's own logging")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+        queries = DEFAULT_QUERIES
+        if options['queries']:
+            try:
+                with open(options['queries'], encoding='utf-8') as f:
+                    queries = [line.strip() for line in f if line.strip()]
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['queries']}: {e}")
+            if not queries:
+                raise CommandError(f"No questions in {options['queries']}")
+
+        # queries are counted on the request thread only
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if options['inline_search']:
+            overrides['CHATBOT_SEARCH_WORKERS'] = 1
+        server = None
+        if options['fake_llm']:
+            server = FakeOpenAIServer(('127.0.0.1', 0), FakeOpenAIConfig(
+                latency=options['latency'], error_rate=options['error_rate'], seed=0))
+            server.start_background()
+            overrides.update(OPENAI_API_KEY='fake-key', OPENAI_BASE_URL=server.base_url)
+
+        try:
+            with override_settings(**overrides):
+                samples, elapsed = self.run_load(queries, options)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        report = self.summarize(samples, elapsed, options)
+        if server is not None:
+            report['fake_llm'] = {'requests': server.config.requests, 'errors': server.config.errors}
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def run_load(self, queries, options):
+        url = reverse('chat_message')
+        total = options['requests']
+        counter = iter(range(total))
+        counter_lock = threading.Lock()
+        samples = []
+
+        def worker():
+            client = Client()
+            session_id = str(uuid.uuid4())
+            try:
+                while True:
+                    with counter_lock:
+                        i = next(counter, None)
+                    if i is None:
+                        return
+                    question = queries[i % len(queries)]
+                    if options['unique']:
+                        question = f'{question} {uuid.uuid4().hex[:8]}'
+                    body = {'message': question, 'session_id': session_id}
+                    with CaptureQueriesContext(connection) as queries_run:
+                        started = time.perf_counter()
+                        response = client.post(url, body, content_type='application/json')
+                        latency = time.perf_counter() - started
+                    metadata = response.json().get('metadata', {}) if response.status_code == 200 else {}
+                    samples.append({
+                        'latency': latency,
+                        'status': response.status_code,
+                        'queries': len(queries_run),
+                        'database_used': metadata.get('database_used'),
+                        'cache_hit': bool(metadata.get('cache_hit')),
+                    })
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, name=f'bench-{n}')
+                   for n in range(min(options['concurrency'], total))]
+        quiet = contextlib.nullcontext() if options['verbose'] else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        return samples, elapsed
+
+    def summarize(self, samples, elapsed, options):
+        latencies = [s['latency'] * 1000 for s in samples]
+        query_counts = [s['queries'] for s in samples]
+        ok = [s for s in samples if s['status'] == 200]
+        return {
+            'requests': len(samples),
+            'concurrency': options['concurrency'],
+            'errors': len(samples) - len(ok),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 1),
+                'p95': round(percentile(latencies, 95), 1),
+                'p99': round(percentile(latencies, 99), 1),
+                'max': round(max(latencies), 1),
+            },
+            'db_queries_per_turn': {
+                'mean': round(sum(query_counts) / len(query_counts), 2),
+                'p95': percentile(query_counts, 95),
+                'max': max(query_counts),
+            },
+            'database_answers': sum(1 for s in ok if s['database_used']),
+            'cache_hits': sum(1 for s in ok if s['cache_hit']),
+            'response_cache': response_cache.metrics(),
+            'llm_gate': llm_gate.metrics(),
+        }
+
+    def print_report(self, report):
+        latency = report['latency_ms']
+        queries = report['db_queries_per_turn']
+        self.stdout.write(
+            f"{report['requests']} requests, concurrency {report['concurrency']}, "
+            f"{report['errors']} errors in {report['elapsed_s']}s "
+            f"({report['throughput_rps']} req/s)")
+        self.stdout.write(
+            f"latency ms: p50 {latency['p50']}  p95 {latency['p95']}  "
+            f"p99 {latency['p99']}  max {latency['max']}")
+        self.stdout.write(
+            f"db queries/turn: mean {queries['mean']}  p95 {queries['p95']}  max {queries['max']}")
+        self.stdout.write(
+            f"database answers: {report['database_answers']}  cache hits: {report['cache_hits']}")
+        gate = report['llm_gate']
+        self.stdout.write(
+            f"llm: {gate['calls']} calls, {gate['coalesced']} coalesced, {gate['rejected']} rejected, "
+            f"max queue {gate['max_queue_depth']}, wait p95 {gate['wait_ms_p95']} ms")
+        if 'fake_llm' in report:
+            self.stdout.write(
+                f"fake llm: {report['fake_llm']['requests']} requests, {report['fake_llm']['errors']} injected errors")
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.retrieval import RetrievalIndex, index_path, iter_passages
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the chatbot's TF-IDF passage index from action details, education "
+        "descriptions and keyword notes. Running servers pick up the new file on "
+        "their next question."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o',
+                            help="Index file (default: settings.CHATBOT_RAG_INDEX_PATH)")
+        parser.add_argument('--chunk-size', type=int, default=120,
+                            help="Maximum words per passage (default: 120)")
+        parser.add_argument('--min-df', type=int, default=1,
+                            help="Drop terms found in fewer passages than this (default: 1)")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 40:
+            raise CommandError("--chunk-size must be at least 40")
+        path = options['output'] or index_path()
+
+        started = time.monotonic()
+        passages = list(iter_passages(options['chunk_size']))
+        if not passages:
+            raise CommandError("No passages to index; load the action, education and keyword tables first")
+        index = RetrievalIndex.build(passages, min_df=options['min_df'])
+        try:
+            index.save(path)
+        except OSError as e:
+            raise CommandError(f"Cannot write {path}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} passages ({len(index.vocab)} terms, {index.data.size} weights) "
+            f"into {path} in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local stand-in for the OpenAI /chat/completions API (plain and "
+        "streaming) with configurable latency and error rate. Point the chatbot at "
+        "it with OPENAI_BASE_URL=http://HOST:PORT/v1 and any OPENAI_API_KEY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--latency', type=float, default=200,
+                            help="Milliseconds before the first byte of each answer (default: 200)")
+        parser.add_argument('--jitter', type=float, default=50,
+                            help="Random +/- milliseconds added to the latency (default: 50)")
+        parser.add_argument('--token-delay', type=float, default=10,
+                            help="Milliseconds between streamed chunks (default: 10)")
+        parser.add_argument('--tokens', type=int, default=60,
+                            help="Words per answer (default: 60)")
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Fraction of requests answered with 429/500/503 (default: 0)")
+        parser.add_argument('--seed', type=int, help="Random seed for repeatable runs")
+        parser.add_argument('--verbose', action='store_true', help="Log every request")
+
+    def handle(self, *args, **options):
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError("--error-rate must be between 0 and 1")
+        config = FakeOpenAIConfig(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            token_delay=options['token_delay'],
+            tokens=options['tokens'],
+            error_rate=options['error_rate'],
+            seed=options['seed'],
+        )
+        try:
+            server = FakeOpenAIServer((options['host'], options['port']), config, verbose=options['verbose'])
+        except OSError as e:
+            raise CommandError(f"Cannot listen on {options['host']}:{options['port']}: {e}")
+
+        self.stdout.write(f"Fake OpenAI API at {server.base_url} (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Served {config.requests} requests ({config.errors} injected errors)")
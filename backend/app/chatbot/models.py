@@ -27,7 +27,8 @@ class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     message_type = models.CharField(max_length=20, choices=MESSAGE_TYPES)
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # 消息可能延迟批量写入，时间戳在创建对象时确定，保证顺序不变
+    timestamp = models.DateTimeField(default=timezone.now)
     metadata = models.JSONField(default=dict, blank=True)  # 存储额外信息，如数据源、搜索关键词等
 
     class Meta:
@@ -44,7 +45,7 @@ class DatabaseSearchLog(models.Model):
     search_type = models.CharField(max_length=50)  # 'keywords', 'actions', 'education'
     results_count = models.IntegerField(default=0)
     found_in_database = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = 'database_search_log'
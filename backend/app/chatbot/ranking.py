@@ -0,0 +1,136 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from search.engine import STOPWORDS, tokenize
+from sdg_keywords.classifier import classifier, parse_goal
+
+# 问句中的常见词，不影响问题含义
+QUERY_STOPWORDS = STOPWORDS | frozenset("""
+about can could do does explain give how i me please show tell us what when where which who why would you
+""".split())
+
+# 各数据库参与打分的字段：标题字段、详情字段、SDG字段
+CORPUS_FIELDS = {
+    'keywords': {'title': ['keyword'], 'detail': ['note', 'target'], 'sdgs': ['sdggoal']},
+    'actions': {'title': ['actions'], 'detail': ['action_detail'], 'sdgs': ['sdgs', 'suggested_sdgs']},
+    'education': {
+        'title': ['title'],
+        'detail': ['description', 'aims', 'learning_outcome'],
+        'sdgs': ['sdgs_related', 'suggested_sdgs'],
+    },
+}
+
+DEFAULT_RANKING = {
+    'title_weight': 3.0,     # 每个问题词出现在标题中的得分
+    'detail_weight': 1.0,    # 出现在详情字段中的得分
+    'phrase_weight': 2.0,    # 整个问题原样出现在标题中的加分
+    'sdg_weight': 1.5,       # 条目的SDG与问题中关键词对应的SDG相同时的加分
+    'corpus_weights': {'keywords': 1.0, 'actions': 1.0, 'education': 1.0},
+    'min_coverage': 0.5,     # 至少包含这一比例的问题词才算相关
+    'candidates': 30,        # 每个数据库取出参与打分的候选条目数
+    'top_n': 9,              # 三个数据库合计返回的条目数
+}
+
+
+def stem(word: str) -> str:
+    """简单的英文词干化：去掉复数和常见动词词尾"""
+    for suffix, replacement in (('ies', 'y'), ('ing', ''), ('ed', ''), ('s', '')):
+        if word.endswith(suffix) and not word.endswith('ss') and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def query_words(query: str) -> List[str]:
+    """问题中有意义的词（去掉停用词和问句常用词）"""
+    return [t for t in tokenize(query) if t not in QUERY_STOPWORDS]
+
+
+def ranking_settings() -> Dict:
+    """settings.CHATBOT_RANKING 覆盖默认权重"""
+    config = dict(DEFAULT_RANKING)
+    config.update(getattr(settings, 'CHATBOT_RANKING', {}))
+    config['corpus_weights'] = dict(DEFAULT_RANKING['corpus_weights'], **config['corpus_weights'])
+    return config
+
+
+def _field_terms(obj, fields: List[str]) -> Set[str]:
+    terms = set()
+    for field in fields:
+        terms.update(stem(t) for t in tokenize(getattr(obj, field, None)))
+    return terms
+
+
+def _object_sdgs(obj, fields: List[str]) -> Set[str]:
+    goals = set()
+    for field in fields:
+        value = getattr(obj, field, None)
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        goals.update(g for g in (parse_goal(v) for v in values) if g)
+    return goals
+
+
+class HybridRanker:
+    """
+    把三个数据库的候选条目放在一起打分，一次选出全局最好的 top_n 条。
+
+    得分 = 数据库权重 × (标题词覆盖 × title_weight + 详情词覆盖 × detail_weight
+                         + 短语命中 × phrase_weight + SDG重合 × sdg_weight)
+    其中覆盖率是问题词（词干化）出现在对应字段中的比例，SDG重合是问题经
+    SDG关键词匹配得到的目标中有多少也属于该条目。权重见 CHATBOT_RANKING。
+    """
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = config or ranking_settings()
+
+    def query_sdgs(self, query: str) -> Set[str]:
+        try:
+            return {s['sdg'] for s in classifier.classify(query, top=3)['sdgs']}
+        except Exception as e:
+            print(f"SDG keyword matching failed during ranking: {e}")
+            return set()
+
+    def score(self, corpus: str, obj, terms: Set[str], phrase: str, sdgs: Set[str]) -> Optional[float]:
+        """单个条目的得分；与问题不够相关时返回 None"""
+        fields = CORPUS_FIELDS[corpus]
+        config = self.config
+        if not terms:
+            # 问题只有停用词或数字时无法按词打分，保留候选但排在最后
+            return 0.0
+        title_terms = _field_terms(obj, fields['title'])
+        detail_terms = _field_terms(obj, fields['detail'])
+        title_hits = len(terms & title_terms) / len(terms)
+        detail_hits = len(terms & detail_terms) / len(terms)
+        coverage = len(terms & (title_terms | detail_terms)) / len(terms)
+        title_text = ' '.join(t for f in fields['title'] for t in tokenize(getattr(obj, f, None)))
+        phrase_hit = bool(phrase) and phrase in title_text
+        if coverage < config['min_coverage'] and not phrase_hit:
+            return None
+
+        score = title_hits * config['title_weight'] + detail_hits * config['detail_weight']
+        if phrase_hit:
+            score += config['phrase_weight']
+        if sdgs:
+            score += len(sdgs & _object_sdgs(obj, fields['sdgs'])) / len(sdgs) * config['sdg_weight']
+        return score * config['corpus_weights'].get(corpus, 1.0)
+
+    def rank(self, query: str, candidates: Dict[str, Iterable]) -> Dict[str, List[Tuple[float, object]]]:
+        """返回 {数据库: [(得分, 条目), ...]}，合计不超过 top_n 条，各自按得分降序"""
+        terms = {stem(t) for t in query_words(query)}
+        words = query_words(query)
+        phrase = ' '.join(words) if len(terms) > 1 else ''
+        sdgs = self.query_sdgs(query)
+
+        scored = []
+        for corpus, objs in candidates.items():
+            for position, obj in enumerate(objs):
+                score = self.score(corpus, obj, terms, phrase, sdgs)
+                if score is not None:
+                    # 同分时保持候选原有顺序
+                    scored.append((score, -position, corpus, obj))
+
+        ranked: Dict[str, List[Tuple[float, object]]] = {corpus: [] for corpus in candidates}
+        for score, _, corpus, obj in heapq.nlargest(self.config['top_n'], scored, key=lambda item: item[:2]):
+            ranked[corpus].append((round(score, 4), obj))
+        return ranked
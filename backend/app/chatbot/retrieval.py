@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from search.engine import tokenize
+from sdg_actions.models import ActionDb
+from sdg_education.models import EducationDb
+from sdg_keywords.models import Keyword
+
+INDEX_VERSION = 1
+
+
+def chunk_words(text: str, size: int = 120, overlap: int = 20) -> List[str]:
+    """把长文本切成有重叠的段落，每段不超过 size 个词"""
+    words = (text or '').split()
+    if len(words) <= size:
+        return [' '.join(words)] if words else []
+    step = size - overlap
+    return [' '.join(words[i:i + size]) for i in range(0, len(words) - overlap, step)]
+
+
+def iter_passages(chunk_size: int = 120) -> Iterator[Dict]:
+    """产出需要检索的段落：行动详情、教育项目描述和关键词备注"""
+    for action in ActionDb.objects.only('pk', 'actions', 'action_detail').iterator():
+        for text in chunk_words(action.action_detail, chunk_size):
+            yield {'source': 'action', 'id': action.pk, 'title': action.actions or '', 'text': text}
+    for edu in EducationDb.objects.only('pk', 'title', 'description').iterator():
+        for text in chunk_words(edu.description, chunk_size):
+            yield {'source': 'education', 'id': edu.pk, 'title': edu.title or '', 'text': text}
+    for kw in Keyword.objects.exclude(note='').only('pk', 'keyword', 'sdggoal', 'target', 'note').iterator():
+        yield {
+            'source': 'keyword',
+            'id': kw.pk,
+            'title': f"{kw.keyword} (SDG {kw.sdggoal}, target {kw.target})",
+            'text': kw.note,
+        }
+
+
+class RetrievalIndex:
+    """
+    TF-IDF段落检索索引，离线构建（manage.py build_chatbot_index），运行时只读。
+
+    段落向量（标题+正文，次线性tf乘以平滑idf，L2归一化）以按词存储的稀疏矩阵
+    （CSC：indptr / indices / data 三个NumPy数组）保存。查询时只取查询词对应的
+    列累加得到余弦相似度，再用 argpartition 取 top-k，通常在1毫秒内完成。
+    """
+
+    def __init__(self, vocab: Dict[str, int], idf: np.ndarray, indptr: np.ndarray,
+                 indices: np.ndarray, data: np.ndarray, passages: List[Dict]):
+        self.vocab = vocab
+        self.idf = idf
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.passages = passages
+
+    def __len__(self):
+        return len(self.passages)
+
+    @classmethod
+    def build(cls, passages: List[Dict], min_df: int = 1) -> 'RetrievalIndex':
+        doc_terms = []
+        df: Dict[str, int] = {}
+        for passage in passages:
+            counts: Dict[str, int] = {}
+            for term in tokenize(f"{passage['title']} {passage['text']}"):
+                counts[term] = counts.get(term, 0) + 1
+            doc_terms.append(counts)
+            for term in counts:
+                df[term] = df.get(term, 0) + 1
+
+        n_docs = len(passages)
+        terms = sorted(t for t, n in df.items() if n >= min_df)
+        vocab = {t: i for i, t in enumerate(terms)}
+        idf = np.array([math.log((1 + n_docs) / (1 + df[t])) + 1 for t in terms], dtype=np.float32)
+
+        # 先按文档计算归一化权重，再按词分组成CSC
+        columns: List[List] = [[] for _ in terms]
+        for doc, counts in enumerate(doc_terms):
+            weights = [(vocab[t], (1 + math.log(c)) * idf[vocab[t]]) for t, c in counts.items() if t in vocab]
+            norm = math.sqrt(sum(w * w for _, w in weights)) or 1.0
+            for col, w in weights:
+                columns[col].append((doc, w / norm))
+
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for col, entries in enumerate(columns):
+            indptr[col + 1] = indptr[col] + len(entries)
+        indices = np.fromiter((doc for entries in columns for doc, _ in entries), dtype=np.int32, count=indptr[-1])
+        data = np.fromiter((w for entries in columns for _, w in entries), dtype=np.float32, count=indptr[-1])
+        return cls(vocab, idf, indptr, indices, data, passages)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = json.dumps({'version': INDEX_VERSION, 'passages': self.passages}, ensure_ascii=False)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        # 先写临时文件再替换，运行中的进程不会读到半个文件
+        tmp = f'{path}.tmp.npz'
+        np.savez_compressed(tmp, terms=np.array(terms, dtype=str), idf=self.idf, indptr=self.indptr,
+                            indices=self.indices, data=self.data, meta=np.array(meta))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RetrievalIndex':
+        with np.load(path, allow_pickle=False) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('version') != INDEX_VERSION:
+                raise ValueError(f"Unsupported retrieval index version in {path}")
+            vocab = {t: i for i, t in enumerate(f['terms'].tolist())}
+            return cls(vocab, f['idf'], f['indptr'], f['indices'], f['data'], meta['passages'])
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[Dict]:
+        """返回与问题余弦相似度最高的 k 个段落（附 score）"""
+        counts: Dict[int, int] = {}
+        for term in tokenize(query):
+            col = self.vocab.get(term)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        if not counts or not self.passages:
+            return []
+
+        cols = np.fromiter(counts, dtype=np.int64)
+        weights = np.log(np.fromiter(counts.values(), dtype=np.float32)) + 1
+        weights *= self.idf[cols]
+        weights /= np.linalg.norm(weights)
+
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for col, weight in zip(cols, weights):
+            start, end = self.indptr[col], self.indptr[col + 1]
+            scores[self.indices[start:end]] += self.data[start:end] * weight
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.passages[i], score=round(float(scores[i]), 4))
+                for i in top if scores[i] > min_score]
+
+
+_index: Optional[RetrievalIndex] = None
+_index_mtime: Optional[float] = None
+_index_lock = threading.Lock()
+
+
+def index_path() -> str:
+    return getattr(settings, 'CHATBOT_RAG_INDEX_PATH', os.path.join(settings.BASE_DIR, 'chatbot_rag.npz'))
+
+
+def get_index() -> Optional[RetrievalIndex]:
+    """加载（或在文件更新后重新加载）检索索引；尚未构建时返回 None"""
+    global _index, _index_mtime
+    path = index_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            try:
+                _index = RetrievalIndex.load(path)
+                _index_mtime = mtime
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Failed to load chatbot retrieval index: {e}")
+                return _index
+        return _index
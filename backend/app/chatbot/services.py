@@ -1,13 +1,180 @@
 import re
 import json
-import requests
-from typing import List, Dict, Tuple, Optional
-from django.db.models import Q
+import time
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import AsyncIterator, List, Dict, Tuple, Optional
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import close_old_connections, connection
 from django.conf import settings
+from .llm_client import AsyncLLMClient, LLMClient, LLMError
+from .retrieval import get_index
+from .history import conversation_cache
+from .write_buffer import session_cache, write_buffer
 from .models import ChatSession, ChatMessage, DatabaseSearchLog
 from sdg_keywords.models import Keyword
 from sdg_actions.models import ActionDb
 from sdg_education.models import EducationDb
+from search.engine import rank_queryset, tokenize
+from search.indexes import (
+    action_fuzzy, action_index, education_fuzzy, education_index, keyword_fuzzy, keyword_index,
+)
+from .ranking import QUERY_STOPWORDS, HybridRanker, query_words, ranking_settings, stem
+
+# 只缓存数据库回答：它只取决于问题和数据库内容。OpenAI回答的提示词包含
+# 本会话最近的对话历史，开头还引用提问者的原话，不能跨会话共享；
+# 本地兜底回答可能只是暂时失败
+CACHEABLE_SOURCES = ('database',)
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化问题作为缓存键：小写、去停用词、词干化、去重排序，
+    因此 "What is SDG 13?" 与 "sdg 13" 命中同一条缓存
+    """
+    return ' '.join(sorted({stem(t) for t in tokenize(query) if t not in QUERY_STOPWORDS}))
+
+
+class ResponseCache:
+    """
+    聊天回答缓存，键为规范化问题加数据库版本号。
+    只存与对话历史无关的回答（见 CACHEABLE_SOURCES），因此可以跨会话命中。
+
+    后端使用 settings.CACHES 中的 CHATBOT_CACHE_ALIAS（本地内存LRU或Redis），
+    过期时间为 CHATBOT_CACHE_TTL。关键词、行动、教育数据变化时版本号加一，
+    旧缓存随之失效。命中/未命中次数也记在缓存中，多进程共享。
+    """
+    VERSION_KEY = 'chatbot:db-version'
+    HITS_KEY = 'chatbot:metrics:hits'
+    MISSES_KEY = 'chatbot:metrics:misses'
+    
+    def __init__(self, alias: Optional[str] = None):
+        self.alias = alias
+    
+    @property
+    def cache(self):
+        return caches[self.alias or getattr(settings, 'CHATBOT_CACHE_ALIAS', 'default')]
+    
+    def db_version(self) -> int:
+        version = self.cache.get(self.VERSION_KEY)
+        if version is None:
+            self.cache.add(self.VERSION_KEY, 1, timeout=None)
+            version = self.cache.get(self.VERSION_KEY, 1)
+        return version
+    
+    def bump_version(self, *args, **kwargs):
+        """数据库内容变化时调用（见 apps.py 中的信号）"""
+        try:
+            self._incr(self.VERSION_KEY, initial=1)
+        except Exception as e:
+            print(f"Failed to bump chatbot cache version: {e}")
+    
+    def _incr(self, key: str, initial: int = 0):
+        self.cache.add(key, initial, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # 键在add之后被淘汰
+            self.cache.set(key, initial + 1, timeout=None)
+    
+    def make_key(self, query: str) -> Optional[str]:
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        return f'chatbot:response:{self.db_version()}:{digest}'
+    
+    def lookup(self, query: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """返回 (缓存键, 缓存的回答)；无法缓存的问题返回 (None, None)"""
+        try:
+            key = self.make_key(query)
+            if key is None:
+                return None, None
+            value = self.cache.get(key)
+            self._incr(self.HITS_KEY if value is not None else self.MISSES_KEY)
+            return key, value
+        except Exception as e:
+            # 缓存不可用时直接走正常流程
+            print(f"Chatbot cache lookup failed: {e}")
+            return None, None
+    
+    def store(self, key: Optional[str], value: Dict):
+        if key is None:
+            return
+        try:
+            self.cache.set(key, value, timeout=getattr(settings, 'CHATBOT_CACHE_TTL', 3600))
+        except Exception as e:
+            print(f"Chatbot cache store failed: {e}")
+    
+    def metrics(self) -> Dict:
+        hits = self.cache.get(self.HITS_KEY, 0)
+        misses = self.cache.get(self.MISSES_KEY, 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'backend': type(self.cache).__name__,
+            'db_version': self.db_version(),
+        }
+
+
+response_cache = ResponseCache()
+
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """进程内共享的数据库搜索线程池（大小见 CHATBOT_SEARCH_WORKERS）"""
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHATBOT_SEARCH_WORKERS', 8),
+                thread_name_prefix='chatbot-search',
+            )
+        return _search_executor
+
+
+_search_pending = 0
+
+
+def _search_finished(future):
+    global _search_pending
+    with _search_executor_lock:
+        _search_pending -= 1
+
+
+def submit_search(func, *args) -> Optional[Future]:
+    """
+    把数据库查询提交到共享线程池。排队和执行中的查询超过
+    CHATBOT_SEARCH_MAX_PENDING 个时不再提交（返回None），
+    避免数据库变慢时超时的查询在池中越积越多
+    """
+    global _search_pending
+    with _search_executor_lock:
+        if _search_pending >= getattr(settings, 'CHATBOT_SEARCH_MAX_PENDING', 32):
+            return None
+        _search_pending += 1
+    try:
+        future = get_search_executor().submit(run_in_thread, func, *args)
+    except Exception:
+        with _search_executor_lock:
+            _search_pending -= 1
+        raise
+    future.add_done_callback(_search_finished)
+    return future
+
+
+def run_in_thread(func, *args):
+    """在线程池中执行数据库查询，前后按 CONN_MAX_AGE 关闭本线程的过期连接"""
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
 
 class SDGChatbotService:
     """SDG聊天机器人服务"""
@@ -15,9 +182,15 @@ class SDGChatbotService:
     def __init__(self):
         self.openai_api_key = getattr(settings, 'OPENAI_API_KEY', None)
         self.openai_base_url = getattr(settings, 'OPENAI_BASE_URL', 'https://api.openai.com/v1')
+        # 最近一次回答的来源：database / openai / local
+        self.response_source = None
         
     def create_or_get_session(self, session_id: str, user_id: Optional[int] = None) -> ChatSession:
         """创建或获取聊天会话"""
+        if write_buffer.enabled:
+            session = session_cache.get(session_id)
+            if session is not None:
+                return session
         session, created = ChatSession.objects.get_or_create(
             session_id=session_id,
             defaults={
@@ -25,121 +198,194 @@ class SDGChatbotService:
                 'is_active': True
             }
         )
+        if write_buffer.enabled:
+            session_cache.put(session)
         return session
     
     def save_message(self, session: ChatSession, message_type: str, content: str, metadata: Dict = None) -> ChatMessage:
-        """保存聊天消息"""
-        return ChatMessage.objects.create(
+        """保存聊天消息（通过 write_buffer 延迟批量写入），并追加到会话的历史缓存"""
+        msg = write_buffer.add(ChatMessage(
             session=session,
             message_type=message_type,
             content=content,
             metadata=metadata or {}
-        )
+        ))
+        conversation_cache.append(session.session_id, msg)
+        return msg
     
     def search_database(self, query: str) -> Dict:
-        """在三个数据库中搜索相关信息"""
+        """
+        在三个数据库中搜索相关信息。
+
+        三个查询并发执行，每个最多等待 CHATBOT_SEARCH_TIMEOUT 秒，总耗时取决于
+        最慢的一个而不是三者之和；超时的数据库记入 timed_out，返回其余结果。
+        到期时还在排队的查询被取消；已经开始的查询无法中断，会在后台执行完，
+        其数量受 CHATBOT_SEARCH_MAX_PENDING 限制，超过时新的查询直接算作超时。
+        全部超时说明数据库过载，结果标记为 degraded：不再做模糊搜索，
+        也不调用OpenAI，直接返回本地的降级回答。
+        各数据库的候选条目再由 HybridRanker 统一打分，合并选出最相关的条目。
+        """
         search_results = {
             'keywords': [],
             'actions': [],
             'education': [],
-            'total_found': 0
+            'total_found': 0,
+            'timed_out': []
         }
         
-        # 搜索关键词数据库
-        keyword_results = Keyword.objects.filter(
-            Q(keyword__icontains=query) |
-            Q(sdggoal__icontains=query) |
-            Q(target__icontains=query) |
-            Q(note__icontains=query)
-        )[:5]
-        
-        search_results['keywords'] = [
-            {
-                'type': 'keyword',
-                'content': f"关键词: {kw.keyword}, SDG目标: {kw.sdggoal}, 具体目标: {kw.target}",
-                'details': {
-                    'keyword': kw.keyword,
-                    'sdg_goal': kw.sdggoal,
-                    'target': kw.target,
-                    'reference1': kw.reference1,
-                    'reference2': kw.reference2,
-                    'note': kw.note
-                }
-            }
-            for kw in keyword_results
-        ]
+        corpora = {
+            'keywords': self._search_keywords,
+            'actions': self._search_actions,
+            'education': self._search_education,
+        }
+        formatters = {
+            'keywords': self._keyword_result,
+            'actions': self._action_result,
+            'education': self._education_result,
+        }
+        candidates = {name: [] for name in corpora}
+        workers = getattr(settings, 'CHATBOT_SEARCH_WORKERS', 8)
+        # 事务中未提交的数据对其他线程的连接不可见，此时在当前线程顺序查询
+        if workers <= 1 or connection.in_atomic_block:
+            for name, search in corpora.items():
+                candidates[name] = search(query)
+        else:
+            timeout = getattr(settings, 'CHATBOT_SEARCH_TIMEOUT', 2.0)
+            futures = {name: submit_search(search, query) for name, search in corpora.items()}
+            deadline = time.monotonic() + timeout
+            for name, future in futures.items():
+                if future is None:
+                    print(f"Search in {name} skipped: too many searches pending")
+                    search_results['timed_out'].append(name)
+                    continue
+                try:
+                    candidates[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FuturesTimeoutError:
+                    # 还在排队的取消；已开始的在后台执行完，结果丢弃
+                    future.cancel()
+                    print(f"Search in {name} timed out after {timeout}s")
+                    search_results['timed_out'].append(name)
+            if len(search_results['timed_out']) == len(corpora):
+                search_results['degraded'] = True
+                return search_results
         
-        # 搜索行动数据库
-        action_results = ActionDb.objects.filter(
-            Q(actions__icontains=query) |
-            Q(action_detail__icontains=query) |
-            Q(sources__icontains=query)
-        )[:5]
+        for name, ranked in HybridRanker().rank(query, candidates).items():
+            search_results[name] = [dict(formatters[name](obj), score=score) for score, obj in ranked]
         
-        search_results['actions'] = [
-            {
-                'type': 'action',
-                'content': f"行动: {action.actions}, 详情: {action.action_detail[:200]}...",
-                'details': {
-                    'action': action.actions,
-                    'detail': action.action_detail,
-                    'sdgs': action.sdgs,
-                    'level': action.level,
-                    'location': action.location,
-                    'sources': action.sources,
-                    'links': action.links
-                }
-            }
-            for action in action_results
-        ]
+        search_results['total_found'] = (
+            len(search_results['keywords']) + 
+            len(search_results['actions']) + 
+            len(search_results['education'])
+        )
         
-        # 搜索教育数据库
-        education_results = EducationDb.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(aims__icontains=query) |
-            Q(learning_outcome__icontains=query)
-        )[:5]
+        # 没有精确匹配时，用三元组相似度容错（拼写错误）后再决定是否调用OpenAI
+        if search_results['total_found'] == 0:
+            search_results = dict(self.fuzzy_search_database(query), timed_out=search_results['timed_out'])
         
-        search_results['education'] = [
-            {
-                'type': 'education',
-                'content': f"教育项目: {edu.title}, 描述: {edu.description[:200] if edu.description else ''}...",
-                'details': {
-                    'title': edu.title,
-                    'description': edu.description,
-                    'aims': edu.aims,
-                    'sdgs_related': edu.sdgs_related,
-                    'organization': edu.organization,
-                    'location': edu.location,
-                    'sources': edu.sources,
-                    'links': edu.links
-                }
-            }
-            for edu in education_results
-        ]
+        return search_results
+    
+    def _candidates(self, model, index, query: str) -> List:
+        """
+        候选条目只来自共享的BM25索引（search.indexes），不再扫描数据库：
+        先取包含全部问题词的条目，再补充与部分问题词最相关的条目，
+        各取 candidates 条，排序交给 HybridRanker
+        """
+        limit = ranking_settings()['candidates']
+        # 只有停用词的问题按原文检索
+        words = ' '.join(query_words(query)) or query
+        pks = index.search_pks(words, limit=limit)
+        pks.extend(index.search_pks(words, limit=limit, require_all=False))
+        order = {pk: i for i, pk in enumerate(dict.fromkeys(pks))}
+        return sorted(model.objects.filter(pk__in=order), key=lambda obj: order[obj.pk])
+    
+    def _search_keywords(self, query: str) -> List[Keyword]:
+        """搜索关键词数据库"""
+        return self._candidates(Keyword, keyword_index, query)
+    
+    def _search_actions(self, query: str) -> List[ActionDb]:
+        """搜索行动数据库"""
+        return self._candidates(ActionDb, action_index, query)
+    
+    def _search_education(self, query: str) -> List[EducationDb]:
+        """搜索教育数据库"""
+        return self._candidates(EducationDb, education_index, query)
+    
+    def fuzzy_search_database(self, query: str) -> Dict:
+        """按三元组相似度搜索关键词、行动标题和教育标题（容忍拼写错误）"""
+        keyword_results = rank_queryset(Keyword.objects.all(), keyword_fuzzy.search_pks(query, limit=5))
+        action_results = rank_queryset(ActionDb.objects.all(), action_fuzzy.search_pks(query, limit=5))
+        education_results = rank_queryset(EducationDb.objects.all(), education_fuzzy.search_pks(query, limit=5))
         
+        search_results = {
+            'keywords': [self._keyword_result(kw) for kw in keyword_results],
+            'actions': [self._action_result(action) for action in action_results],
+            'education': [self._education_result(edu) for edu in education_results],
+        }
         search_results['total_found'] = (
             len(search_results['keywords']) + 
             len(search_results['actions']) + 
             len(search_results['education'])
         )
-        
         return search_results
     
+    def _keyword_result(self, kw: Keyword) -> Dict:
+        return {
+            'type': 'keyword',
+            'content': f"关键词: {kw.keyword}, SDG目标: {kw.sdggoal}, 具体目标: {kw.target}",
+            'details': {
+                'keyword': kw.keyword,
+                'sdg_goal': kw.sdggoal,
+                'target': kw.target,
+                'reference1': kw.reference1,
+                'reference2': kw.reference2,
+                'note': kw.note
+            }
+        }
+    
+    def _action_result(self, action: ActionDb) -> Dict:
+        return {
+            'type': 'action',
+            'content': f"行动: {action.actions}, 详情: {action.action_detail[:200]}...",
+            'details': {
+                'action': action.actions,
+                'detail': action.action_detail,
+                'sdgs': action.sdgs,
+                'level': action.level,
+                'location': action.location,
+                'sources': action.sources,
+                'links': action.links
+            }
+        }
+    
+    def _education_result(self, edu: EducationDb) -> Dict:
+        return {
+            'type': 'education',
+            'content': f"教育项目: {edu.title}, 描述: {edu.description[:200] if edu.description else ''}...",
+            'details': {
+                'title': edu.title,
+                'description': edu.description,
+                'aims': edu.aims,
+                'sdgs_related': edu.sdgs_related,
+                'organization': edu.organization,
+                'location': edu.location,
+                'sources': edu.sources,
+                'links': edu.links
+            }
+        }
+    
     def log_search(self, session: ChatSession, query: str, search_results: Dict) -> List[DatabaseSearchLog]:
-        """记录搜索日志"""
+        """记录搜索日志（通过 write_buffer 延迟批量写入）"""
         logs = []
         
         for search_type in ['keywords', 'actions', 'education']:
             results = search_results[search_type]
-            log = DatabaseSearchLog.objects.create(
+            log = write_buffer.add(DatabaseSearchLog(
                 session=session,
                 query=query,
                 search_type=search_type,
                 results_count=len(results),
                 found_in_database=len(results) > 0
-            )
+            ))
             logs.append(log)
         
         return logs
@@ -150,20 +396,24 @@ class SDGChatbotService:
         # 检查是否有数据库结果
         total_found = search_results.get('total_found', 0)
         
-        # 如果有数据库结果，使用英文回复数据库内容
+        # 如果有数据库结果：有API密钥且检索到相关段落时由OpenAI基于这些段落回答，否则直接列出数据库内容
         if total_found > 0:
+            passages = self.retrieve_passages(user_message) if self.openai_api_key else []
+            if passages:
+                return self._call_openai_api_with_passages(user_message, conversation_history, passages, search_results)
             return self._generate_database_response(search_results)
         
-        # 如果没有数据库结果，尝试调用OpenAI API
-        if self.openai_api_key:
+        # 如果没有数据库结果，尝试调用OpenAI API（数据库全部超时时不调用）
+        if self.openai_api_key and not search_results.get('degraded'):
             print(f"OpenAI API key found, calling API for query: {user_message}")
             return self._call_openai_api_for_no_database_result(user_message, conversation_history)
         else:
-            print("No OpenAI API key found, using local response")
+            print("No OpenAI API key or database unavailable, using local response")
             return self._generate_local_response(user_message, search_results)
     
     def _generate_database_response(self, search_results: Dict) -> str:
         """生成数据库响应（英文）"""
+        self.response_source = 'database'
         response_parts = [f"Based on our SDG database, I found the following relevant information:\n"]
         
         # 添加关键词信息
@@ -191,10 +441,28 @@ class SDGChatbotService:
         
         return "\n".join(response_parts)
     
-    def _call_openai_api_for_no_database_result(self, user_message: str, conversation_history: List[Dict]) -> str:
-        """当数据库中没有结果时调用OpenAI API"""
-        try:
-            system_prompt = """You are a professional SDG (Sustainable Development Goals) expert assistant. 
+    def retrieve_passages(self, query: str) -> List[Dict]:
+        """从离线构建的TF-IDF索引中取出与问题最相关的几个段落（索引未构建时为空）"""
+        index = get_index()
+        if index is None:
+            return []
+        started = time.perf_counter()
+        passages = index.search(query, k=getattr(settings, 'CHATBOT_RAG_TOP_K', 3),
+                                min_score=getattr(settings, 'CHATBOT_RAG_MIN_SCORE', 0.1))
+        print(f"Retrieved {len(passages)} passages in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return passages
+    
+    def _format_passages(self, passages: List[Dict]) -> str:
+        labels = {'action': 'SDG Action', 'education': 'SDG Education', 'keyword': 'SDG Keyword'}
+        return "\n\n".join(
+            f"[{i}] {labels.get(p['source'], p['source'])}: {p['title']}\n{p['text']}"
+            for i, p in enumerate(passages, 1)
+        )
+    
+    def _build_llm_messages(self, user_message: str, conversation_history: List[Dict],
+                            passages: Optional[List[Dict]] = None) -> List[Dict]:
+        """构造发给OpenAI的消息列表；passages 为检索到的相关段落（没有时说明数据库中未找到）"""
+        system_prompt = """You are a professional SDG (Sustainable Development Goals) expert assistant. 
 
 When responding to user questions about SDG topics:
 1. Provide comprehensive and accurate information about SDG-related topics
@@ -205,6 +473,18 @@ When responding to user questions about SDG topics:
 
 Please provide professional and accurate answers about SDG topics."""
 
+        if passages:
+            # 只发送少量最相关的段落，提示词保持很短
+            user_prompt = f"""
+User Question: {user_message}
+
+Related passages from our SDG database:
+
+{self._format_passages(passages)}
+
+Answer the question using these passages where they are relevant, and cite them by number, e.g. [1]. Add general SDG knowledge only where the passages do not cover the question.
+"""
+        else:
             user_prompt = f"""
 User Question: {user_message}
 
@@ -212,68 +492,71 @@ Note: This information was not found in our SDG database, so I'm providing you w
 
 Please provide a detailed answer about this SDG-related topic.
 """
+        messages = [{'role': 'system', 'content': system_prompt}]
+        
+        # 添加对话历史
+        for msg in conversation_history[-5:]:  # 只保留最近5条消息
+            messages.append({
+                'role': 'user' if msg['type'] == 'user' else 'assistant',
+                'content': msg['content']
+            })
+        
+        messages.append({'role': 'user', 'content': user_prompt})
+        return messages
+    
+    def _no_database_intro(self, user_message: str) -> str:
+        """OpenAI回答前的说明"""
+        return f"""I couldn't find specific information about "{user_message}" in our SDG database, but I can provide you with comprehensive SDG knowledge on this topic:
 
-            headers = {
-                'Authorization': f'Bearer {self.openai_api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            messages = [{'role': 'system', 'content': system_prompt}]
-            
-            # 添加对话历史
-            for msg in conversation_history[-5:]:  # 只保留最近5条消息
-                messages.append({
-                    'role': 'user' if msg['type'] == 'user' else 'assistant',
-                    'content': msg['content']
-                })
-            
-            messages.append({'role': 'user', 'content': user_prompt})
-            
-            data = {
-                'model': 'gpt-3.5-turbo',
-                'messages': messages,
-                'max_tokens': 800,
-                'temperature': 0.7
-            }
-            
-            print(f"Calling OpenAI API with data: {data}")
-            
-            response = requests.post(
-                f'{self.openai_base_url}/chat/completions',
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+"""
+    
+    def _database_intro(self) -> str:
+        """基于数据库段落的OpenAI回答前的说明"""
+        return "Based on our SDG database:\n\n"
+    
+    def _llm_client(self) -> LLMClient:
+        return LLMClient(api_key=self.openai_api_key, base_url=self.openai_base_url)
+    
+    def _call_openai_api_for_no_database_result(self, user_message: str, conversation_history: List[Dict]) -> str:
+        """当数据库中没有结果时调用OpenAI API"""
+        try:
+            messages = self._build_llm_messages(
+                user_message, conversation_history, self.retrieve_passages(user_message))
+            print(f"Calling OpenAI API with {len(messages)} messages")
             
-            print(f"OpenAI API response status: {response.status_code}")
+            # 共享连接池；并发受限，相同的进行中请求只调用一次
+            api_response = self._llm_client().chat(messages, max_tokens=800)
+            print(f"OpenAI API response: {api_response[:100]}...")
             
-            if response.status_code == 200:
-                result = response.json()
-                api_response = result['choices'][0]['message']['content']
-                print(f"OpenAI API response: {api_response[:100]}...")
-                
-                # 在API响应前添加说明
-                return f"""I couldn't find specific information about "{user_message}" in our SDG database, but I can provide you with comprehensive SDG knowledge on this topic:
-
-{api_response}"""
-            else:
-                print(f"OpenAI API error: {response.text}")
-                return self._generate_local_response(user_message, {'total_found': 0})
-                
+            # 在API响应前添加说明
+            self.response_source = 'openai'
+            return self._no_database_intro(user_message) + api_response
+        
+        except LLMError as e:
+            print(f"OpenAI API error: {e}")
+            return self._generate_local_response(user_message, {'total_found': 0})
         except Exception as e:
             print(f"OpenAI API调用失败: {e}")
             import traceback
             traceback.print_exc()
             return self._generate_local_response(user_message, {'total_found': 0})
     
+    def _call_openai_api_with_passages(self, user_message: str, conversation_history: List[Dict],
+                                       passages: List[Dict], search_results: Dict) -> str:
+        """数据库有结果时，只把检索到的几个段落作为上下文发给OpenAI；失败时直接列出数据库内容"""
+        try:
+            messages = self._build_llm_messages(user_message, conversation_history, passages)
+            print(f"Calling OpenAI API with {len(passages)} passages")
+            api_response = self._llm_client().chat(messages, max_tokens=800)
+            self.response_source = 'openai'
+            return self._database_intro() + api_response
+        except LLMError as e:
+            print(f"OpenAI API error: {e}")
+            return self._generate_database_response(search_results)
+    
     def _call_openai_api(self, system_prompt: str, user_prompt: str, conversation_history: List[Dict]) -> str:
         """调用OpenAI API（保留原有方法）"""
         try:
-            headers = {
-                'Authorization': f'Bearer {self.openai_api_key}',
-                'Content-Type': 'application/json'
-            }
-            
             messages = [{'role': 'system', 'content': system_prompt}]
             
             # 添加对话历史
@@ -285,25 +568,7 @@ Please provide a detailed answer about this SDG-related topic.
             
             messages.append({'role': 'user', 'content': user_prompt})
             
-            data = {
-                'model': 'gpt-3.5-turbo',
-                'messages': messages,
-                'max_tokens': 1000,
-                'temperature': 0.7
-            }
-            
-            response = requests.post(
-                f'{self.openai_base_url}/chat/completions',
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
-            else:
-                return self._generate_local_response(user_prompt, {})
+            return self._llm_client().chat(messages, max_tokens=1000)
                 
         except Exception as e:
             print(f"OpenAI API调用失败: {e}")
@@ -315,7 +580,14 @@ Please provide a detailed answer about this SDG-related topic.
         # 检查是否有数据库结果
         total_found = search_results.get('total_found', 0)
         
+        if search_results.get('degraded'):
+            self.response_source = 'degraded'
+            return """Our SDG database is busy right now, so I couldn't search it for your question.
+
+Please try again in a moment."""
+
         if total_found == 0:
+            self.response_source = 'local'
             return f"""I apologize, but I couldn't find information related to "{user_message}" in our SDG database.
 
 Note: OpenAI API is not available, so I cannot provide additional SDG knowledge.
@@ -334,54 +606,101 @@ If you need to view our database content, please visit:
         return self._generate_database_response(search_results)
     
     def get_conversation_history(self, session: ChatSession, limit: int = 10) -> List[Dict]:
-        """获取对话历史"""
-        messages = ChatMessage.objects.filter(session=session).order_by('-timestamp')[:limit]
+        """获取对话历史（读取会话的历史缓存，不再每轮查询数据库）"""
         return [
             {
-                'type': msg.message_type,
-                'content': msg.content,
-                'timestamp': msg.timestamp.isoformat()
+                'type': entry['type'],
+                'content': entry['content'],
+                'timestamp': entry['timestamp']
             }
-            for msg in reversed(messages)  # 按时间正序返回
+            for entry in conversation_cache.recent(session, limit)
         ]
     
+    def _prepare_turn(self, message: str, session_id: str, user_id: Optional[int] = None) -> Tuple[ChatSession, Dict, List[DatabaseSearchLog], List[Dict]]:
+        """保存用户消息、搜索数据库并读取对话历史"""
+        # 创建或获取会话
+        session = self.create_or_get_session(session_id, user_id)
+        print(f"Session created/retrieved: {session.session_id}")
+        
+        # 保存用户消息
+        user_msg = self.save_message(session, 'user', message)
+        print(f"User message saved: {user_msg.timestamp.isoformat()}")
+        
+        # 搜索数据库
+        search_results = self.search_database(message)
+        print(f"Search results: {search_results['total_found']} items found")
+        
+        # 记录搜索日志
+        search_logs = self.log_search(session, message, search_results)
+        print(f"Search logs created: {len(search_logs)} logs")
+        
+        # 获取对话历史
+        conversation_history = self.get_conversation_history(session)
+        print(f"Conversation history: {len(conversation_history)} messages")
+        
+        return session, search_results, search_logs, conversation_history
+    
+    def _response_metadata(self, search_results: Dict, search_logs: List[DatabaseSearchLog]) -> Dict:
+        return {
+            'database_used': search_results['total_found'] > 0,
+            'search_results_count': search_results['total_found'],
+            # 搜索日志的id；日志在写入队列中时还没有id，此时为空
+            'search_logs': [log.id for log in search_logs if log.id is not None],
+            'searched_corpora': [log.search_type for log in search_logs]
+        }
+    
+    def _reply_from_cache(self, message: str, session_id: str, user_id: Optional[int], cached: Dict) -> Dict:
+        """缓存命中：只保存这一轮对话，不再搜索数据库或调用OpenAI"""
+        session = self.create_or_get_session(session_id, user_id)
+        self.save_message(session, 'user', message)
+        metadata = {
+            'database_used': cached['database_used'],
+            'search_results_count': cached['search_results_count'],
+            'search_logs': [],
+            'cache_hit': True
+        }
+        self.save_message(session, 'assistant', cached['response'], metadata)
+        return {
+            'response': cached['response'],
+            'session_id': session_id,
+            'database_used': cached['database_used'],
+            'search_logs': [],
+            'metadata': metadata
+        }
+    
+    def _cache_entry(self, response: str, metadata: Dict) -> Dict:
+        return {
+            'response': response,
+            'database_used': metadata['database_used'],
+            'search_results_count': metadata['search_results_count']
+        }
+    
     def process_chat_message(self, message: str, session_id: str, user_id: Optional[int] = None) -> Dict:
         """处理聊天消息"""
         try:
             print(f"Processing chat message: '{message}'")
             
-            # 创建或获取会话
-            session = self.create_or_get_session(session_id, user_id)
-            print(f"Session created/retrieved: {session.session_id}")
-            
-            # 保存用户消息
-            user_msg = self.save_message(session, 'user', message)
-            print(f"User message saved: {user_msg.id}")
-            
-            # 搜索数据库
-            search_results = self.search_database(message)
-            print(f"Search results: {search_results['total_found']} items found")
-            
-            # 记录搜索日志
-            search_logs = self.log_search(session, message, search_results)
-            print(f"Search logs created: {len(search_logs)} logs")
+            # 相同（规范化后）的问题直接返回缓存的回答
+            cache_key, cached = response_cache.lookup(message)
+            if cached is not None:
+                print(f"Response cache hit: {cache_key}")
+                return self._reply_from_cache(message, session_id, user_id, cached)
             
-            # 获取对话历史
-            conversation_history = self.get_conversation_history(session)
-            print(f"Conversation history: {len(conversation_history)} messages")
+            session, search_results, search_logs, conversation_history = self._prepare_turn(
+                message, session_id, user_id)
             
             # 生成AI响应
             ai_response = self.generate_ai_response(message, search_results, conversation_history)
             print(f"AI response generated: {len(ai_response)} characters")
             
             # 保存AI响应
-            metadata = {
-                'database_used': search_results['total_found'] > 0,
-                'search_results_count': search_results['total_found'],
-                'search_logs': [log.id for log in search_logs]
-            }
+            metadata = self._response_metadata(search_results, search_logs)
             assistant_msg = self.save_message(session, 'assistant', ai_response, metadata)
-            print(f"Assistant message saved: {assistant_msg.id}")
+            print(f"Assistant message saved: {assistant_msg.timestamp.isoformat()}")
+            
+            # 有数据库超时的部分结果不缓存
+            if self.response_source in CACHEABLE_SOURCES and not search_results.get('timed_out'):
+                response_cache.store(cache_key, self._cache_entry(ai_response, metadata))
             
             result = {
                 'response': ai_response,
@@ -398,4 +717,65 @@ If you need to view our database content, please visit:
             print(f"Error in process_chat_message: {str(e)}")
             import traceback
             traceback.print_exc()
-            raise 
\ No newline at end of file
+            raise
+    
+    async def stream_chat_message(self, message: str, session_id: str, user_id: Optional[int] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        流式处理聊天消息，依次产出 (事件, 数据)：
+        ('start', 会话信息)，若干 ('token', {'text': 片段})，最后 ('done', 元数据)。
+        数据库操作在线程中执行；OpenAI回答通过共享连接池的异步客户端逐段转发，
+        等待上游时不占用线程。
+        """
+        cache_key, cached = await sync_to_async(response_cache.lookup)(message)
+        if cached is not None:
+            result = await sync_to_async(self._reply_from_cache)(message, session_id, user_id, cached)
+            yield 'start', {'session_id': session_id, 'database_used': result['database_used']}
+            yield 'token', {'text': result['response']}
+            yield 'done', result['metadata']
+            return
+        
+        session, search_results, search_logs, conversation_history = await sync_to_async(
+            self._prepare_turn)(message, session_id, user_id)
+        metadata = self._response_metadata(search_results, search_logs)
+        yield 'start', {'session_id': session_id, 'database_used': metadata['database_used']}
+        
+        parts = []
+        found = search_results['total_found'] > 0
+        use_llm = bool(self.openai_api_key) and not search_results.get('degraded')
+        passages = await sync_to_async(self.retrieve_passages)(message) if use_llm else []
+        # 数据库无结果时总是调用OpenAI；有结果时只在检索到相关段落时调用
+        if use_llm and (passages or not found):
+            intro = self._database_intro() if found else self._no_database_intro(message)
+            try:
+                client = AsyncLLMClient(api_key=self.openai_api_key, base_url=self.openai_base_url)
+                async for text in client.stream_chat(
+                        self._build_llm_messages(message, conversation_history, passages)):
+                    if not parts:
+                        parts.append(intro)
+                        yield 'token', {'text': intro}
+                    parts.append(text)
+                    yield 'token', {'text': text}
+                if parts:
+                    self.response_source = 'openai'
+            except LLMError as e:
+                print(f"OpenAI API流式调用失败: {e}")
+                if parts:
+                    # 已经发送了部分回答，只能在末尾说明中断
+                    notice = "\n\n[The response was interrupted. Please try again.]"
+                    parts.append(notice)
+                    yield 'token', {'text': notice}
+        
+        if not parts:
+            # 没有相关段落、没有API密钥或OpenAI失败：一次性返回本地生成的回答
+            if found:
+                text = self._generate_database_response(search_results)
+            else:
+                text = self._generate_local_response(message, search_results)
+            parts.append(text)
+            yield 'token', {'text': text}
+        
+        response = ''.join(parts)
+        await sync_to_async(self.save_message)(session, 'assistant', response, metadata)
+        if self.response_source in CACHEABLE_SOURCES and not search_results.get('timed_out'):
+            await sync_to_async(response_cache.store)(cache_key, self._cache_entry(response, metadata))
+        yield 'done', metadata
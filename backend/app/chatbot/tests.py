@@ -0,0 +1,595 @@
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from sdg_actions.models import ActionDb
+from sdg_education.models import EducationDb
+from sdg_keywords.models import Keyword
+from search.indexes import INDEXES
+from . import services
+from django.utils import timezone
+from .history import conversation_cache
+from .llm_client import AsyncLLMClient, LLMError, LLMGate, StreamLimit
+from .models import ChatMessage, ChatSession, DatabaseSearchLog
+from .ranking import DEFAULT_RANKING, HybridRanker
+from .retrieval import RetrievalIndex, chunk_words
+from .services import SDGChatbotService, normalize_query, response_cache
+from .write_buffer import WriteBehindBuffer, install_signal_handlers
+from .views import sse_event
+
+
+def parse_events(body: bytes):
+    """Splits an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.decode('utf-8').split('\n\n'):
+        if not block:
+            continue
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class FakeOpenAIMixin:
+    error_rate = 0.0
+
+    def setUp(self):
+        super().setUp()
+        response_cache.cache.clear()
+        self.server = FakeOpenAIServer(('127.0.0.1', 0), FakeOpenAIConfig(
+            latency=0, jitter=0, token_delay=0, tokens=5, error_rate=self.error_rate, seed=1))
+        self.server.start_background()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings = override_settings(OPENAI_API_KEY='test-key', OPENAI_BASE_URL=self.server.base_url)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class SSEFramingTestCase(TestCase):
+    def test_event_encoding(self):
+        self.assertEqual(sse_event('token', {'text': 'a\nb é'}),
+                         'event: token\ndata: {"text": "a\\nb é"}\n\n')
+
+
+class StreamClientMixin:
+    def post(self, data, body=None):
+        """POSTs to chat_stream through the ASGI handler; returns the response and its body."""
+        async def request():
+            resp = await self.async_client.post(reverse('chat_stream'), data=body or json.dumps(data),
+                                                content_type='application/json')
+            if not resp.streaming:
+                return resp, resp.content
+            return resp, b''.join([chunk async for chunk in resp.streaming_content])
+
+        return async_to_sync(request)()
+
+
+class ChatStreamTestCase(StreamClientMixin, FakeOpenAIMixin, TestCase):
+    def test_streams_start_tokens_done(self):
+        resp, body = self.post({'message': 'zzzz qqqq', 'session_id': 'stream-1'})
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        events = parse_events(body)
+        self.assertEqual(events[0], ('start', {'session_id': 'stream-1', 'database_used': False}))
+        self.assertEqual(events[-1][0], 'done')
+        tokens = [data['text'] for event, data in events if event == 'token']
+        # the intro, then one event per streamed delta
+        self.assertEqual(len(tokens), 6)
+        self.assertTrue(''.join(tokens[1:]).startswith('Stub answer to:'))
+
+    def test_rejects_invalid_request(self):
+        self.assertEqual(self.post(None, body='not json')[0].status_code, 400)
+        self.assertEqual(self.post({})[0].status_code, 400)
+
+    def test_error_event(self):
+        async def failing(*args, **kwargs):
+            yield 'start', {'session_id': 's', 'database_used': False}
+            raise RuntimeError('boom')
+
+        with mock.patch('chatbot.views.SDGChatbotService.stream_chat_message', side_effect=failing):
+            events = parse_events(self.post({'message': 'hello'})[1])
+        self.assertEqual([event for event, _ in events], ['start', 'error'])
+        self.assertEqual(events[1][1], {'error': 'Internal server error', 'message': 'boom'})
+
+
+class ChatStreamUpstreamFailureTestCase(StreamClientMixin, FakeOpenAIMixin, TestCase):
+    error_rate = 1.0
+
+    def test_falls_back_to_local_answer(self):
+        events = parse_events(self.post({'message': 'zzzz qqqq'})[1])
+        self.assertEqual([event for event, _ in events], ['start', 'token', 'done'])
+        self.assertTrue(events[1][1]['text'])
+
+
+class NormalizeQueryTestCase(TestCase):
+    def test_equivalent_questions_share_a_key(self):
+        self.assertEqual(normalize_query("What is SDG 13?"), normalize_query("sdg 13"))
+        self.assertEqual(normalize_query("Renewable energies"), normalize_query("renewable energy"))
+
+    def test_follow_ups_collapse(self):
+        self.assertEqual(normalize_query("tell me more"), "more")
+        self.assertEqual(normalize_query("What can you do?"), "")
+        self.assertIsNone(response_cache.make_key("What can you do?"))
+
+
+class ResponseCacheTestCase(FakeOpenAIMixin, TestCase):
+    def ask(self, message, session_id):
+        return SDGChatbotService().process_chat_message(message, session_id)
+
+    def test_openai_answers_are_not_shared_between_sessions(self):
+        first = self.ask("zzzz qqqq", "session-a")
+        second = self.ask("zzzz qqqq", "session-b")
+        self.assertEqual(self.server.config.requests, 2)
+        self.assertNotIn('cache_hit', second['metadata'])
+        self.assertTrue(first['response'].startswith("I couldn't find"))
+
+    def test_database_answers_are_cached(self):
+        Keyword.objects.create(keyword="Renewable energy", sdggoal="7", target="7.2")
+        first = self.ask("renewable energy", "session-a")
+        self.assertTrue(first['database_used'])
+        second = self.ask("Renewable energies?", "session-b")
+        self.assertTrue(second['metadata']['cache_hit'])
+        self.assertEqual(second['response'], first['response'])
+        self.assertEqual(self.server.config.requests, 0)
+
+
+class GroundedAnswerTestCase(StreamClientMixin, FakeOpenAIMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        Keyword.objects.create(keyword="Renewable energy", sdggoal="7", target="7.2")
+        index = RetrievalIndex.build(RetrievalIndexTestCase.PASSAGES)
+        patcher = mock.patch.object(services, 'get_index', return_value=index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_database_hits_are_answered_from_passages(self):
+        result = SDGChatbotService().process_chat_message("renewable energy", "session-a")
+        self.assertTrue(result['database_used'])
+        self.assertTrue(result['response'].startswith("Based on our SDG database:\n\nStub answer to:"))
+        self.assertEqual(self.server.config.requests, 1)
+
+    def test_streamed_database_hits_are_answered_from_passages(self):
+        events = parse_events(self.post({'message': 'renewable energy'})[1])
+        self.assertTrue(events[0][1]['database_used'])
+        tokens = [data['text'] for event, data in events if event == 'token']
+        self.assertEqual(tokens[0], "Based on our SDG database:\n\n")
+        self.assertEqual(self.server.config.requests, 1)
+
+    def test_no_relevant_passages_lists_database_rows(self):
+        Keyword.objects.create(keyword="Zzzz", sdggoal="1", target="1.1")
+        result = SDGChatbotService().process_chat_message("zzzz", "session-a")
+        self.assertTrue(result['response'].startswith("Based on our SDG database, I found"))
+        self.assertEqual(self.server.config.requests, 0)
+
+
+def slow_search(query):
+    time.sleep(0.3)
+    return []
+
+
+class SearchTimeoutTestCase(FakeOpenAIMixin, TransactionTestCase):
+    """Searches only run on the thread pool outside a transaction."""
+
+    def slow_corpora(self):
+        for name in ('_search_keywords', '_search_actions', '_search_education'):
+            patcher = mock.patch.object(SDGChatbotService, name, side_effect=slow_search)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(CHATBOT_SEARCH_TIMEOUT=0.05)
+    def test_all_timed_out_is_a_degraded_local_answer(self):
+        self.slow_corpora()
+        with mock.patch.object(SDGChatbotService, 'fuzzy_search_database') as fuzzy:
+            service = SDGChatbotService()
+            result = service.process_chat_message("zzzz qqqq", "timeout-session")
+        fuzzy.assert_not_called()
+        self.assertEqual(service.response_source, 'degraded')
+        self.assertIn("busy", result['response'])
+        self.assertEqual(self.server.config.requests, 0)
+
+    @override_settings(CHATBOT_SEARCH_TIMEOUT=0.05)
+    def test_partial_timeout_keeps_other_results(self):
+        patcher = mock.patch.object(SDGChatbotService, '_search_actions', side_effect=slow_search)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        results = SDGChatbotService().search_database("zzzz")
+        self.assertEqual(results['timed_out'], ['actions'])
+        self.assertNotIn('degraded', results)
+
+    @override_settings(CHATBOT_SEARCH_MAX_PENDING=0)
+    def test_full_pool_sheds_searches(self):
+        results = SDGChatbotService().search_database("zzzz")
+        self.assertEqual(results['timed_out'], ['keywords', 'actions', 'education'])
+        self.assertTrue(results['degraded'])
+        self.assertEqual(services._search_pending, 0)
+
+
+class ChunkWordsTestCase(TestCase):
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(chunk_words("a  b\nc", size=5), ["a b c"])
+        self.assertEqual(chunk_words("", size=5), [])
+        self.assertEqual(chunk_words(None, size=5), [])
+
+    def test_long_text_overlaps(self):
+        words = [str(i) for i in range(12)]
+        chunks = chunk_words(' '.join(words), size=5, overlap=2)
+        self.assertEqual(chunks, ["0 1 2 3 4", "3 4 5 6 7", "6 7 8 9 10", "9 10 11"])
+        self.assertTrue(all(len(c.split()) <= 5 for c in chunks))
+
+
+class RetrievalIndexTestCase(TestCase):
+    PASSAGES = [
+        {'source': 'action', 'id': 1, 'title': 'Solar panels', 'text': 'Install solar panels for renewable energy'},
+        {'source': 'education', 'id': 2, 'title': 'Ocean course', 'text': 'Marine plastic pollution and ocean health'},
+        {'source': 'keyword', 'id': 3, 'title': 'Energy (SDG 7)', 'text': 'Affordable clean energy for all'},
+    ]
+
+    def setUp(self):
+        self.index = RetrievalIndex.build(self.PASSAGES)
+
+    def test_best_match_first(self):
+        results = self.index.search("solar energy", k=3)
+        self.assertEqual([r['id'] for r in results], [1, 3])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+        self.assertLessEqual(results[0]['score'], 1.0)
+
+    def test_k_and_min_score(self):
+        self.assertEqual(len(self.index.search("solar energy", k=1)), 1)
+        top = self.index.search("solar energy", k=3)
+        kept = self.index.search("solar energy", k=3, min_score=top[1]['score'])
+        self.assertEqual([r['id'] for r in kept], [1])
+
+    def test_unknown_terms(self):
+        self.assertEqual(self.index.search("zzzz"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_min_df_drops_rare_terms(self):
+        index = RetrievalIndex.build(self.PASSAGES, min_df=2)
+        self.assertEqual(set(index.vocab), {'energy'})
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index.npz')
+            self.index.save(path)
+            loaded = RetrievalIndex.load(path)
+        self.assertEqual(loaded.search("ocean plastic"), self.index.search("ocean plastic"))
+
+
+class BuildChatbotIndexTestCase(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'rag.npz')
+
+    def build(self, *args):
+        call_command('build_chatbot_index', '--output', self.path, *args, stdout=StringIO())
+
+    def test_indexes_all_sources(self):
+        ActionDb.objects.create(id=1, actions="Cycle to work", action_detail="Commute by bicycle " * 100)
+        EducationDb.objects.create(id=1, title="Water course", description="Clean water and sanitation")
+        Keyword.objects.create(keyword="Drought", sdggoal="6", target="6.4", note="Water scarcity")
+        Keyword.objects.create(keyword="Ignored", sdggoal="6", target="6.1", note="")
+        self.build('--chunk-size', '120')
+        index = RetrievalIndex.load(self.path)
+        self.assertEqual([p['source'] for p in index.passages], ['action'] * 3 + ['education', 'keyword'])
+        self.assertEqual(index.search("water scarcity", k=1)[0]['title'], "Drought (SDG 6, target 6.4)")
+
+    def test_rejects_empty_tables_and_small_chunks(self):
+        with self.assertRaises(CommandError):
+            self.build()
+        with self.assertRaises(CommandError):
+            self.build('--chunk-size', '10')
+        self.assertFalse(os.path.exists(self.path))
+
+
+class WriteBehindBufferTestCase(TransactionTestCase):
+    """The buffer writes inline inside transactions, so these run outside one."""
+
+    def setUp(self):
+        self.session = ChatSession.objects.create(session_id='buffered')
+        self.buffer = WriteBehindBuffer(max_size=10, interval=60)
+
+    def message(self, content='hi'):
+        return ChatMessage(session=self.session, message_type='user', content=content)
+
+    def test_rows_are_written_on_flush(self):
+        self.buffer.add(self.message('one'))
+        self.buffer.add(DatabaseSearchLog(session=self.session, query='one', search_type='keywords'))
+        self.assertEqual(ChatMessage.objects.count(), 0)
+        self.assertEqual(len(self.buffer.pending(ChatMessage, session_id=self.session.pk)), 1)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(ChatMessage.objects.get().content, 'one')
+        self.assertEqual(DatabaseSearchLog.objects.count(), 1)
+
+    def test_writes_inline_when_disabled(self):
+        buffer = WriteBehindBuffer(max_size=1)
+        msg = buffer.add(self.message())
+        self.assertIsNotNone(msg.pk)
+
+    def test_integrity_errors_are_logged_as_errors(self):
+        orphan = ChatMessage(session_id=self.session.pk + 1000, message_type='user', content='lost')
+        self.buffer.add(orphan)
+        with self.assertLogs('chatbot.write_buffer', 'ERROR') as logs:
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertIn('dropped 1 ChatMessage rows', logs.output[0])
+        self.assertEqual(self.buffer.dropped, 1)
+
+    def test_overflow_is_logged_as_error(self):
+        buffer = WriteBehindBuffer(max_size=10, interval=60, max_pending=2)
+        for i in range(3):
+            buffer.add(self.message(str(i)))
+        with mock.patch.object(ChatMessage.objects, 'bulk_create', side_effect=DatabaseError('down')):
+            with self.assertLogs('chatbot.write_buffer', 'ERROR') as logs:
+                buffer.flush()
+        self.assertIn('dropped the 1 oldest rows', logs.output[-1])
+        self.assertEqual([m.content for m in buffer.pending(ChatMessage)], ['1', '2'])
+
+    def test_sigterm_flushes_before_previous_handler(self):
+        calls = []
+        original = signal.signal(signal.SIGTERM, lambda signum, frame: calls.append(ChatMessage.objects.count()))
+        self.addCleanup(signal.signal, signal.SIGTERM, original)
+        install_signal_handlers(self.buffer)
+        self.buffer.add(self.message())
+        signal.raise_signal(signal.SIGTERM)
+        self.assertEqual(calls, [1])
+
+
+class ResponseMetadataTestCase(TestCase):
+    def test_search_log_ids_and_corpora(self):
+        result = SDGChatbotService().process_chat_message("zzzz qqqq", "metadata-session")
+        metadata = result['metadata']
+        logs = DatabaseSearchLog.objects.filter(session__session_id='metadata-session').order_by('id')
+        # inside a transaction the logs are written inline, so they have ids
+        self.assertEqual(metadata['search_logs'], [log.id for log in logs])
+        self.assertEqual(metadata['searched_corpora'], ['keywords', 'actions', 'education'])
+
+
+class SearchCandidatesTestCase(TestCase):
+    def setUp(self):
+        for index in INDEXES:
+            index.reset()
+        ActionDb.objects.create(id=1, actions="Switch to renewable energy",
+                                action_detail="Choose a renewable energy supplier.")
+        ActionDb.objects.create(id=2, actions="Recycle batteries")
+
+    def test_candidates_come_from_the_shared_index(self):
+        service = SDGChatbotService()
+        service.search_database('warm up')
+        with CaptureQueriesContext(connection) as queries:
+            found = service._search_actions('how can I use renewable energy?')
+        self.assertEqual([action.id for action in found], [1])
+        # one primary-key lookup, no LIKE scans of the text columns
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('LIKE', queries[0]['sql'].upper())
+
+
+class HistoryPaginationTestCase(TestCase):
+    def setUp(self):
+        response_cache.cache.clear()
+        self.session = ChatSession.objects.create(session_id='history')
+        moment = timezone.now()
+        # messages saved in the same instant must not be skipped between pages
+        self.messages = [ChatMessage.objects.create(session=self.session, message_type='user',
+                                                    content=str(i), timestamp=moment) for i in range(5)]
+
+    def pages(self, per_page):
+        url = reverse('chat_history') + f'?session_id=history&per_page={per_page}'
+        pages = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            pages.append([entry['content'] for entry in resp.data['history']])
+            url = resp.data['next']
+        return pages
+
+    def test_pages_through_equal_timestamps(self):
+        self.assertEqual(self.pages(2), [['3', '4'], ['1', '2'], ['0']])
+
+    def test_pages_beyond_the_cache(self):
+        with override_settings(CHATBOT_HISTORY_SIZE=2):
+            self.assertEqual(self.pages(3), [['2', '3', '4'], ['0', '1']])
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('chat_history'), {'session_id': 'history', 'cursor': 'bogus'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class HistoryCacheTestCase(TransactionTestCase):
+    """Messages are only buffered outside a transaction."""
+
+    def setUp(self):
+        response_cache.cache.clear()
+        self.session = ChatSession.objects.create(session_id='cached-history')
+        self.service = SDGChatbotService()
+
+    def test_buffered_entries_get_ids(self):
+        self.service.save_message(self.session, 'user', 'saved')
+        services.write_buffer.flush()
+        self.assertEqual([e['content'] for e in conversation_cache.recent(self.session)], ['saved'])
+        self.service.save_message(self.session, 'assistant', 'buffered')
+        cached = conversation_cache.recent(self.session)
+        self.assertEqual(cached[-1]['content'], 'buffered')
+
+        # a page smaller than the ring buffer is served from the cache
+        resp = self.client.get(reverse('chat_history'), {'session_id': 'cached-history', 'per_page': 5})
+        history = resp.data['history']
+        self.assertEqual([e['content'] for e in history], ['saved', 'buffered'])
+        self.assertTrue(all(isinstance(e['id'], int) for e in history))
+        self.assertTrue(all(isinstance(e['id'], int) for e in conversation_cache.recent(self.session)))
+
+
+class LLMGateTestCase(TestCase):
+    def hold(self, gate, key='held'):
+        """Starts a call that occupies a slot until the returned event is set."""
+        started, release = threading.Event(), threading.Event()
+
+        def call():
+            started.set()
+            release.wait(5)
+            return 'held'
+
+        thread = threading.Thread(target=gate.run, args=(key, call))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(release.set)
+        return release
+
+    def test_identical_calls_are_coalesced(self):
+        gate = LLMGate(concurrency=4, queue_timeout=1)
+        release = self.hold(gate, key='same')
+        results = []
+        follower = threading.Thread(target=lambda: results.append(gate.run('same', lambda: 'other')))
+        follower.start()
+        for _ in range(100):
+            if gate.coalesced:
+                break
+            time.sleep(0.01)
+        release.set()
+        follower.join(5)
+        self.assertEqual(results, ['held'])
+        self.assertEqual(gate.metrics()['calls'], 1)
+        self.assertEqual(gate.metrics()['coalesced'], 1)
+
+    def test_queue_timeout_rejects(self):
+        gate = LLMGate(concurrency=1, queue_timeout=0.05)
+        self.hold(gate)
+        with self.assertRaises(LLMError):
+            gate.run('other', lambda: 'never')
+        metrics = gate.metrics()
+        self.assertEqual(metrics['rejected'], 1)
+        self.assertEqual(metrics['in_flight'], 1)
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['max_queue_depth'], 1)
+        self.assertGreaterEqual(metrics['wait_ms_max'], 50)
+
+    def test_metrics(self):
+        gate = LLMGate(concurrency=2, queue_timeout=1)
+        self.assertIsNone(gate.metrics()['wait_ms_p50'])
+        self.assertEqual([gate.run(str(i), lambda: i) for i in range(3)], [0, 1, 2])
+        metrics = gate.metrics()
+        self.assertEqual((metrics['concurrency'], metrics['calls'], metrics['in_flight']), (2, 3, 0))
+        self.assertEqual((metrics['coalesced'], metrics['rejected']), (0, 0))
+        self.assertIsNotNone(metrics['wait_ms_p95'])
+
+    def test_errors_are_shared_and_release_the_slot(self):
+        gate = LLMGate(concurrency=1, queue_timeout=0.05)
+
+        def fail():
+            raise LLMError('upstream')
+
+        with self.assertRaises(LLMError):
+            gate.run('key', fail)
+        self.assertEqual(gate.run('key', lambda: 'ok'), 'ok')
+        self.assertEqual(gate.metrics()['in_flight'], 0)
+
+
+class StreamLimitTestCase(StreamClientMixin, FakeOpenAIMixin, TestCase):
+    def test_stream_holds_a_stream_slot_not_a_gate_slot(self):
+        limit = StreamLimit(limit=1)
+        gate = LLMGate(concurrency=1, queue_timeout=0.05)
+
+        async def stream_twice():
+            stream = AsyncLLMClient().stream_chat([{'role': 'user', 'content': 'hi'}])
+            self.assertTrue(await stream.__anext__())
+            self.assertEqual(limit.metrics()['open'], 1)
+            self.assertEqual(gate.metrics()['in_flight'], 0)
+            with self.assertRaises(LLMError):
+                await AsyncLLMClient().stream_chat([{'role': 'user', 'content': 'again'}]).__anext__()
+            await stream.aclose()
+
+        with mock.patch('chatbot.llm_client.stream_limit', limit), mock.patch('chatbot.llm_client.llm_gate', gate):
+            async_to_sync(stream_twice)()
+        self.assertEqual(limit.metrics(), {'limit': 1, 'open': 0, 'max_open': 1, 'streams': 1, 'rejected': 1})
+        self.assertEqual(gate.metrics()['calls'], 0)
+
+    def test_full_limit_falls_back_to_local_answer(self):
+        with mock.patch('chatbot.llm_client.stream_limit', StreamLimit(limit=0)):
+            events = parse_events(self.post({'message': 'zzzz qqqq'})[1])
+        self.assertEqual([event for event, _ in events], ['start', 'token', 'done'])
+        self.assertEqual(self.server.config.requests, 0)
+
+
+def action(title, detail='', sdgs=()):
+    return SimpleNamespace(actions=title, action_detail=detail, sdgs=list(sdgs), suggested_sdgs=[])
+
+
+def education(title, description=''):
+    return SimpleNamespace(title=title, description=description, aims='', learning_outcome='',
+                           sdgs_related=[], suggested_sdgs=[])
+
+
+class HybridRankerTestCase(TestCase):
+    def ranker(self, sdgs=(), **config):
+        ranker = HybridRanker(dict(DEFAULT_RANKING, **config))
+        # the SDG keyword matcher is not under test here
+        ranker.query_sdgs = lambda query: set(sdgs)
+        return ranker
+
+    def titles(self, ranked):
+        field = {'keywords': 'keyword', 'actions': 'actions', 'education': 'title'}
+        return {corpus: [getattr(obj, field[corpus]) for _, obj in items] for corpus, items in ranked.items()}
+
+    def test_title_weight_outranks_detail(self):
+        candidates = {'actions': [action('Plant trees', 'Saving solar energy at home'),
+                                  action('Solar energy for schools')]}
+        ranked = self.ranker().rank('solar energy', candidates)
+        # 3.0 title + 2.0 phrase against 1.0 detail only
+        self.assertEqual([score for score, _ in ranked['actions']], [5.0, 1.0])
+        self.assertEqual(self.titles(ranked)['actions'], ['Solar energy for schools', 'Plant trees'])
+
+        ranked = self.ranker(title_weight=0.1, phrase_weight=0.0, detail_weight=5.0).rank('solar energy', candidates)
+        self.assertEqual(self.titles(ranked)['actions'], ['Plant trees', 'Solar energy for schools'])
+
+    def test_corpus_and_sdg_weights(self):
+        candidates = {'actions': [action('Ocean cleanup', sdgs=['SDG 14'])],
+                      'education': [education('Ocean cleanup')]}
+        ranked = self.ranker(sdgs={'14'}, corpus_weights={'education': 2.0}).rank('ocean cleanup', candidates)
+        # title 3.0 + phrase 2.0, plus 1.5 for the matching goal on the action
+        self.assertEqual(ranked['actions'][0][0], 6.5)
+        self.assertEqual(ranked['education'][0][0], 10.0)
+
+    def test_min_coverage_drops_weak_candidates(self):
+        candidates = {'actions': [action('Recycling plastic bottles'), action('Recycling paper')]}
+        query = 'recycling plastic bottles'
+        self.assertEqual(self.titles(self.ranker().rank(query, candidates))['actions'],
+                         ['Recycling plastic bottles'])
+        self.assertEqual(self.titles(self.ranker(min_coverage=0.3).rank(query, candidates))['actions'],
+                         ['Recycling plastic bottles', 'Recycling paper'])
+
+    def test_stopword_only_query_keeps_candidates(self):
+        candidates = {'actions': [action('Anything')]}
+        self.assertEqual(self.ranker().rank('what is it', candidates)['actions'][0][0], 0.0)
+
+    def test_top_n_is_merged_across_corpora(self):
+        candidates = {
+            'keywords': [SimpleNamespace(keyword='water', note='', target='', sdggoal='')],
+            'actions': [action('Clean water access'), action('Save water'), action('Water')],
+            'education': [education('Water science'), education('History', 'water history')],
+        }
+        ranked = self.ranker(top_n=4).rank('water', candidates)
+        self.assertEqual(sum(len(items) for items in ranked.values()), 4)
+        self.assertEqual(set(ranked), {'keywords', 'actions', 'education'})
+        # every title hit scores the same; ties go to the candidates each corpus
+        # listed first, so the merge takes every corpus' first hit before a second one
+        self.assertEqual(self.titles(ranked), {
+            'keywords': ['water'],
+            'actions': ['Clean water access', 'Save water'],
+            'education': ['Water science'],
+        })
+
+        ranked = self.ranker(top_n=9, corpus_weights={'education': 0.1}).rank('water', candidates)
+        self.assertEqual(self.titles(ranked)['education'], ['Water science', 'History'])
+        self.assertEqual(len(ranked['actions']), 3)
@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path('chat/', views.chat_message, name='chat_message'),
+    path('chat/stream/', views.chat_stream, name='chat_stream'),
     path('history/', views.chat_history, name='chat_history'),
     path('session/', views.create_session, name='create_session'),
+    path('cache/metrics/', views.cache_metrics, name='chatbot_cache_metrics'),
+    path('llm/metrics/', views.llm_metrics, name='chatbot_llm_metrics'),
 ] 
\ No newline at end of file
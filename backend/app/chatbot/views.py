@@ -1,15 +1,99 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.utils import timezone
+import base64
 import json
 import uuid
-from .services import SDGChatbotService
+from datetime import datetime
+from typing import Tuple
+from .llm_client import llm_gate, stream_limit
+from .services import SDGChatbotService, response_cache
 from .serializers import ChatRequestSerializer, ChatResponseSerializer
 from .models import ChatSession, ChatMessage
+from .history import conversation_cache, message_entry
+from .write_buffer import session_messages, write_buffer
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def encode_history_cursor(entry) -> str:
+    """历史记录游标：一页中最早那条消息的 (时间, id)"""
+    raw = json.dumps([entry['timestamp'], entry['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_history_cursor(token: str) -> Tuple[datetime, int]:
+    padded = token + '=' * (-len(token) % 4)
+    timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    value = datetime.fromisoformat(timestamp)
+    if timezone.is_naive(value):
+        raise ValueError('cursor timestamp has no time zone')
+    if not isinstance(pk, int) or isinstance(pk, bool):
+        raise ValueError('cursor id must be an integer')
+    return value, pk
+
+
+def history_response(request, session_id: str) -> Response:
+    """
+    会话历史的一页，从最新的消息开始，页内按时间正序。
+    ?per_page= 每页条数（默认50，最多200）；响应中的 next 链接带 ?cursor=，
+    指向更早的一页，没有更早的消息时为 null。
+    最新一页不超过历史缓存大小时直接从缓存读取。游标是 (时间, id)，
+    因此会话中有未写入的消息时先写入队列，保证每条返回的消息都有id。
+    """
+    try:
+        session = ChatSession.objects.get(session_id=session_id)
+    except ChatSession.DoesNotExist:
+        return Response({
+            'error': 'Session not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        per_page = min(int(request.GET.get('per_page', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+        token = request.GET.get('cursor')
+        before = decode_history_cursor(token) if token else None
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return Response({
+            'error': 'Invalid per_page or cursor'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if per_page < 1:
+        return Response({
+            'error': 'Invalid per_page or cursor'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if write_buffer.pending(ChatMessage, session_id=session.pk):
+        write_buffer.flush()
+        conversation_cache.reload(session)
+    
+    # 多取一条用来判断是否还有更早的消息
+    if before is None and per_page < conversation_cache.size:
+        entries = conversation_cache.recent(session, per_page + 1)
+        if any(entry['id'] is None for entry in entries):
+            # 缓存中是消息还在队列中时追加的条目
+            entries = conversation_cache.reload(session)[-(per_page + 1):]
+    else:
+        entries = [message_entry(msg) for msg in session_messages(session, per_page + 1, before)]
+    history = entries[-per_page:]
+    
+    next_link = None
+    if len(entries) > per_page:
+        next_link = replace_query_param(request.build_absolute_uri(), 'cursor',
+                                        encode_history_cursor(history[0]))
+    return Response({
+        'session_id': session_id,
+        'next': next_link,
+        'history': history
+    }, status=status.HTTP_200_OK)
+
 
 class ChatbotView(View):
     """聊天机器人API视图"""
@@ -79,31 +163,7 @@ class ChatbotView(View):
                     'error': 'session_id is required'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # 获取会话
-            try:
-                session = ChatSession.objects.get(session_id=session_id)
-            except ChatSession.DoesNotExist:
-                return Response({
-                    'error': 'Session not found'
-                }, status=status.HTTP_404_NOT_FOUND)
-            
-            # 获取聊天历史
-            messages = ChatMessage.objects.filter(session=session).order_by('timestamp')
-            
-            history = []
-            for msg in messages:
-                history.append({
-                    'id': msg.id,
-                    'type': msg.message_type,
-                    'content': msg.content,
-                    'timestamp': msg.timestamp.isoformat(),
-                    'metadata': msg.metadata
-                })
-            
-            return Response({
-                'session_id': session_id,
-                'history': history
-            }, status=status.HTTP_200_OK)
+            return history_response(request, session_id)
             
         except Exception as e:
             return Response({
@@ -178,31 +238,7 @@ def chat_history(request):
                 'error': 'session_id is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # 获取会话
-        try:
-            session = ChatSession.objects.get(session_id=session_id)
-        except ChatSession.DoesNotExist:
-            return Response({
-                'error': 'Session not found'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # 获取聊天历史
-        messages = ChatMessage.objects.filter(session=session).order_by('timestamp')
-        
-        history = []
-        for msg in messages:
-            history.append({
-                'id': msg.id,
-                'type': msg.message_type,
-                'content': msg.content,
-                'timestamp': msg.timestamp.isoformat(),
-                'metadata': msg.metadata
-            })
-        
-        return Response({
-            'session_id': session_id,
-            'history': history
-        }, status=status.HTTP_200_OK)
+        return history_response(request, session_id)
         
     except Exception as e:
         return Response({
@@ -230,4 +266,62 @@ def create_session(request):
         return Response({
             'error': 'Internal server error',
             'message': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_metrics(request):
+    """回答缓存的命中/未命中统计"""
+    return Response(response_cache.metrics(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def llm_metrics(request):
+    """本进程OpenAI调用的并发、排队等待和请求合并统计，以及进行中的流式回答"""
+    return Response(dict(llm_gate.metrics(), streams=stream_limit.metrics()), status=status.HTTP_200_OK)
+
+
+def sse_event(event: str, data) -> str:
+    """按Server-Sent Events格式编码一个事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@csrf_exempt
+@require_POST
+async def chat_stream(request):
+    """
+    流式聊天端点（SSE）：POST {"message": ..., "session_id": ..., "user_id": ...}
+    依次返回 start、token（逐段文本）、done 事件；出错时返回 error 事件。
+    响应体是异步生成器，需要在ASGI服务器（uvicorn，见 start.sh）下运行：
+    等待OpenAI时不占用线程，一个进程可同时保持大量连接（上限见
+    CHATBOT_STREAM_CONCURRENCY）。WSGI服务器会先读完整个回答再发送。
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON format'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = ChatRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse({
+            'error': 'Invalid request data',
+            'details': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    message = serializer.validated_data['message']
+    session_id = serializer.validated_data.get('session_id') or str(uuid.uuid4())
+    user_id = serializer.validated_data.get('user_id')
+    
+    async def events():
+        try:
+            async for event, payload in SDGChatbotService().stream_chat_message(message, session_id, user_id):
+                yield sse_event(event, payload)
+        except Exception as e:
+            print(f"Error in chat_stream: {str(e)}")
+            yield sse_event('error', {'error': 'Internal server error', 'message': str(e)})
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # 关闭反向代理缓冲，保证每个片段立即送达浏览器
+    response['X-Accel-Buffering'] = 'no'
+    return response
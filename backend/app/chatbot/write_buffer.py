@@ -0,0 +1,239 @@
+import atexit
+import logging
+import os
+import signal
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection
+from django.db.models import Q
+
+from .models import ChatMessage, ChatSession, DatabaseSearchLog
+
+logger = logging.getLogger(__name__)
+
+# 按外键依赖顺序写入
+BUFFERED_MODELS = (ChatMessage, DatabaseSearchLog)
+
+
+class WriteBehindBuffer:
+    """
+    聊天消息和搜索日志的延迟批量写入缓冲。
+
+    add() 只把未保存的对象放入队列；后台线程在队列达到 CHATBOT_WRITE_BUFFER_SIZE
+    条或距上次写入 CHATBOT_WRITE_FLUSH_INTERVAL 秒时用 bulk_create 一次写入，
+    进程正常退出（atexit）或收到 SIGTERM（见 install_signal_handlers）时再写入
+    剩余的对象。因此一轮对话的响应时间不再包含 INSERT 的往返。SIGKILL 或崩溃时
+    队列中最多 CHATBOT_WRITE_FLUSH_INTERVAL 秒的对象会丢失。
+
+    CHATBOT_WRITE_BUFFER_SIZE <= 1 或处于事务中（例如测试）时直接同步写入。
+    数据库暂时不可用时对象放回队列下次再试，队列超过 max_pending 时丢弃最旧的；
+    丢弃的行（包括 IntegrityError）以 error 级别记录日志。
+    """
+
+    def __init__(self, max_size: Optional[int] = None, interval: Optional[float] = None,
+                 max_pending: Optional[int] = None):
+        self._max_size = max_size
+        self._interval = interval
+        self._max_pending = max_pending
+        self._pending: List = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed = 0
+        self.dropped = 0
+
+    @property
+    def max_size(self) -> int:
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'CHATBOT_WRITE_BUFFER_SIZE', 100)
+
+    @property
+    def interval(self) -> float:
+        if self._interval is not None:
+            return self._interval
+        return getattr(settings, 'CHATBOT_WRITE_FLUSH_INTERVAL', 1.0)
+
+    @property
+    def max_pending(self) -> int:
+        return self._max_pending if self._max_pending is not None else self.max_size * 50
+
+    @property
+    def enabled(self) -> bool:
+        # 事务中的写入必须随事务提交或回滚，不能交给后台线程
+        return self.max_size > 1 and not connection.in_atomic_block
+
+    def add(self, obj):
+        """排队写入一个未保存的 ChatMessage 或 DatabaseSearchLog"""
+        if not self.enabled:
+            obj.save()
+            return obj
+        self._start()
+        with self._lock:
+            self._pending.append(obj)
+            full = len(self._pending) >= self.max_size
+        if full:
+            self._wakeup.set()
+        return obj
+
+    def pending(self, model, **filters) -> List:
+        """尚未写入数据库的对象（例如某个会话的消息），按字段值过滤"""
+        with self._lock:
+            return [obj for obj in self._pending
+                    if isinstance(obj, model) and all(getattr(obj, k) == v for k, v in filters.items())]
+
+    def flush(self) -> int:
+        """立即写入队列中的所有对象，返回写入的行数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            written = 0
+            for model in BUFFERED_MODELS:
+                rows = [obj for obj in batch if type(obj) is model]
+                if not rows:
+                    continue
+                try:
+                    model.objects.bulk_create(rows, batch_size=self.max_size or None)
+                except IntegrityError as e:
+                    # 例如会话已被删除，重试也不会成功
+                    logger.error("Chatbot write buffer: dropped %d %s rows: %s", len(rows), model.__name__, e)
+                    self.dropped += len(rows)
+                    continue
+                except DatabaseError as e:
+                    logger.warning("Chatbot write buffer: failed to write %d %s rows, will retry: %s",
+                                   len(rows), model.__name__, e)
+                    self._requeue(rows)
+                    continue
+                written += len(rows)
+            self.flushed += written
+            return written
+
+    def _requeue(self, rows: List):
+        with self._lock:
+            self._pending[:0] = rows
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+                logger.error("Chatbot write buffer full, dropped the %d oldest rows", overflow)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chatbot-write-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Chatbot write buffer flush failed: {e}")
+            finally:
+                close_old_connections()
+
+
+def install_signal_handlers(buffer: WriteBehindBuffer, timeout: float = 10.0):
+    """
+    收到 SIGTERM 时先写入队列，再交给原来的处理方式（服务器自己的处理函数或默认的退出）。
+    守护线程和 atexit 在 SIGTERM 的默认处理下都不会执行。只能在主线程中调用。
+
+    写入在单独的线程中进行并最多等待 timeout 秒：信号可能在主线程持有缓冲的锁时到达，
+    直接在处理函数中写入会死锁。
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def flush():
+        try:
+            buffer.flush()
+        except Exception as e:
+            logger.error("Chatbot write buffer flush on SIGTERM failed: %s", e)
+        finally:
+            connection.close()
+
+    def handle(signum, frame):
+        flusher = threading.Thread(target=flush, name='chatbot-write-buffer-exit', daemon=True)
+        flusher.start()
+        flusher.join(timeout)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+write_buffer = WriteBehindBuffer()
+atexit.register(write_buffer.flush)
+
+
+def session_messages(session: ChatSession, limit: Optional[int] = None,
+                     before: Optional[Tuple[datetime, int]] = None) -> List[ChatMessage]:
+    """
+    会话的消息（已写入的加上队列中的），按 (时间, id) 正序；limit 只取最近的若干条。
+    before 为 (时间, id) 游标，只取排在它之前的已写入消息（用于向前翻页）；
+    同一时间的消息按id区分，不会被跳过。队列中的消息比任何已写入的消息都新，翻页时不包含。
+    """
+    queryset = ChatMessage.objects.filter(session=session).order_by('-timestamp', '-id')
+    if before is not None:
+        timestamp, pk = before
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+        saved = list(queryset[:limit] if limit else queryset)
+        saved.reverse()
+        return saved
+    # 先取队列再查数据库：期间被写入的消息会出现两次，按内容去重
+    pending = write_buffer.pending(ChatMessage, session_id=session.pk)
+    saved = list(queryset[:limit] if limit else queryset)
+    seen = {(msg.timestamp, msg.message_type, msg.content) for msg in saved}
+    messages = saved + [msg for msg in pending if (msg.timestamp, msg.message_type, msg.content) not in seen]
+    # 队列中的消息还没有id，排在同一时间的已写入消息之后
+    messages.sort(key=lambda msg: (msg.timestamp, msg.id is None, msg.id or 0))
+    return messages[-limit:] if limit else messages
+
+
+class SessionCache:
+    """
+    session_id -> ChatSession 的进程内LRU缓存，同一会话的后续消息不再执行 get_or_create。
+    会话只会随所属用户一起删除；若缓存的会话已被删除，之后的批量写入会失败并记录日志。
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._sessions: 'OrderedDict[str, ChatSession]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session: ChatSession):
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+session_cache = SessionCache()
@@ -0,0 +1,193 @@
+import random
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from teams.models import TeamMember
+from .google_docs_service import GoogleDocsService
+from .models import GoogleDocLayout, GoogleDocsJob, SDGActionPlan
+
+
+class JobFailed(Exception):
+    """Raised by a job whose Google Docs call did not succeed; the job is retried."""
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def plan_content(action_plan: SDGActionPlan) -> dict:
+    """The fields of an action plan that are written to its Google Doc."""
+    return {
+        'impact_project_name': action_plan.impact_project_name,
+        'name_of_designers': action_plan.name_of_designers,
+        'description': action_plan.description,
+        'plan_content': action_plan.plan_content
+    }
+
+
+def enqueue_job(action_plan, kind: str, payload: Optional[dict] = None) -> GoogleDocsJob:
+    """
+    Queues a Google Docs job. Call it inside the transaction that changes
+    the plan so that the job is stored if and only if the change is.
+
+    Create and update jobs read the plan when they run, so a new one is not
+    added while an equivalent job is still pending; an update is also
+    unnecessary while the document is still waiting to be created.
+    """
+    plan_id = getattr(action_plan, 'pk', action_plan)
+    if kind in (GoogleDocsJob.KIND_CREATE, GoogleDocsJob.KIND_UPDATE):
+        kinds = [GoogleDocsJob.KIND_CREATE]
+        if kind == GoogleDocsJob.KIND_UPDATE:
+            kinds.append(GoogleDocsJob.KIND_UPDATE)
+        queued = GoogleDocsJob.objects.filter(
+            action_plan_id=plan_id, kind__in=kinds, status=GoogleDocsJob.STATUS_PENDING
+        ).first()
+        if queued is not None:
+            return queued
+    return GoogleDocsJob.objects.create(action_plan_id=plan_id, kind=kind, payload=payload or {})
+
+
+def load_layout(document_id: str) -> Optional[dict]:
+    """The layout recorded by the last sync of a Google Doc, if any."""
+    layout = GoogleDocLayout.objects.filter(document_id=document_id).first()
+    return layout.as_layout() if layout else None
+
+
+def save_layout(document_id: str, layout: dict):
+    GoogleDocLayout.objects.update_or_create(document_id=document_id, defaults={
+        'revision_id': layout.get('revision_id') or '',
+        'sections': layout.get('sections') or [],
+    })
+
+
+def backoff_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts`: exponential with jitter, capped."""
+    base = _setting('GOOGLE_DOCS_JOB_BACKOFF', 30)
+    cap = _setting('GOOGLE_DOCS_JOB_MAX_BACKOFF', 3600)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_jobs(limit: int = 10) -> List[GoogleDocsJob]:
+    """
+    Marks up to `limit` due jobs as running and returns them. Jobs left
+    running by a worker that died are picked up again once
+    GOOGLE_DOCS_JOB_LOCK_TIMEOUT seconds have passed.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('GOOGLE_DOCS_JOB_LOCK_TIMEOUT', 600))
+    with transaction.atomic():
+        due = GoogleDocsJob.objects.filter(
+            status=GoogleDocsJob.STATUS_PENDING, run_after__lte=now
+        ) | GoogleDocsJob.objects.filter(
+            status=GoogleDocsJob.STATUS_RUNNING, locked_at__lt=stale
+        )
+        jobs = list(due.select_for_update(skip_locked=True).order_by('run_after', 'id')[:limit])
+        if jobs:
+            GoogleDocsJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=GoogleDocsJob.STATUS_RUNNING, locked_at=now, updated_at=now)
+        for job in jobs:
+            job.status = GoogleDocsJob.STATUS_RUNNING
+            job.locked_at = now
+    return jobs
+
+
+def finish_job(job: GoogleDocsJob, error: Optional[Exception] = None):
+    """Records the outcome of a job, scheduling a retry or giving up after the last attempt."""
+    now = timezone.now()
+    if error is None:
+        GoogleDocsJob.objects.filter(pk=job.pk).update(
+            status=GoogleDocsJob.STATUS_DONE, locked_at=None, last_error='', updated_at=now)
+        return
+    attempts = job.attempts + 1
+    if attempts >= _setting('GOOGLE_DOCS_JOB_MAX_ATTEMPTS', 5):
+        status, run_after = GoogleDocsJob.STATUS_FAILED, job.run_after
+    else:
+        status, run_after = GoogleDocsJob.STATUS_PENDING, now + timedelta(seconds=backoff_delay(attempts))
+    GoogleDocsJob.objects.filter(pk=job.pk).update(
+        status=status, attempts=attempts, run_after=run_after, locked_at=None,
+        last_error=f'{type(error).__name__}: {error}'[:2000], updated_at=now)
+    job.status, job.attempts, job.run_after = status, attempts, run_after
+
+
+def run_job(job: GoogleDocsJob, service):
+    """Performs one job with a GoogleDocsService; raises on failure."""
+    try:
+        action_plan = SDGActionPlan.objects.select_related('team').get(pk=job.action_plan_id)
+    except SDGActionPlan.DoesNotExist:
+        return
+
+    if job.kind == GoogleDocsJob.KIND_CREATE:
+        if action_plan.google_doc_id:
+            return
+        document_id = service.create_document(action_plan.impact_project_name, plan_content(action_plan))
+        if not document_id:
+            raise JobFailed("Google Docs did not return a document ID")
+        with transaction.atomic():
+            SDGActionPlan.objects.filter(pk=action_plan.pk).update(
+                google_doc_id=document_id,
+                google_doc_url=service.get_document_url(document_id),
+                google_doc_created=True,
+                last_sync_time=timezone.now())
+            # share with the team, one job per member so each is retried on its own
+            emails = TeamMember.objects.filter(
+                team=action_plan.team, is_pending=False
+            ).exclude(user__email='').values_list('user__email', flat=True)
+            for email in emails:
+                enqueue_job(action_plan, GoogleDocsJob.KIND_SHARE, {'email': email, 'role': 'writer'})
+            # the Docs API creates documents empty; the content is written by an update
+            enqueue_job(action_plan, GoogleDocsJob.KIND_UPDATE)
+
+    elif job.kind == GoogleDocsJob.KIND_UPDATE:
+        if not (action_plan.google_doc_id and action_plan.google_doc_created):
+            return
+        layout = service.sync_document(action_plan.google_doc_id, plan_content(action_plan),
+                                       load_layout(action_plan.google_doc_id))
+        if layout is None:
+            raise JobFailed("Google Docs update failed")
+        with transaction.atomic():
+            save_layout(action_plan.google_doc_id, layout)
+            SDGActionPlan.objects.filter(pk=action_plan.pk).update(last_sync_time=timezone.now())
+
+    elif job.kind == GoogleDocsJob.KIND_SHARE:
+        if not action_plan.google_doc_id:
+            raise JobFailed("The document has not been created yet")
+        if not service.share_document(action_plan.google_doc_id, job.payload.get('email'),
+                                      job.payload.get('role', 'writer')):
+            raise JobFailed(f"Sharing with {job.payload.get('email')} failed")
+
+    else:
+        raise JobFailed(f"Unknown job kind {job.kind!r}")
+
+
+def process_jobs(limit: int = 10, service=None) -> int:
+    """
+    Claims and runs up to `limit` due jobs; returns how many were claimed.
+    Unless a service is given, a GoogleDocsService is created for the batch;
+    if that fails (e.g. authorization is missing) the jobs are retried later.
+    """
+    jobs = claim_jobs(limit)
+    if not jobs:
+        return 0
+    if service is None:
+        try:
+            service = GoogleDocsService()
+        except Exception as e:
+            print(f"Cannot connect to Google Docs: {e}")
+            for job in jobs:
+                finish_job(job, e)
+            return len(jobs)
+
+    for job in jobs:
+        try:
+            run_job(job, service)
+        except Exception as e:
+            print(f"Google Docs {job.kind} job {job.pk} failed: {e}")
+            finish_job(job, e)
+        else:
+            finish_job(job)
+    return len(jobs)
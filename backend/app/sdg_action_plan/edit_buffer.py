@@ -0,0 +1,274 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import SDGActionPlan
+from .patching import JSON_FIELD, apply_to_document, normalize_ops, parse_path, patch_action_plan
+from .text_ot import OTError, TextDocument, TextOperation
+
+FlushListener = Callable[[], Awaitable[None]]
+
+# columns held in a room's document state
+DOCUMENT_FIELDS = (
+    'impact_project_name', 'name_of_designers', 'description', 'status', JSON_FIELD,
+    'google_doc_id', 'google_doc_created',
+)
+
+
+def flush_interval() -> float:
+    """Seconds between writes of a room's buffered edits (ACTION_PLAN_EDIT_FLUSH_MS)."""
+    return max(0, getattr(settings, 'ACTION_PLAN_EDIT_FLUSH_MS', 500)) / 1000
+
+
+def load_document(plan_id) -> Optional[Dict]:
+    """Reads the fields of an action plan that a room keeps in memory."""
+    return SDGActionPlan.objects.filter(pk=plan_id).values(*DOCUMENT_FIELDS).first()
+
+
+class RoomEditBuffer:
+    """
+    Document state and pending field edits for one action plan (one
+    WebSocket room).
+
+    The plan is read when a client of the room connects and edits are
+    applied to that copy in place, so the consumers answer from memory
+    instead of re-reading the row for every message. The state lives in
+    this process; edits are written to the database as field-level patches,
+    so other processes serving the same plan do not overwrite each other's
+    fields. After every write, and whenever another client joins, the plan
+    is read again so that changes made outside the room (the REST API,
+    other processes) show up in the document; edits not written yet are
+    applied on top of what was read.
+
+    Edits to the same field collapse to the latest value, and an edit to a
+    parent path (e.g. the whole plan_content) supersedes earlier edits below
+    it. The batch is written with a single patch_action_plan call, i.e. one
+    transaction, at most once per flush interval and whenever a client
+    disconnects, so database writes follow editing sessions rather than
+    keystrokes.
+
+    Text fields edited with character-level operations get a TextDocument
+    (see text_ot) that rebases concurrent operations; whole-value updates
+    of such a field, and changes to it found when the plan is read again,
+    reset it. Reset fields are collected until the consumers take them
+    (pop_text_resets) and send their clients the new text.
+    """
+
+    def __init__(self, plan_id, interval: Optional[float] = None):
+        self.plan_id = plan_id
+        self.interval = flush_interval() if interval is None else interval
+        self.document: Optional[Dict] = None
+        self.pending: Dict[Tuple[str, ...], Dict] = {}
+        self.text_documents: Dict[Tuple[str, ...], TextDocument] = {}
+        # field name used by the clients of each text document
+        self.text_fields: Dict[Tuple[str, ...], str] = {}
+        self.text_resets: Set[Tuple[str, ...]] = set()
+        self.listeners: List[FlushListener] = []
+        self.writes = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._loaded: Optional[asyncio.Future] = None
+
+    async def load(self, refresh: bool = False) -> Optional[Dict]:
+        """
+        Reads the plan once, or again if refresh is set and the last read
+        has finished; concurrent callers wait for the same read.
+        """
+        if self._loaded is None or (refresh and self._loaded.done()):
+            self._loaded = asyncio.ensure_future(self._read_locked())
+            try:
+                await asyncio.shield(self._loaded)
+            except Exception:
+                self._loaded = None
+                raise
+        else:
+            await asyncio.shield(self._loaded)
+        return self.document
+
+    async def _read_locked(self) -> Optional[Dict]:
+        async with self._write_lock:
+            return await self._read()
+
+    async def _read(self) -> Optional[Dict]:
+        """
+        Replaces the document with the plan as stored, with the edits not
+        written yet applied on top; text fields whose value changed are reset.
+        Called with the write lock held, so no batch is half written.
+        """
+        document = await sync_to_async(load_document)(self.plan_id)
+        if document is not None:
+            for keys, op in self.pending.items():
+                self._apply(document, keys, op['value'])
+        self.document = document
+        if document is not None:
+            self._reset_text_documents(())
+        return document
+
+    @staticmethod
+    def _apply(document: Dict, keys: Tuple[str, ...], value) -> None:
+        if len(keys) == 1:
+            document[keys[0]] = value
+        else:
+            if not isinstance(document.get(JSON_FIELD), dict):
+                document[JSON_FIELD] = {}
+            apply_to_document(document[JSON_FIELD], list(keys[1:]), 'replace', value)
+
+    def add(self, field_name: str, value) -> None:
+        """
+        Applies one replace of field_name to the document and queues it for
+        writing; raises PatchError if it is not a patchable path.
+        """
+        op = {'op': 'replace', 'path': field_name, 'value': value}
+        normalize_ops([op])
+        keys = tuple(parse_path(field_name))
+        if self.document is not None:
+            self._apply(self.document, keys, value)
+            self._reset_text_documents(keys)
+        self._queue(keys, op)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    def _value_at(self, keys: Tuple[str, ...]):
+        value = self.document
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+
+    def _reset_text_documents(self, keys: Tuple[str, ...]):
+        for tracked in [k for k in self.text_documents if k[:len(keys)] == keys or keys[:len(k)] == k]:
+            value = self._value_at(tracked)
+            if value is None:
+                value = ''
+            text = self.text_documents[tracked]
+            if not isinstance(value, str):
+                del self.text_documents[tracked]
+                del self.text_fields[tracked]
+                self.text_resets.discard(tracked)
+            elif value != text.text:
+                text.reset(value)
+                self.text_resets.add(tracked)
+
+    def pop_text_resets(self) -> Dict[str, TextDocument]:
+        """The text fields reset since the last call, by field name; their clients must be sent the new text."""
+        resets = {self.text_fields[keys]: self.text_documents[keys] for keys in self.text_resets}
+        self.text_resets = set()
+        return resets
+
+    def text_document(self, field_name: str) -> TextDocument:
+        """The room's TextDocument for a text field, created from the current value."""
+        keys = tuple(parse_path(field_name))
+        text = self.text_documents.get(keys)
+        if text is None:
+            normalize_ops([{'op': 'replace', 'path': field_name, 'value': ''}])
+            if self.document is None:
+                raise OTError("The form does not exist")
+            value = self._value_at(keys)
+            if value is None:
+                value = ''
+            if not isinstance(value, str):
+                raise OTError(f"{field_name} is not a text field")
+            text = self.text_documents[keys] = TextDocument(value)
+            self.text_fields[keys] = field_name
+        return text
+
+    def apply_text_operation(self, field_name: str, revision, operation: TextOperation) -> Tuple[TextOperation, int]:
+        """
+        Rebases a client's operation on a text field over the operations it
+        has not seen, applies it and queues the new value for writing.
+        Returns the operation as applied and the new revision; raises
+        OTError (or PatchError) if it cannot be applied.
+        """
+        text = self.text_document(field_name)
+        operation = text.transform(revision, operation)
+        value = operation.apply(text.text)
+        normalize_ops([{'op': 'replace', 'path': field_name, 'value': value}])
+        revision = text.push(operation, value)
+        self.add(field_name, value)
+        return operation, revision
+
+    def _queue(self, keys: Tuple[str, ...], op: Dict) -> None:
+        for queued in [k for k in self.pending if k[:len(keys)] == keys]:
+            del self.pending[queued]
+        self.pending[keys] = op
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self) -> bool:
+        """Writes the pending edits; returns True if anything was written."""
+        async with self._write_lock:
+            if not self.pending:
+                return False
+            batch, self.pending = self.pending, {}
+            try:
+                written = await sync_to_async(patch_action_plan)(self.plan_id, list(batch.values()))
+            except Exception as e:
+                print(f"Error writing edits for action plan {self.plan_id}: {e}")
+                # keep them for the next flush, behind any newer edits to the same fields
+                newer, self.pending = self.pending, {}
+                for keys, op in list(batch.items()) + list(newer.items()):
+                    self._queue(keys, op)
+                return False
+            if not written:
+                print(f"Dropped {len(batch)} edits for missing action plan {self.plan_id}")
+                self.document = None
+                return False
+            self.writes += 1
+            try:
+                await self._read()
+            except Exception as e:
+                print(f"Error re-reading action plan {self.plan_id}: {e}")
+
+        if self.listeners:
+            try:
+                await self.listeners[0]()
+            except Exception as e:
+                print(f"Error after writing edits for action plan {self.plan_id}: {e}")
+        return True
+
+    async def close(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+
+class EditBufferRegistry:
+    """One RoomEditBuffer per room, shared by the consumers of this process."""
+
+    def __init__(self):
+        self.rooms: Dict[str, RoomEditBuffer] = {}
+
+    async def join(self, room_name: str, listener: Optional[FlushListener] = None) -> RoomEditBuffer:
+        """
+        Returns the room's buffer with its document loaded, re-reading it if
+        the room was already open. listener is awaited after the room's
+        edits are written (by one connected consumer, e.g. to sync Google
+        Docs).
+        """
+        buffer = self.rooms.get(room_name)
+        if buffer is None:
+            buffer = self.rooms[room_name] = RoomEditBuffer(room_name)
+        if listener is not None:
+            buffer.listeners.append(listener)
+        await buffer.load(refresh=True)
+        return buffer
+
+    async def leave(self, room_name: str, listener: Optional[FlushListener] = None):
+        """Writes the room's pending edits; the buffer is dropped with its last consumer."""
+        buffer = self.rooms.get(room_name)
+        if buffer is None:
+            return
+        await buffer.flush()
+        if listener in buffer.listeners:
+            buffer.listeners.remove(listener)
+        if not buffer.listeners and not buffer.pending:
+            await buffer.close()
+            if self.rooms.get(room_name) is buffer:
+                del self.rooms[room_name]
+
+
+# Global registry used by SDGFormConsumer
+edit_buffers = EditBufferRegistry()
@@ -1,7 +1,8 @@
+import difflib
 import os
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
@@ -12,6 +13,172 @@ from django.utils import timezone
 import pickle
 
 
+# A block of the generated document: (key, text). Keys are "title",
+# "header:<name>" or "field:<name>"; field text is "<Label>: <value>\n".
+Section = Tuple[str, str]
+
+
+def doc_length(text: str) -> int:
+    """Length in Google Docs index units (UTF-16 code units)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def document_sections(content: Dict[str, Any]) -> List[Section]:
+    """The blocks of the document for an action plan, in order"""
+    plan_content = content.get("plan_content") or {}
+    sections = [('title', f'SDG Action Plan: {content.get("impact_project_name", "Untitled")}\n\n')]
+    
+    def header(name, title):
+        sections.append((f'header:{name}', f'{title}\n'))
+    
+    def field(name, label, value):
+        sections.append((f'field:{name}', f'{label}: {value}\n'))
+    
+    # Basic information section
+    header('basic', 'Basic Information')
+    field('impact_project_name', 'Project Name', content.get('impact_project_name', ''))
+    field('name_of_designers', 'Designers', content.get('name_of_designers', ''))
+    field('description', 'Description', content.get('description', ''))
+    
+    # Plan content section
+    header('plan', 'Plan Content')
+    sdgs = plan_content.get("SDGs", [])
+    if sdgs:
+        field('SDGs', 'Related SDGs', ", ".join(str(sdg) for sdg in sdgs))
+    field('role', 'Role and Affiliation', plan_content.get('role', ''))
+    field('challenge', 'Main Challenge', plan_content.get('challenge', ''))
+    
+    # Implementation Steps
+    header('steps', 'Implementation Steps')
+    steps = plan_content.get("steps") or {}
+    for i in range(1, 7):
+        step_content = steps.get(f"input{i}", "")
+        if step_content:
+            field(f'steps.input{i}', f'Step {i}', step_content)
+    
+    # Impact Types
+    impact_types = plan_content.get("impact_types") or {}
+    if any(impact_types.values()):
+        header('impact_types', 'Impact Types')
+        for rank, impact_type in impact_types.items():
+            if impact_type:
+                field(f'impact_types.{rank}', f'Rank {str(rank)[-1]}', impact_type)
+    
+    # Other fields
+    other_fields = [
+        ("importance", "Impact Importance"),
+        ("example", "Existing Example"),
+        ("resources", "Resources and Partnerships"),
+        ("impact", "Impact Avenues"),
+        ("risk", "Risks and Inhibitors"),
+        ("mitigation", "Mitigation Strategies")
+    ]
+    for field_key, field_name in other_fields:
+        field_value = plan_content.get(field_key, "")
+        if field_value:
+            field(field_key, field_name, field_value)
+    return sections
+
+
+def section_requests(index: int, sections: List[Section]) -> list:
+    """Insert sections at index, with heading / bold-label formatting"""
+    if not sections:
+        return []
+    text = ''.join(section_text for _, section_text in sections)
+    requests = [{'insertText': {'location': {'index': index}, 'text': text}}]
+    for key, section_text in sections:
+        end = index + doc_length(section_text)
+        is_header = key.startswith('header:')
+        requests.append({
+            'updateParagraphStyle': {
+                'range': {'startIndex': index, 'endIndex': end},
+                'paragraphStyle': {'namedStyleType': 'HEADING_1' if is_header else 'NORMAL_TEXT'},
+                'fields': 'namedStyleType'
+            }
+        })
+        if key.startswith('field:'):
+            # inserted text takes the style of its neighbours, so set both parts
+            label_end = index + doc_length(section_text.split(': ', 1)[0])
+            requests.append({
+                'updateTextStyle': {
+                    'range': {'startIndex': index, 'endIndex': label_end},
+                    'textStyle': {'bold': True},
+                    'fields': 'bold'
+                }
+            })
+            requests.append({
+                'updateTextStyle': {
+                    'range': {'startIndex': label_end, 'endIndex': end},
+                    'textStyle': {'bold': False},
+                    'fields': 'bold'
+                }
+            })
+        index = end
+    return requests
+
+
+def _changed_text_requests(start: int, old: str, new: str) -> list:
+    """Replace only the differing middle of a section (common prefix and suffix are kept)"""
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    position = start + doc_length(old[:prefix])
+    requests = []
+    removed = old[prefix:len(old) - suffix]
+    if removed:
+        requests.append({
+            'deleteContentRange': {
+                'range': {'startIndex': position, 'endIndex': position + doc_length(removed)}
+            }
+        })
+    inserted = new[prefix:len(new) - suffix]
+    if inserted:
+        requests.append({'insertText': {'location': {'index': position}, 'text': inserted}})
+    return requests
+
+
+def diff_requests(old: List[Section], new: List[Section]) -> list:
+    """
+    batchUpdate requests turning a document laid out as `old` into `new`.
+    Sections are matched by key; unchanged sections produce no requests.
+    Changes are emitted from the end of the document backwards so that
+    the indexes of earlier sections stay valid.
+    """
+    starts = [1]
+    for _, text in old:
+        starts.append(starts[-1] + doc_length(text))
+    
+    matcher = difflib.SequenceMatcher(None, [key for key, _ in old], [key for key, _ in new], autojunk=False)
+    requests = []
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == 'equal':
+            for offset in reversed(range(i2 - i1)):
+                old_text, new_text = old[i1 + offset][1], new[j1 + offset][1]
+                if old_text != new_text:
+                    requests.extend(_changed_text_requests(starts[i1 + offset], old_text, new_text))
+            continue
+        if i2 > i1:
+            requests.append({
+                'deleteContentRange': {
+                    'range': {'startIndex': starts[i1], 'endIndex': starts[i2]}
+                }
+            })
+        requests.extend(section_requests(starts[i1], new[j1:j2]))
+    return requests
+
+
+def layout_for(sections: List[Section], response: Dict[str, Any]) -> Dict[str, Any]:
+    """The layout to keep for the next sync: sections and the revision after the update"""
+    return {
+        'revision_id': (response.get('writeControl') or {}).get('requiredRevisionId'),
+        'sections': [list(section) for section in sections],
+    }
+
+
 class OAuthRequired(Exception):
     def __init__(self, auth_url):
         self.auth_url = auth_url
@@ -298,179 +465,67 @@ class GoogleDocsService:
             print(f'Unexpected error: {e}')
             return None
     
-    def _insert_formatted_content(self, document_id: str, content: Dict[str, Any]):
-        """Insert formatted content into the Google Docs document"""
-        requests = []
-        
-        # Document title
-        requests.append({
-            'insertText': {
-                'location': {
-                    'index': 1
-                },
-                'text': f'SDG Action Plan: {content.get("impact_project_name", "Untitled")}\n\n'
-            }
-        })
+    def _rebuild_document(self, document_id: str, sections: List[Section]) -> Optional[Dict[str, Any]]:
+        """Replace the whole body with the given sections (one read and one batchUpdate)"""
+        document = self.service.documents().get(documentId=document_id).execute()
+        content_length = document['body']['content'][-1]['endIndex'] - 1
         
-        current_index = len(f'SDG Action Plan: {content.get("impact_project_name", "Untitled")}\n\n') + 1
-        
-        # Basic information section
-        requests.extend(self._add_section_header(current_index, "Basic Information"))
-        current_index += len("Basic Information\n") + 1
-        
-        # Project details
-        requests.extend(self._add_field(current_index, "Project Name", content.get("impact_project_name", "")))
-        current_index += len(f"Project Name: {content.get('impact_project_name', '')}\n") + 1
-        
-        requests.extend(self._add_field(current_index, "Designers", content.get("name_of_designers", "")))
-        current_index += len(f"Designers: {content.get('name_of_designers', '')}\n") + 1
-        
-        requests.extend(self._add_field(current_index, "Description", content.get("description", "")))
-        current_index += len(f"Description: {content.get('description', '')}\n\n") + 1
-        
-        # Plan content section
-        plan_content = content.get("plan_content", {})
-        
-        requests.extend(self._add_section_header(current_index, "Plan Content"))
-        current_index += len("Plan Content\n") + 1
-        
-        # SDGs
-        sdgs = plan_content.get("SDGs", [])
-        if sdgs:
-            requests.extend(self._add_field(current_index, "Related SDGs", ", ".join(sdgs)))
-            current_index += len(f"Related SDGs: {', '.join(sdgs)}\n") + 1
-        
-        # Role
-        requests.extend(self._add_field(current_index, "Role and Affiliation", plan_content.get("role", "")))
-        current_index += len(f"Role and Affiliation: {plan_content.get('role', '')}\n") + 1
-        
-        # Challenge
-        requests.extend(self._add_field(current_index, "Main Challenge", plan_content.get("challenge", "")))
-        current_index += len(f"Main Challenge: {plan_content.get('challenge', '')}\n") + 1
-        
-        # Implementation Steps
-        requests.extend(self._add_section_header(current_index, "Implementation Steps"))
-        current_index += len("Implementation Steps\n") + 1
-        
-        steps = plan_content.get("steps", {})
-        for i in range(1, 7):
-            step_key = f"input{i}"
-            step_content = steps.get(step_key, "")
-            if step_content:
-                requests.extend(self._add_field(current_index, f"Step {i}", step_content))
-                current_index += len(f"Step {i}: {step_content}\n") + 1
-        
-        # Impact Types
-        impact_types = plan_content.get("impact_types", {})
-        if any(impact_types.values()):
-            requests.extend(self._add_section_header(current_index, "Impact Types"))
-            current_index += len("Impact Types\n") + 1
-            
-            for rank, impact_type in impact_types.items():
-                if impact_type:
-                    requests.extend(self._add_field(current_index, f"Rank {rank[-1]}", impact_type))
-                    current_index += len(f"Rank {rank[-1]}: {impact_type}\n") + 1
-        
-        # Other fields
-        other_fields = [
-            ("importance", "Impact Importance"),
-            ("example", "Existing Example"),
-            ("resources", "Resources and Partnerships"),
-            ("impact", "Impact Avenues"),
-            ("risk", "Risks and Inhibitors"),
-            ("mitigation", "Mitigation Strategies")
-        ]
-        
-        for field_key, field_name in other_fields:
-            field_value = plan_content.get(field_key, "")
-            if field_value:
-                requests.extend(self._add_field(current_index, field_name, field_value))
-                current_index += len(f"{field_name}: {field_value}\n") + 1
-        
-        # Execute the requests
-        if requests:
-            self.service.documents().batchUpdate(
-                documentId=document_id,
-                body={'requests': requests}
-            ).execute()
-    
-    def _add_section_header(self, index: int, title: str) -> list:
-        """Add a section header with formatting"""
-        return [
-            {
-                'insertText': {
-                    'location': {'index': index},
-                    'text': f'{title}\n'
-                }
-            },
-            {
-                'updateParagraphStyle': {
+        requests = []
+        if content_length > 1:
+            requests.append({
+                'deleteContentRange': {
                     'range': {
-                        'startIndex': index,
-                        'endIndex': index + len(title)
-                    },
-                    'paragraphStyle': {
-                        'namedStyleType': 'HEADING_1'
-                    },
-                    'fields': 'namedStyleType'
+                        'startIndex': 1,
+                        'endIndex': content_length
+                    }
                 }
-            }
-        ]
+            })
+        requests.extend(section_requests(1, sections))
+        
+        response = self._batch_update(document_id, requests, document.get('revisionId'))
+        return layout_for(sections, response)
     
-    def _add_field(self, index: int, field_name: str, field_value: str) -> list:
-        """Add a field with label and value"""
-        return [
-            {
-                'insertText': {
-                    'location': {'index': index},
-                    'text': f'{field_name}: {field_value}\n'
-                }
-            },
-            {
-                'updateTextStyle': {
-                    'range': {
-                        'startIndex': index,
-                        'endIndex': index + len(field_name)
-                    },
-                    'textStyle': {
-                        'bold': True
-                    },
-                    'fields': 'bold'
-                }
-            }
-        ]
+    def _batch_update(self, document_id: str, requests: list, revision_id: Optional[str]) -> Dict[str, Any]:
+        body = {'requests': requests}
+        if revision_id:
+            # fail instead of editing a document that changed since the layout was recorded
+            body['writeControl'] = {'requiredRevisionId': revision_id}
+        return self.service.documents().batchUpdate(documentId=document_id, body=body).execute()
     
-    def update_document(self, document_id: str, content: Dict[str, Any]) -> bool:
-        """Update existing Google Docs document with new content"""
+    def sync_document(self, document_id: str, content: Dict[str, Any],
+                      layout: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Bring the document in line with content and return its new layout
+        (or None on failure); pass that layout to the next call.
+        
+        With a layout from the previous sync only the sections that changed
+        are edited, in a single batchUpdate bound to the recorded revision,
+        so requests grow with the edit rather than with the document and
+        nothing is sent when nothing changed. Without a layout, or if the
+        document was edited elsewhere in between, the body is rebuilt.
+        """
+        sections = document_sections(content)
         try:
-            # Clear existing content (except title)
-            document = self.service.documents().get(documentId=document_id).execute()
-            content_length = document['body']['content'][-1]['endIndex'] - 1
-            
-            if content_length > 1:
-                self.service.documents().batchUpdate(
-                    documentId=document_id,
-                    body={
-                        'requests': [
-                            {
-                                'deleteContentRange': {
-                                    'range': {
-                                        'startIndex': 1,
-                                        'endIndex': content_length
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                ).execute()
-            
-            # Insert new content
-            self._insert_formatted_content(document_id, content)
-            return True
+            if layout and layout.get('revision_id') and layout.get('sections') is not None:
+                old_sections = [tuple(section) for section in layout['sections']]
+                requests = diff_requests(old_sections, sections)
+                if not requests:
+                    return layout
+                try:
+                    response = self._batch_update(document_id, requests, layout['revision_id'])
+                    return layout_for(sections, response)
+                except HttpError as error:
+                    print(f'Incremental update failed, rebuilding document: {error}')
+            return self._rebuild_document(document_id, sections)
             
         except HttpError as error:
             print(f'An error occurred: {error}')
-            return False
+            return None
+    
+    def update_document(self, document_id: str, content: Dict[str, Any],
+                        layout: Optional[Dict[str, Any]] = None) -> bool:
+        """Update existing Google Docs document with new content"""
+        return self.sync_document(document_id, content, layout) is not None
     
     def get_document_url(self, document_id: str) -> str:
         """Get the shareable URL for a Google Docs document"""
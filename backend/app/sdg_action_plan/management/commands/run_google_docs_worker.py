@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from sdg_action_plan.docs_jobs import process_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued Google Docs jobs (creating, updating and sharing action plan "
+        "documents). Failed jobs are retried with exponential backoff; see the "
+        "GOOGLE_DOCS_JOB_* settings. Run one or more of these next to the web server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=10, help="Jobs claimed at a time (default: 10)")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait when no job is due (default: 2)")
+        parser.add_argument('--once', action='store_true', help="Run the due jobs and exit")
+
+    def handle(self, *args, **options):
+        if options['batch'] < 1:
+            raise CommandError("--batch must be at least 1")
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                processed = process_jobs(options['batch'])
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Processed {total} Google Docs jobs")
@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sdg_action_plan.ot_simulation import simulate
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulates concurrent editors typing into one action plan text field "
+        "with character-level operations and reports the bytes sent, the bytes "
+        "whole-value updates would need, and whether and how fast all editors "
+        "converge on the same text."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--editors', type=int, default=5, help="Concurrent editors (default: 5)")
+        parser.add_argument('--edits', type=int, default=100, help="Edits per editor (default: 100)")
+        parser.add_argument('--latency', type=float, default=50,
+                            help="Network latency per message in milliseconds (default: 50)")
+        parser.add_argument('--jitter', type=float, default=25,
+                            help="Latency jitter in milliseconds (default: 25)")
+        parser.add_argument('--think-time', type=float, default=150,
+                            help="Mean time between an editor's edits in milliseconds (default: 150)")
+        parser.add_argument('--initial-length', type=int, default=1000,
+                            help="Characters in the field before editing starts (default: 1000)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options['editors'] < 1 or options['edits'] < 1:
+            raise CommandError("--editors and --edits must be at least 1")
+        report = simulate(
+            editors=options['editors'],
+            edits=options['edits'],
+            latency=options['latency'],
+            jitter=options['jitter'],
+            think_time=options['think_time'],
+            initial_length=max(0, options['initial_length']),
+            seed=options['seed'],
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"{report['editors']} editors, {report['edits']} edits -> {report['revisions']} revisions "
+            f"(simulated in {report['wall_ms']} ms)")
+        ratio = report['whole_value_bytes'] / report['bytes_sent'] if report['bytes_sent'] else 0
+        self.stdout.write(
+            f"text operations: {report['messages']} messages, {report['bytes_sent']} bytes; "
+            f"whole-value updates: {report['whole_value_bytes']} bytes ({ratio:.1f}x)")
+        if report['converged']:
+            self.stdout.write(self.style.SUCCESS(
+                f"converged {report['convergence_ms']} ms after the last edit "
+                f"({report['final_length']} characters)"))
+        else:
+            self.stdout.write(self.style.ERROR("editors did not converge"))
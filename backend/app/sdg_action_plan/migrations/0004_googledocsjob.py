@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-17 08:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdg_action_plan', '0003_merge_20250715_2233'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleDocsJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('create', 'Create document'), ('update', 'Update document'), ('share', 'Share document')], max_length=20)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='The job is not run before this time')),
+                ('locked_at', models.DateTimeField(blank=True, help_text='When a worker started running the job', null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('action_plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='google_docs_jobs', to='sdg_action_plan.sdgactionplan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='sdg_action__status_361d60_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdg_action_plan', '0004_googledocsjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleDocLayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_id', models.CharField(max_length=255, unique=True)),
+                ('revision_id', models.CharField(blank=True, max_length=255)),
+                ('sections', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
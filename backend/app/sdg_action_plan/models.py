@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from teams.models import Team
 
@@ -53,3 +54,71 @@ class SDGActionPlan(models.Model):
                                         help_text='Last time content was synced to Google Docs')
     def __str__(self):
         return f"Action Plan: {self.impact_project_name} by {self.user.username}"
+
+
+class GoogleDocsJob(models.Model):
+    """
+    A Google Docs operation for an action plan, run by the
+    run_google_docs_worker command instead of inside the request that
+    caused it. Failed jobs are retried with exponential backoff.
+    """
+    KIND_CREATE = 'create'
+    KIND_UPDATE = 'update'
+    KIND_SHARE = 'share'
+    KIND_CHOICES = [
+        (KIND_CREATE, 'Create document'),
+        (KIND_UPDATE, 'Update document'),
+        (KIND_SHARE, 'Share document'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    action_plan = models.ForeignKey(
+        SDGActionPlan, on_delete=models.CASCADE, related_name='google_docs_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # extra arguments, e.g. {"email": ..., "role": ...} for sharing
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now,
+                                     help_text='The job is not run before this time')
+    locked_at = models.DateTimeField(blank=True, null=True,
+                                     help_text='When a worker started running the job')
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"Google Docs {self.kind} job for action plan {self.action_plan_id} ({self.status})"
+
+
+class GoogleDocLayout(models.Model):
+    """
+    The sections last written to a Google Doc and the document revision
+    after that write, so the next sync can send only the changed sections
+    (see GoogleDocsService.sync_document).
+    """
+    document_id = models.CharField(max_length=255, unique=True)
+    revision_id = models.CharField(max_length=255, blank=True)
+    # [[section key, section text], ...] in document order
+    sections = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def as_layout(self):
+        return {'revision_id': self.revision_id, 'sections': self.sections}
+
+    def __str__(self):
+        return f"Layout of Google Doc {self.document_id}"
@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import json
+import random
+import time
+from typing import Dict, List
+
+from .text_ot import TextClient, TextDocument, TextOperation, text_length
+
+FIELD = 'plan_content.steps.description'
+WORDS = "sustainable development goal action plan community impact education water energy climate".split()
+
+
+def _size(message: Dict) -> int:
+    return len(json.dumps(message).encode('utf-8'))
+
+
+def random_edit(text: str, rng: random.Random) -> TextOperation:
+    """Mostly single keystrokes, some backspaces and the occasional pasted phrase."""
+    length = text_length(text)
+    position = rng.randint(0, length)
+    roll = rng.random()
+    if roll < 0.15 and position > 0:
+        count = min(position, rng.randint(1, 3))
+        return TextOperation().retain(position - count).delete(count).retain(length - position)
+    if roll < 0.25:
+        inserted = ' ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+    else:
+        inserted = rng.choice('abcdefghijklmnopqrstuvwxyz ')
+    return TextOperation().retain(position).insert(inserted).retain(length - position)
+
+
+def simulate(editors: int = 5, edits: int = 50, latency: float = 50.0, jitter: float = 25.0,
+             think_time: float = 150.0, initial_length: int = 1000, seed: int = 0) -> Dict:
+    """
+    Simulates `editors` clients each making `edits` random edits to one text
+    field, with the server and client logic of SDGFormConsumer and
+    text_ot.TextClient, over a network with latency ± jitter milliseconds
+    per message (in order per connection). Time is simulated, so runs are
+    reproducible for a seed.
+
+    Returns the bytes and messages sent with text operations, the bytes the
+    same edits would take as whole-value form_update messages, whether every
+    client ended with the server's text and how long after the last edit
+    that took (convergence_ms).
+    """
+    rng = random.Random(seed)
+    initial = ' '.join(rng.choice(WORDS) for _ in range(initial_length))[:initial_length]
+    server = TextDocument(initial)
+    clients = [TextClient(initial) for _ in range(editors)]
+    events: List = []
+    sequence = itertools.count()
+    link_clock: Dict = {}
+    stats = {'messages': 0, 'bytes_sent': 0, 'whole_value_bytes': 0}
+
+    def send(now, source, target, kind, payload, message):
+        stats['messages'] += 1
+        stats['bytes_sent'] += _size(message)
+        # websocket messages on one connection arrive in order
+        arrival = max(now + max(0.0, rng.uniform(latency - jitter, latency + jitter)),
+                      link_clock.get((source, target), 0.0))
+        link_clock[(source, target)] = arrival
+        heapq.heappush(events, (arrival, next(sequence), kind, target, payload))
+
+    def send_operation(now, index, operation):
+        message = {'type': 'text_operation', 'field': FIELD, 'revision': clients[index].revision,
+                   'operation': operation.to_json(), 'user_id': index}
+        send(now, index, 'server', 'server', (index, clients[index].revision, operation), message)
+
+    for index in range(editors):
+        at = 0.0
+        for _ in range(edits):
+            at += rng.expovariate(1 / think_time) if think_time > 0 else 0.0
+            heapq.heappush(events, (at, next(sequence), 'edit', index, None))
+
+    last_edit = now = 0.0
+    started = time.perf_counter()
+    while events:
+        now, _, kind, target, payload = heapq.heappop(events)
+        if kind == 'edit':
+            last_edit = now
+            client = clients[target]
+            operation = random_edit(client.text, rng)
+            to_send = client.local(operation)
+            # the same keystroke as a whole-value update, sent up and broadcast to the room
+            whole = _size({'type': 'form_update', 'field': FIELD, 'value': client.text,
+                           'user_id': target, 'timestamp': None})
+            stats['whole_value_bytes'] += whole * (1 + editors)
+            if to_send is not None:
+                send_operation(now, target, to_send)
+        elif kind == 'server':
+            index, revision, operation = payload
+            operation = server.receive(revision, operation)
+            for other in range(editors):
+                if other == index:
+                    message = {'type': 'text_operation_ack', 'field': FIELD, 'revision': server.revision}
+                    send(now, 'server', other, 'ack', None, message)
+                else:
+                    message = {'type': 'text_operation', 'field': FIELD, 'revision': server.revision,
+                               'operation': operation.to_json(), 'user_id': index}
+                    send(now, 'server', other, 'remote', operation, message)
+        elif kind == 'ack':
+            to_send = clients[target].ack()
+            if to_send is not None:
+                send_operation(now, target, to_send)
+        else:
+            clients[target].remote(payload)
+
+    converged = all(client.text == server.text and client.outstanding is None for client in clients)
+    return {
+        'editors': editors,
+        'edits': editors * edits,
+        'messages': stats['messages'],
+        'bytes_sent': stats['bytes_sent'],
+        'whole_value_bytes': stats['whole_value_bytes'],
+        'converged': converged,
+        'convergence_ms': round(now - last_edit, 1),
+        'revisions': server.revision,
+        'final_length': text_length(server.text),
+        'wall_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
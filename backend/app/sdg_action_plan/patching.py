@@ -0,0 +1,152 @@
+import json
+from typing import Dict, List, Sequence, Tuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import SDGActionPlan
+
+# top-level columns a patch may set directly
+PATCHABLE_FIELDS = ('name_of_designers', 'impact_project_name', 'description', 'status')
+JSON_FIELD = 'plan_content'
+OPS = ('add', 'replace', 'remove')
+
+
+class PatchError(ValueError):
+    """Raised for malformed patch operations."""
+
+
+def parse_path(path) -> List[str]:
+    """
+    Splits a JSON Pointer ("/plan_content/steps/input1") or a dotted field
+    name ("plan_content.steps.input1") into its keys.
+    """
+    if not isinstance(path, str) or not path.strip('/.'):
+        raise PatchError(f"Invalid path: {path!r}")
+    if path.startswith('/'):
+        keys = [p.replace('~1', '/').replace('~0', '~') for p in path[1:].split('/')]
+    else:
+        keys = path.split('.')
+    if not all(keys):
+        raise PatchError(f"Invalid path: {path!r}")
+    return keys
+
+
+def normalize_ops(ops: Sequence[Dict]) -> List[Tuple[str, List[str], object]]:
+    """Validates operations and returns them as (op, keys, value) tuples."""
+    if not isinstance(ops, (list, tuple)) or not ops:
+        raise PatchError("Expected a non-empty list of operations")
+    normalized = []
+    for item in ops:
+        if not isinstance(item, dict):
+            raise PatchError("Each operation must be an object")
+        op = item.get('op', 'replace')
+        if op not in OPS:
+            raise PatchError(f"Unsupported op {op!r}; use one of {', '.join(OPS)}")
+        keys = parse_path(item.get('path'))
+        field = keys[0]
+        if field == JSON_FIELD:
+            if op == 'remove' and len(keys) == 1:
+                raise PatchError("Cannot remove plan_content")
+            if len(keys) == 1 and not isinstance(item.get('value'), dict):
+                raise PatchError("plan_content must be an object")
+        elif field in PATCHABLE_FIELDS:
+            if len(keys) > 1 or op == 'remove':
+                raise PatchError(f"{field} can only be replaced")
+            if field == 'status' and item.get('value') not in dict(SDGActionPlan.STATUS_CHOICES):
+                raise PatchError(f"Invalid status {item.get('value')!r}")
+            if not isinstance(item.get('value'), str):
+                raise PatchError(f"{field} must be a string")
+        else:
+            raise PatchError(f"Field {field!r} cannot be patched")
+        if op != 'remove' and 'value' not in item:
+            raise PatchError(f"Missing value for {item.get('path')}")
+        normalized.append((op, keys, item.get('value')))
+    return normalized
+
+
+def apply_to_document(document: Dict, keys: List[str], op: str, value) -> Dict:
+    """Applies one operation to a plan_content dict in place, creating missing parents."""
+    current = document
+    for key in keys[:-1]:
+        if not isinstance(current.get(key), dict):
+            if op == 'remove':
+                return document
+            current[key] = {}
+        current = current[key]
+    if op == 'remove':
+        current.pop(keys[-1], None)
+    else:
+        current[keys[-1]] = value
+    return document
+
+
+def mysql_json_path(keys: List[str]) -> str:
+    quoted = ('"' + key.replace('\\', '\\\\').replace('"', '\\"') + '"' for key in keys)
+    return '$.' + '.'.join(quoted)
+
+
+def mysql_update(table: str, column: str, pk_column: str, plan_id, op: str,
+                 keys: List[str], value) -> Tuple[str, List]:
+    """
+    Builds one `UPDATE ... SET column = JSON_SET(...)` (or JSON_REMOVE) for a
+    path. JSON_SET does not create missing parents, so every parent that is
+    not an object is set to {} first; the path/value pairs apply left to
+    right. Paths and the value are bound as parameters.
+    """
+    doc = f'COALESCE({column}, JSON_OBJECT())'
+    if not keys:
+        return f"UPDATE {table} SET {column} = JSON_EXTRACT(%s, '$') WHERE {pk_column} = %s", [json.dumps(value), plan_id]
+    if op == 'remove':
+        return f'UPDATE {table} SET {column} = JSON_REMOVE({doc}, %s) WHERE {pk_column} = %s', [mysql_json_path(keys), plan_id]
+    pairs, params = [], []
+    for depth in range(1, len(keys)):
+        parent = mysql_json_path(keys[:depth])
+        pairs.append(f"%s, IF(JSON_TYPE(JSON_EXTRACT({doc}, %s)) = 'OBJECT', JSON_EXTRACT({doc}, %s), JSON_OBJECT())")
+        params += [parent, parent, parent]
+    # the value is sent as JSON text and parsed server-side
+    pairs.append("%s, JSON_EXTRACT(%s, '$')")
+    params += [mysql_json_path(keys), json.dumps(value)]
+    sql = f"UPDATE {table} SET {column} = JSON_SET({doc}, {', '.join(pairs)}) WHERE {pk_column} = %s"
+    return sql, params + [plan_id]
+
+
+def patch_action_plan(plan_id, ops: Sequence[Dict]) -> bool:
+    """
+    Applies field-level patch operations to one action plan without
+    rewriting the row: top-level columns are updated with a single UPDATE of
+    just those columns, and each plan_content path is written in place with
+    JSON_SET / JSON_REMOVE on MySQL (elsewhere the plan_content column alone
+    is read, patched and saved with update_fields). Returns False if the plan
+    does not exist.
+    """
+    normalized = normalize_ops(ops)
+    columns = {keys[0]: value for op, keys, value in normalized if keys[0] != JSON_FIELD}
+    json_ops = [(op, keys[1:], value) for op, keys, value in normalized if keys[0] == JSON_FIELD]
+    now = timezone.now()
+
+    with transaction.atomic():
+        queryset = SDGActionPlan.objects.filter(pk=plan_id)
+        if not queryset.update(updated_at=now, **columns):
+            return False
+        if not json_ops:
+            return True
+
+        if connection.vendor == 'mysql':
+            table = connection.ops.quote_name(SDGActionPlan._meta.db_table)
+            column = connection.ops.quote_name(SDGActionPlan._meta.get_field(JSON_FIELD).column)
+            pk_column = connection.ops.quote_name(SDGActionPlan._meta.pk.column)
+            with connection.cursor() as cursor:
+                for op, keys, value in json_ops:
+                    cursor.execute(*mysql_update(table, column, pk_column, plan_id, op, keys, value))
+        else:
+            plan = queryset.select_for_update().only('pk', JSON_FIELD).get()
+            document = plan.plan_content if isinstance(plan.plan_content, dict) else {}
+            for op, keys, value in json_ops:
+                if not keys:
+                    document = value
+                else:
+                    apply_to_document(document, keys, op, value)
+            plan.plan_content = document
+            plan.save(update_fields=[JSON_FIELD])
+    return True
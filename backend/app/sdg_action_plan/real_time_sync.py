@@ -4,8 +4,14 @@ from typing import Dict, Set, Optional
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
-from .models import SDGActionPlan
+from django.db import transaction
+from django.utils import timezone
+from .models import GoogleDocsJob, SDGActionPlan
+from .docs_jobs import enqueue_job, load_layout, plan_content, save_layout
 from .google_docs_service import GoogleDocsService
+from .edit_buffer import edit_buffers
+from .patching import PatchError, parse_path
+from .text_ot import OTError, TextOperation
 
 
 class SDGFormConsumer(AsyncWebsocketConsumer):
@@ -17,6 +23,7 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
         self.room_group_name = None
         self.user = None
         self.google_docs_service = None
+        self.edit_buffer = None
     
     async def connect(self):
         """Handle WebSocket connection"""
@@ -35,6 +42,12 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
         # Initialize Google Docs service
         self.google_docs_service = GoogleDocsService()
         
+        # The room's document is loaded once and shared by its consumers;
+        # field edits are applied to it and written in batches
+        self.edit_buffer = await edit_buffers.join(self.room_name, self.after_edits_written)
+        # re-reading the plan may have reset text fields the room's clients are editing
+        await self.broadcast_text_resets()
+        
         # Send connection confirmation
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
@@ -44,6 +57,11 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        # Write any edits still buffered for this room
+        if self.edit_buffer is not None:
+            await edit_buffers.leave(self.room_name, self.after_edits_written)
+            self.edit_buffer = None
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -64,6 +82,10 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
                 await self.handle_user_typing(data)
             elif message_type == 'cursor_position':
                 await self.handle_cursor_position(data)
+            elif message_type == 'text_operation':
+                await self.handle_text_operation(data)
+            elif message_type == 'text_sync':
+                await self.send_text_state(data.get('field'))
             
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
@@ -77,30 +99,138 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
             }))
     
     async def handle_form_update(self, data):
-        """Handle form field updates"""
+        """
+        Handle form field updates. The change is broadcast right away and
+        queued in the room's edit buffer, which writes all pending field
+        changes in one go at most every ACTION_PLAN_EDIT_FLUSH_MS (and on
+        disconnect); Google Docs is synced after each write, not per keystroke.
+        A new value for a text field that is being edited with text
+        operations is sent to the room as an operation instead.
+        """
         field_name = data.get('field')
         field_value = data.get('value')
         user_id = data.get('user_id')
         
-        # Update form in database
-        success = await self.update_form_field(field_name, field_value)
+        try:
+            text = None
+            if isinstance(field_value, str):
+                text = self.edit_buffer.text_documents.get(tuple(parse_path(field_name)))
+            if text is not None:
+                operation, revision = self.edit_buffer.apply_text_operation(
+                    field_name, text.revision, TextOperation.from_diff(text.text, field_value)
+                )
+                await self.broadcast_text_operation(field_name, operation, revision, user_id)
+                return
+            self.edit_buffer.add(field_name, field_value)
+            await self.broadcast_text_resets()
+        except (PatchError, OTError) as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f'Invalid form update: {str(e)}'
+            }))
+            return
         
-        if success:
-            # Broadcast update to all users in the room
+        # Broadcast update to all users in the room
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'form_update_broadcast',
+                'field': field_name,
+                'value': field_value,
+                'user_id': user_id,
+                'timestamp': data.get('timestamp')
+            }
+        )
+    
+    async def handle_text_operation(self, data):
+        """
+        Handle a character-level edit of a text field: {'field', 'revision',
+        'operation'} where operation is a text_ot.TextOperation in JSON form
+        made at the given revision. It is rebased over the edits the client
+        has not seen yet, applied to the room's text and sent to the other
+        clients as a delta; the sender gets an acknowledgement. If it cannot
+        be applied the sender gets the current text to resync from.
+        """
+        field_name = data.get('field')
+        try:
+            operation, revision = self.edit_buffer.apply_text_operation(
+                field_name, data.get('revision'), TextOperation.from_json(data.get('operation'))
+            )
+        except (PatchError, OTError) as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f'Invalid text operation: {str(e)}'
+            }))
+            await self.send_text_state(field_name)
+            return
+        
+        await self.broadcast_text_operation(
+            field_name, operation, revision, data.get('user_id'), sender=self.channel_name
+        )
+    
+    async def broadcast_text_operation(self, field_name, operation, revision, user_id, sender=None):
+        """Send an applied text operation to the room"""
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'text_operation_broadcast',
+                'field': field_name,
+                'revision': revision,
+                'operation': operation.to_json(),
+                'user_id': user_id,
+                'sender': sender
+            }
+        )
+    
+    async def broadcast_text_resets(self):
+        """
+        Send the room the new text and revision of every text field the
+        edit buffer reset (a whole-value update, or a change found when the
+        plan was read again), so idle clients do not keep editing stale text
+        """
+        if self.edit_buffer is None:
+            return
+        for field_name, text in self.edit_buffer.pop_text_resets().items():
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
-                    'type': 'form_update_broadcast',
+                    'type': 'text_state_broadcast',
                     'field': field_name,
-                    'value': field_value,
-                    'user_id': user_id,
-                    'timestamp': data.get('timestamp')
+                    'revision': text.revision,
+                    'text': text.text
                 }
             )
-            
-            # Sync with Google Docs if enabled
-            if await self.should_sync_to_google_docs():
-                await self.sync_to_google_docs()
+    
+    async def send_text_state(self, field_name):
+        """Send the current text and revision of a text field to this client"""
+        try:
+            text = self.edit_buffer.text_document(field_name)
+        except (PatchError, OTError) as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f'Cannot sync text field: {str(e)}'
+            }))
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'text_state',
+            'field': field_name,
+            'revision': text.revision,
+            'text': text.text
+        }))
+    
+    async def after_edits_written(self):
+        """
+        Called by the room's edit buffer after a batch of edits is saved;
+        the Google Docs update runs in the job queue, off the event loop
+        """
+        await self.broadcast_text_resets()
+        if await self.should_sync_to_google_docs():
+            await self.queue_google_docs_update()
+    
+    @database_sync_to_async
+    def queue_google_docs_update(self):
+        """Queue a Google Docs update job for the form"""
+        enqueue_job(self.room_name, GoogleDocsJob.KIND_UPDATE)
     
     async def handle_google_docs_sync(self, data):
         """Handle manual Google Docs sync request"""
@@ -154,6 +284,32 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp']
         }))
     
+    async def text_operation_broadcast(self, event):
+        """Send text operations to the other clients and acknowledge the sender"""
+        if event['sender'] == self.channel_name:
+            await self.send(text_data=json.dumps({
+                'type': 'text_operation_ack',
+                'field': event['field'],
+                'revision': event['revision']
+            }))
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'text_operation',
+            'field': event['field'],
+            'revision': event['revision'],
+            'operation': event['operation'],
+            'user_id': event['user_id']
+        }))
+    
+    async def text_state_broadcast(self, event):
+        """Send the text of a reset text field to all connected clients"""
+        await self.send(text_data=json.dumps({
+            'type': 'text_state',
+            'field': event['field'],
+            'revision': event['revision'],
+            'text': event['text']
+        }))
+    
     async def user_typing_broadcast(self, event):
         """Broadcast user typing indicators"""
         await self.send(text_data=json.dumps({
@@ -172,68 +328,51 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
             'position': event['position']
         }))
     
-    @database_sync_to_async
-    def update_form_field(self, field_name: str, field_value: str) -> bool:
-        """Update form field in database"""
-        try:
-            form = SDGActionPlan.objects.get(id=self.room_name)
-            
-            if field_name in ['name_of_designers', 'impact_project_name', 'description']:
-                setattr(form, field_name, field_value)
-            elif field_name.startswith('plan_content.'):
-                # Handle nested plan_content fields
-                nested_field = field_name.replace('plan_content.', '')
-                if '.' in nested_field:
-                    # Handle deeply nested fields like plan_content.steps.input1
-                    parts = nested_field.split('.')
-                    current = form.plan_content
-                    for part in parts[:-1]:
-                        if part not in current:
-                            current[part] = {}
-                        current = current[part]
-                    current[parts[-1]] = field_value
-                else:
-                    form.plan_content[nested_field] = field_value
-            
-            form.save()
-            return True
-            
-        except SDGActionPlan.DoesNotExist:
-            return False
-        except Exception as e:
-            print(f"Error updating form field: {e}")
+    async def should_sync_to_google_docs(self) -> bool:
+        """Check if form should be synced to Google Docs"""
+        document = self.edit_buffer.document if self.edit_buffer else None
+        if document is None:
             return False
+        if not (document['google_doc_created'] and document['google_doc_id']):
+            # the document may have been created since the room was loaded
+            document.update(await self.get_google_doc_fields() or {})
+        return bool(document['google_doc_created'] and document['google_doc_id'])
     
     @database_sync_to_async
-    def should_sync_to_google_docs(self) -> bool:
-        """Check if form should be synced to Google Docs"""
-        try:
-            form = SDGActionPlan.objects.get(id=self.room_name)
-            return form.google_doc_created and form.google_doc_id
-        except SDGActionPlan.DoesNotExist:
-            return False
+    def get_google_doc_fields(self) -> Optional[Dict]:
+        """Re-read the Google Docs link of the form"""
+        return SDGActionPlan.objects.filter(id=self.room_name).values(
+            'google_doc_id', 'google_doc_created'
+        ).first()
     
     async def sync_to_google_docs(self) -> bool:
         """Sync form content to Google Docs"""
         try:
+            # write the room's buffered edits first; the content is read from
+            # the database so that changes made outside the room are included
+            if self.edit_buffer is not None:
+                await self.edit_buffer.flush()
             form_data = await self.get_form_data()
             if not form_data:
                 return False
             
-            success = self.google_docs_service.update_document(
+            # only the sections changed since the last sync are sent
+            layout = await self.get_google_doc_layout(form_data['google_doc_id'])
+            layout = self.google_docs_service.sync_document(
                 form_data['google_doc_id'],
                 {
                     'impact_project_name': form_data['impact_project_name'],
                     'name_of_designers': form_data['name_of_designers'],
                     'description': form_data['description'],
                     'plan_content': form_data['plan_content']
-                }
+                },
+                layout
             )
             
-            if success:
-                await self.update_sync_timestamp()
+            if layout is not None:
+                await self.update_sync_timestamp(form_data['google_doc_id'], layout)
             
-            return success
+            return layout is not None
             
         except Exception as e:
             print(f"Error syncing to Google Docs: {e}")
@@ -241,28 +380,23 @@ class SDGFormConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def get_form_data(self) -> Optional[Dict]:
-        """Get form data for Google Docs sync"""
-        try:
-            form = SDGActionPlan.objects.get(id=self.room_name)
-            return {
-                'google_doc_id': form.google_doc_id,
-                'impact_project_name': form.impact_project_name,
-                'name_of_designers': form.name_of_designers,
-                'description': form.description,
-                'plan_content': form.plan_content
-            }
-        except SDGActionPlan.DoesNotExist:
+        """Get form data for Google Docs sync from the database"""
+        action_plan = SDGActionPlan.objects.filter(id=self.room_name).first()
+        if action_plan is None or not action_plan.google_doc_id:
             return None
+        return dict(plan_content(action_plan), google_doc_id=action_plan.google_doc_id)
     
     @database_sync_to_async
-    def update_sync_timestamp(self):
-        """Update last sync timestamp"""
-        try:
-            form = SDGActionPlan.objects.get(id=self.room_name)
-            form.last_sync_time = timezone.now()
-            form.save()
-        except SDGActionPlan.DoesNotExist:
-            pass
+    def get_google_doc_layout(self, document_id: str) -> Optional[Dict]:
+        """Get the layout recorded by the last sync of the document"""
+        return load_layout(document_id)
+    
+    @database_sync_to_async
+    def update_sync_timestamp(self, document_id: str, layout: Dict):
+        """Update last sync timestamp and the document layout"""
+        with transaction.atomic():
+            save_layout(document_id, layout)
+            SDGActionPlan.objects.filter(id=self.room_name).update(last_sync_time=timezone.now())
 
 
 class CollaborationManager:
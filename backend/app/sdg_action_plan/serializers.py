@@ -120,4 +120,10 @@ class SDGActionPlanSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         # Remove the team field if it's present to prevent updating it
         validated_data.pop('team', None)
-        return super().update(instance, validated_data)
+        # only write the columns whose values changed, not the whole row
+        changed = [field for field, value in validated_data.items() if getattr(instance, field) != value]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        if changed:
+            instance.save(update_fields=changed + ['updated_at'])
+        return instance
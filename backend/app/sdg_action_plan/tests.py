@@ -1,8 +1,18 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
-from .models import SDGActionPlan
+from .models import GoogleDocLayout, GoogleDocsJob, SDGActionPlan
+from .docs_jobs import enqueue_job, process_jobs
+from .edit_buffer import EditBufferRegistry, RoomEditBuffer
+from .google_docs_service import diff_requests, document_sections, section_requests
+from .ot_simulation import simulate
+from .patching import PatchError
+from .text_ot import OTError, TextDocument, TextOperation, text_length
 # adjust import based on your project structure
 from teams.models import Team, TeamMember
 
@@ -223,3 +233,277 @@ class SDGActionPlanAPITestCase(APITestCase):
         response = self.client.put(detail_url, payload, format="json")
         # Since user4 is not allowed to update (object is not in their queryset), they should receive a 404 Not Found
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_patch_action_plan_paths(self):
+        """Test that patch operations change only the given plan_content paths and fields."""
+        action_plan = SDGActionPlan.objects.create(
+            user=self.user,
+            impact_project_name="Patch Me",
+            plan_content={"steps": {"input1": "a", "input2": "b"}, "notes": "keep"},
+            team=self.team
+        )
+        patch_url = reverse('action-plan-patch', kwargs={'id': action_plan.id})
+        payload = {"ops": [
+            {"op": "replace", "path": "/plan_content/steps/input1", "value": "changed"},
+            {"op": "add", "path": "plan_content.goals.primary", "value": [7, 13]},
+            {"op": "remove", "path": "/plan_content/steps/input2"},
+            {"op": "replace", "path": "/description", "value": "New description"},
+        ]}
+        response = self.client.patch(patch_url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        action_plan.refresh_from_db()
+        self.assertEqual(action_plan.plan_content, {
+            "steps": {"input1": "changed"},
+            "goals": {"primary": [7, 13]},
+            "notes": "keep",
+        })
+        self.assertEqual(action_plan.description, "New description")
+        self.assertEqual(action_plan.impact_project_name, "Patch Me")
+
+    def test_patch_action_plan_rejects_invalid_ops(self):
+        """Test that patches to unknown fields or with bad values are rejected."""
+        action_plan = SDGActionPlan.objects.create(
+            user=self.user,
+            impact_project_name="Patch Me",
+            plan_content={},
+            team=self.team
+        )
+        patch_url = reverse('action-plan-patch', kwargs={'id': action_plan.id})
+        for ops in ([{"path": "/user", "value": 1}],
+                    [{"path": "/status", "value": "published"}],
+                    [{"op": "move", "path": "/plan_content/a", "value": 1}],
+                    []):
+            response = self.client.patch(patch_url, {"ops": ops}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        action_plan.refresh_from_db()
+        self.assertEqual(action_plan.plan_content, {})
+
+    def test_edit_buffer_coalesces_field_edits(self):
+        """Test that real-time edits update the room document and are written in one batch."""
+        action_plan = SDGActionPlan.objects.create(
+            user=self.user,
+            impact_project_name="Live",
+            plan_content={"steps": {"input1": "", "input2": "keep"}},
+            team=self.team
+        )
+        buffer = RoomEditBuffer(action_plan.id, interval=0.01)
+
+        async def type_and_wait():
+            await buffer.load()
+            for text in ("h", "he", "hel", "hello"):
+                buffer.add("plan_content.steps.input1", text)
+            buffer.add("description", "draft")
+            buffer.add("description", "final")
+            await asyncio.sleep(0.1)
+
+        async_to_sync(type_and_wait)()
+        self.assertEqual(buffer.document["plan_content"], {"steps": {"input1": "hello", "input2": "keep"}})
+        self.assertEqual(buffer.document["description"], "final")
+        self.assertEqual(buffer.writes, 1)
+        self.assertEqual(buffer.pending, {})
+        action_plan.refresh_from_db()
+        self.assertEqual(action_plan.plan_content, {"steps": {"input1": "hello", "input2": "keep"}})
+        self.assertEqual(action_plan.description, "final")
+
+        with self.assertRaises(PatchError):
+            buffer.add("user", 1)
+
+    def test_concurrent_text_operations_are_merged(self):
+        """Test that concurrent character-level edits of one text field both survive."""
+        action_plan = SDGActionPlan.objects.create(
+            user=self.user,
+            impact_project_name="Live",
+            plan_content={"steps": {"input1": "clean water"}},
+            team=self.team
+        )
+        buffer = RoomEditBuffer(action_plan.id, interval=0.01)
+
+        async def edit_concurrently():
+            await buffer.load()
+            field = "plan_content.steps.input1"
+            # both clients edit revision 0
+            first, revision = buffer.apply_text_operation(field, 0, TextOperation.from_json(["safe ", 11]))
+            self.assertEqual(revision, 1)
+            second, revision = buffer.apply_text_operation(field, 0, TextOperation.from_json([11, " for all"]))
+            self.assertEqual(second.to_json(), [16, " for all"])
+            with self.assertRaises(OTError):
+                buffer.apply_text_operation(field, 5, TextOperation.from_json([24, "!"]))
+            await buffer.flush()
+
+        async_to_sync(edit_concurrently)()
+        action_plan.refresh_from_db()
+        self.assertEqual(action_plan.plan_content["steps"]["input1"], "safe clean water for all")
+
+    def test_edit_buffer_picks_up_outside_writes(self):
+        """Test that the room document is re-read after a write and when a client joins."""
+        action_plan = SDGActionPlan.objects.create(
+            user=self.user,
+            impact_project_name="Live",
+            plan_content={"steps": {"input1": "draft", "input2": ""}},
+            team=self.team
+        )
+        patch_url = reverse('action-plan-patch', kwargs={'id': action_plan.id})
+        rooms = EditBufferRegistry()
+        field = "plan_content.steps.input1"
+
+        async def join():
+            return await rooms.join(action_plan.id)
+
+        buffer = async_to_sync(join)()
+        text = buffer.text_document(field)
+        self.assertEqual(text.text, "draft")
+
+        # written through the REST API while the room is open
+        response = self.client.patch(patch_url, {"ops": [
+            {"op": "replace", "path": "/description", "value": "from REST"},
+            {"op": "replace", "path": "/plan_content/steps/input1", "value": "rewritten"},
+        ]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        async def edit_and_flush():
+            buffer.add("plan_content.steps.input2", "typed")
+            await buffer.flush()
+
+        async_to_sync(edit_and_flush)()
+        self.assertEqual(buffer.document["description"], "from REST")
+        self.assertEqual(buffer.document["plan_content"], {"steps": {"input1": "rewritten", "input2": "typed"}})
+        # the text field changed underneath its clients, so they must resync
+        self.assertEqual((text.text, text.revision), ("rewritten", 1))
+        self.assertEqual(buffer.pop_text_resets(), {field: text})
+        self.assertEqual(buffer.pop_text_resets(), {})
+
+        SDGActionPlan.objects.filter(pk=action_plan.pk).update(name_of_designers="Elsewhere")
+        self.assertIs(async_to_sync(join)(), buffer)
+        self.assertEqual(buffer.document["name_of_designers"], "Elsewhere")
+
+    def test_text_operations_count_utf16_code_units(self):
+        """Test that operation lengths count UTF-16 code units, as ot.js clients do."""
+        text = "save 🌍 now"
+        self.assertEqual(text_length(text), 11)
+        # inserting "the " after "save 🌍 " retains 8 units, not 7 characters
+        insert = TextOperation.from_json([8, "the ", 3])
+        self.assertEqual(insert.apply(text), "save 🌍 the now")
+        with self.assertRaises(OTError):
+            TextOperation.from_json([7, "the ", 3]).apply(text)
+        # an operation may not split the surrogate pair of the emoji
+        with self.assertRaises(OTError):
+            TextOperation.from_json([6, "x", 5]).apply(text)
+
+        delete = TextOperation.from_json([5, -2, 4])
+        self.assertEqual(delete.apply(text), "save  now")
+        self.assertEqual(TextOperation.from_diff(text, "save 🌍🌊 now").to_json(), [7, "🌊", 4])
+
+        document = TextDocument(text)
+        document.receive(0, insert)
+        self.assertEqual(document.receive(0, TextOperation.from_json([11, "!🎉"])).to_json(), [15, "!🎉"])
+        self.assertEqual(document.text, "save 🌍 the now!🎉")
+        self.assertEqual(insert.compose(TextOperation.from_json([12, -3])).apply(text), "save 🌍 the ")
+
+    def test_text_editing_simulation_converges(self):
+        """Test that simulated concurrent editors converge and send less than whole values."""
+        report = simulate(editors=4, edits=30, seed=3)
+        self.assertTrue(report["converged"])
+        self.assertEqual(report["edits"], 120)
+        self.assertLess(report["bytes_sent"], report["whole_value_bytes"])
+
+    def test_create_queues_google_docs_job(self):
+        """Test that creating an action plan queues the Google Docs document instead of creating it."""
+        data = {
+            "impact_project_name": "Queued Doc",
+            "team": self.team.id,
+            "plan_content": {}
+        }
+        response = self.client.post(self.create_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job = GoogleDocsJob.objects.get(action_plan_id=response.data["id"])
+        self.assertEqual(job.kind, GoogleDocsJob.KIND_CREATE)
+        self.assertEqual(job.status, GoogleDocsJob.STATUS_PENDING)
+        # a second pending create is not added for the same plan
+        self.assertEqual(enqueue_job(job.action_plan, GoogleDocsJob.KIND_UPDATE), job)
+
+    def test_google_docs_jobs_retry_with_backoff(self):
+        """Test that failed Google Docs jobs are retried later and then share the document."""
+        self.user.email = "testuser@example.com"
+        self.user.save()
+        action_plan = SDGActionPlan.objects.create(
+            user=self.user,
+            impact_project_name="Retry Doc",
+            plan_content={},
+            team=self.team
+        )
+        job = enqueue_job(action_plan, GoogleDocsJob.KIND_CREATE)
+
+        class FlakyDocs:
+            def __init__(self):
+                self.created, self.shared = 0, []
+
+            def create_document(self, title, content):
+                self.created += 1
+                return "doc-1" if self.created > 1 else None
+
+            def get_document_url(self, document_id):
+                return f"https://docs.google.com/document/d/{document_id}/edit"
+
+            def share_document(self, document_id, email, role='writer'):
+                self.shared.append((document_id, email, role))
+                return True
+
+            def sync_document(self, document_id, content, layout=None):
+                return {"revision_id": "rev-1", "sections": []}
+
+        docs = FlakyDocs()
+        self.assertEqual(process_jobs(service=docs), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GoogleDocsJob.STATUS_PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        # not due yet
+        self.assertEqual(process_jobs(service=docs), 0)
+
+        GoogleDocsJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(process_jobs(service=docs), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GoogleDocsJob.STATUS_DONE)
+        action_plan.refresh_from_db()
+        self.assertEqual(action_plan.google_doc_id, "doc-1")
+        self.assertTrue(action_plan.google_doc_created)
+
+        # the share and content update jobs queued by the create job
+        self.assertEqual(process_jobs(service=docs), 2)
+        self.assertEqual(docs.shared, [("doc-1", "testuser@example.com", "writer")])
+        self.assertEqual(GoogleDocLayout.objects.get(document_id="doc-1").revision_id, "rev-1")
+
+    def test_google_docs_diff_touches_only_changed_sections(self):
+        """Test that a Google Docs sync edits only the changed text of the changed sections."""
+        def apply(text, requests):
+            # document text without the final newline; Docs indexes start at 1
+            for request in requests:
+                if 'insertText' in request:
+                    index = request['insertText']['location']['index'] - 1
+                    text = text[:index] + request['insertText']['text'] + text[index:]
+                elif 'deleteContentRange' in request:
+                    span = request['deleteContentRange']['range']
+                    text = text[:span['startIndex'] - 1] + text[span['endIndex'] - 1:]
+            return text
+
+        content = {
+            "impact_project_name": "Clean Water",
+            "name_of_designers": "Ana",
+            "description": "Filters for schools",
+            "plan_content": {"role": "Student", "steps": {"input1": "Survey"}},
+        }
+        old = document_sections(content)
+        text = apply("", section_requests(1, old))
+        self.assertEqual(text, "".join(section_text for _, section_text in old))
+
+        content["plan_content"]["steps"]["input1"] = "Survey wells"
+        requests = diff_requests(old, document_sections(content))
+        self.assertEqual(requests, [{'insertText': {
+            'location': {'index': len(text)}, 'text': ' wells'}}])
+
+        content["plan_content"]["steps"]["input2"] = "Install filters"
+        content["plan_content"]["risk"] = "Funding"
+        content["description"] = "Filters"
+        new = document_sections(content)
+        self.assertEqual(apply(text, diff_requests(old, new)), "".join(section_text for _, section_text in new))
+        self.assertEqual(diff_requests(new, new), [])
@@ -0,0 +1,328 @@
+from collections import deque
+from typing import List, Optional, Tuple, Union
+
+Component = Union[int, str]
+
+
+class OTError(ValueError):
+    """Raised for malformed operations or operations that do not fit the text."""
+
+
+def text_length(text: str) -> int:
+    """Length in UTF-16 code units, the unit of JavaScript string lengths"""
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise OTError("The operation splits a surrogate pair") from None
+
+
+def _split(text: str, n: int) -> Tuple[str, str]:
+    """text split after n UTF-16 code units"""
+    if text.isascii():
+        return text[:n], text[n:]
+    data = text.encode('utf-16-le')
+    return _decode(data[:2 * n]), _decode(data[2 * n:])
+
+
+def _is_retain(component) -> bool:
+    return isinstance(component, int) and component > 0
+
+
+def _is_delete(component) -> bool:
+    return isinstance(component, int) and component < 0
+
+
+def _is_insert(component) -> bool:
+    return isinstance(component, str)
+
+
+class TextOperation:
+    """
+    A character-level edit of a text field, as a list of components that
+    walk the whole text: a positive int retains that many characters, a
+    negative int deletes them and a string is inserted. For example
+    [5, " world", -3] keeps "hello", inserts " world" and removes the last
+    three characters. Lengths count UTF-16 code units, like JavaScript
+    string lengths, so a character outside the Basic Multilingual Plane
+    (e.g. most emoji) counts 2; an operation may not split such a pair.
+
+    Concurrent operations are merged with transform(), compose() squashes
+    consecutive ones. The semantics and units follow ot.js, so a browser
+    client can use that library directly.
+    """
+
+    def __init__(self, components: Optional[List[Component]] = None):
+        self.ops: List[Component] = []
+        self.base_length = 0
+        self.target_length = 0
+        for component in components or []:
+            if _is_retain(component):
+                self.retain(component)
+            elif _is_delete(component):
+                self.delete(-component)
+            elif _is_insert(component):
+                self.insert(component)
+            else:
+                raise OTError(f"Invalid operation component {component!r}")
+
+    def __eq__(self, other):
+        return isinstance(other, TextOperation) and self.ops == other.ops
+
+    def __repr__(self):
+        return f'TextOperation({self.ops!r})'
+
+    def retain(self, n: int) -> 'TextOperation':
+        if n <= 0:
+            return self
+        self.base_length += n
+        self.target_length += n
+        if self.ops and _is_retain(self.ops[-1]):
+            self.ops[-1] += n
+        else:
+            self.ops.append(n)
+        return self
+
+    def insert(self, text: str) -> 'TextOperation':
+        if not text:
+            return self
+        self.target_length += text_length(text)
+        if self.ops and _is_insert(self.ops[-1]):
+            self.ops[-1] += text
+        elif self.ops and _is_delete(self.ops[-1]):
+            # keep inserts before deletes so equal edits have one representation
+            if len(self.ops) > 1 and _is_insert(self.ops[-2]):
+                self.ops[-2] += text
+            else:
+                self.ops.insert(len(self.ops) - 1, text)
+        else:
+            self.ops.append(text)
+        return self
+
+    def delete(self, n: int) -> 'TextOperation':
+        if n <= 0:
+            return self
+        self.base_length += n
+        if self.ops and _is_delete(self.ops[-1]):
+            self.ops[-1] -= n
+        else:
+            self.ops.append(-n)
+        return self
+
+    def is_noop(self) -> bool:
+        return all(_is_retain(component) for component in self.ops)
+
+    def to_json(self) -> List[Component]:
+        return list(self.ops)
+
+    @classmethod
+    def from_json(cls, components) -> 'TextOperation':
+        if not isinstance(components, list) or any(isinstance(c, bool) for c in components):
+            raise OTError("An operation must be a list of retain counts, delete counts and strings")
+        return cls(components)
+
+    @classmethod
+    def from_diff(cls, old: str, new: str) -> 'TextOperation':
+        """The operation turning old into new: one replaced range between the common prefix and suffix."""
+        prefix = 0
+        limit = min(len(old), len(new))
+        while prefix < limit and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+        return (cls().retain(text_length(old[:prefix]))
+                .delete(text_length(old[prefix:len(old) - suffix]))
+                .insert(new[prefix:len(new) - suffix])
+                .retain(text_length(old[len(old) - suffix:])))
+
+    def apply(self, text: str) -> str:
+        length = text_length(text)
+        if length != self.base_length:
+            raise OTError(f"Operation expects a text of length {self.base_length}, got {length}")
+        ascii_only = text.isascii()
+        data = text if ascii_only else text.encode('utf-16-le')
+        unit = 1 if ascii_only else 2
+        parts, position = [], 0
+        for component in self.ops:
+            if _is_retain(component):
+                parts.append(data[position * unit:(position + component) * unit])
+                position += component
+            elif _is_delete(component):
+                position -= component
+            elif ascii_only:
+                parts.append(component)
+            else:
+                parts.append(component.encode('utf-16-le'))
+        return ''.join(parts) if ascii_only else _decode(b''.join(parts))
+
+    def compose(self, other: 'TextOperation') -> 'TextOperation':
+        """One operation with the effect of applying self and then other."""
+        if self.target_length != other.base_length:
+            raise OTError("The second operation must start from the result of the first")
+        result = TextOperation()
+        ops1, ops2 = iter(self.ops), iter(other.ops)
+        op1, op2 = next(ops1, None), next(ops2, None)
+        while op1 is not None or op2 is not None:
+            if _is_delete(op1):
+                result.delete(-op1)
+                op1 = next(ops1, None)
+            elif _is_insert(op2):
+                result.insert(op2)
+                op2 = next(ops2, None)
+            elif op1 is None or op2 is None:
+                raise OTError("Operations do not line up")
+            elif _is_retain(op1) and _is_retain(op2):
+                step = min(op1, op2)
+                result.retain(step)
+                op1 = op1 - step or next(ops1, None)
+                op2 = op2 - step or next(ops2, None)
+            elif _is_insert(op1) and _is_delete(op2):
+                step = min(text_length(op1), -op2)
+                op1 = _split(op1, step)[1] or next(ops1, None)
+                op2 = op2 + step or next(ops2, None)
+            elif _is_insert(op1) and _is_retain(op2):
+                step = min(text_length(op1), op2)
+                head, op1 = _split(op1, step)
+                result.insert(head)
+                op1 = op1 or next(ops1, None)
+                op2 = op2 - step or next(ops2, None)
+            else:  # retain then delete
+                step = min(op1, -op2)
+                result.delete(step)
+                op1 = op1 - step or next(ops1, None)
+                op2 = op2 + step or next(ops2, None)
+        return result
+
+    @staticmethod
+    def transform(a: 'TextOperation', b: 'TextOperation') -> Tuple['TextOperation', 'TextOperation']:
+        """
+        For concurrent a and b on the same text, returns (a', b') such that
+        b then a' equals a then b'. Text inserted by a at the same position
+        as b goes first.
+        """
+        if a.base_length != b.base_length:
+            raise OTError("Concurrent operations must start from the same text")
+        a_prime, b_prime = TextOperation(), TextOperation()
+        ops1, ops2 = iter(a.ops), iter(b.ops)
+        op1, op2 = next(ops1, None), next(ops2, None)
+        while op1 is not None or op2 is not None:
+            if _is_insert(op1):
+                a_prime.insert(op1)
+                b_prime.retain(text_length(op1))
+                op1 = next(ops1, None)
+            elif _is_insert(op2):
+                a_prime.retain(text_length(op2))
+                b_prime.insert(op2)
+                op2 = next(ops2, None)
+            elif op1 is None or op2 is None:
+                raise OTError("Operations do not line up")
+            elif _is_retain(op1) and _is_retain(op2):
+                step = min(op1, op2)
+                a_prime.retain(step)
+                b_prime.retain(step)
+                op1 = op1 - step or next(ops1, None)
+                op2 = op2 - step or next(ops2, None)
+            elif _is_delete(op1) and _is_delete(op2):
+                # both deleted the same characters
+                step = min(-op1, -op2)
+                op1 = op1 + step or next(ops1, None)
+                op2 = op2 + step or next(ops2, None)
+            elif _is_delete(op1):
+                step = min(-op1, op2)
+                a_prime.delete(step)
+                op1 = op1 + step or next(ops1, None)
+                op2 = op2 - step or next(ops2, None)
+            else:  # a retains, b deletes
+                step = min(op1, -op2)
+                b_prime.delete(step)
+                op1 = op1 - step or next(ops1, None)
+                op2 = op2 + step or next(ops2, None)
+        return a_prime, b_prime
+
+
+class TextDocument:
+    """
+    Server copy of one collaboratively edited text field: the current text,
+    its revision and the operations behind the most recent revisions.
+    Clients send operations against the revision they last saw, and they
+    are transformed over everything applied since.
+    """
+
+    def __init__(self, text: str = '', revision: int = 0, max_history: int = 1000):
+        self.text = text
+        self.revision = revision
+        self.history = deque(maxlen=max_history)
+
+    def transform(self, revision, operation: TextOperation) -> TextOperation:
+        """Rebases an operation made at `revision` onto the current text."""
+        if not isinstance(revision, int) or isinstance(revision, bool):
+            raise OTError("A revision number is required")
+        missed = self.revision - revision
+        if missed < 0 or missed > len(self.history):
+            raise OTError(f"Revision {revision} is not available; resync the field")
+        for concurrent in list(self.history)[len(self.history) - missed:]:
+            operation = TextOperation.transform(operation, concurrent)[0]
+        return operation
+
+    def push(self, operation: TextOperation, text: Optional[str] = None) -> int:
+        """Applies a rebased operation; returns the new revision."""
+        self.text = operation.apply(self.text) if text is None else text
+        self.history.append(operation)
+        self.revision += 1
+        return self.revision
+
+    def receive(self, revision, operation: TextOperation) -> TextOperation:
+        """transform() then push(); returns the operation as applied."""
+        operation = self.transform(revision, operation)
+        self.push(operation)
+        return operation
+
+    def reset(self, text: str):
+        """Replaces the text outside of OT; clients at older revisions must resync."""
+        self.text = text
+        self.revision += 1
+        self.history.clear()
+
+
+class TextClient:
+    """
+    Client side of the protocol: at most one operation is in flight to the
+    server, later local edits are composed into a buffer until it is
+    acknowledged, and remote operations are transformed over both.
+    """
+
+    def __init__(self, text: str = '', revision: int = 0):
+        self.text = text
+        self.revision = revision
+        self.outstanding: Optional[TextOperation] = None
+        self.buffer: Optional[TextOperation] = None
+
+    def local(self, operation: TextOperation) -> Optional[TextOperation]:
+        """Applies a local edit; returns the operation to send now, if any."""
+        self.text = operation.apply(self.text)
+        if self.outstanding is None:
+            self.outstanding = operation
+            return operation
+        self.buffer = operation if self.buffer is None else self.buffer.compose(operation)
+        return None
+
+    def ack(self) -> Optional[TextOperation]:
+        """The server applied our outstanding operation; returns the next one to send."""
+        self.revision += 1
+        self.outstanding, self.buffer = self.buffer, None
+        return self.outstanding
+
+    def remote(self, operation: TextOperation):
+        """Applies an operation from another client."""
+        self.revision += 1
+        if self.outstanding is not None:
+            self.outstanding, operation = TextOperation.transform(self.outstanding, operation)
+        if self.buffer is not None:
+            self.buffer, operation = TextOperation.transform(self.buffer, operation)
+        self.text = operation.apply(self.text)
@@ -4,6 +4,7 @@ from .views import (
     SDGActionPlanCreateView,
     SDGActionPlanRetrieveView,
     SDGActionPlanUpdateView,
+    SDGActionPlanPatchView,
     SDGActionPlanDeleteView,
     ActionPlanPermissionsView,
     ActionPlanEditorsView,
@@ -25,6 +26,9 @@ urlpatterns = [
     # anyone can update the plan on the team
     path('<int:id>/update/', SDGActionPlanUpdateView.as_view(),
          name='action-plan-update'),
+    # PATCH /api/sdg-action-plan/<int:id>/patch/ applies field-level patch operations
+    path('<int:id>/patch/', SDGActionPlanPatchView.as_view(),
+         name='action-plan-patch'),
     # DELETE /api/sdg-action-plan/<int:id>/delete/ deletes a specific action plan
     # anyone can delete the plan on the team
     path('<int:id>/delete/', SDGActionPlanDeleteView.as_view(),
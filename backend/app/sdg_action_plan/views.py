@@ -2,12 +2,13 @@ from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from teams.models import TeamMember
-from .models import SDGActionPlan
+from .models import GoogleDocsJob, SDGActionPlan
+from .docs_jobs import enqueue_job
 from .serializers import SDGActionPlanSerializer
 from .google_docs_service import GoogleDocsService, OAuthRequired
+from .patching import PatchError, patch_action_plan
 from django.db.models import Q
 from rest_framework.permissions import BasePermission
-from django.utils import timezone
 from django.db import transaction
 from rest_framework.views import APIView
 from django.http import HttpResponse
@@ -142,34 +143,13 @@ class SDGActionPlanCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        action_plan = serializer.save(user=self.request.user)
-        
-        # Create Google Docs document if project name is provided
-        if action_plan.impact_project_name:
-            try:
-                google_docs_service = GoogleDocsService()
-                content = {
-                    'impact_project_name': action_plan.impact_project_name,
-                    'name_of_designers': action_plan.name_of_designers,
-                    'description': action_plan.description,
-                    'plan_content': action_plan.plan_content
-                }
-                
-                document_id = google_docs_service.create_document(
-                    action_plan.impact_project_name, content)
-                
-                if document_id:
-                    action_plan.google_doc_id = document_id
-                    action_plan.google_doc_url = google_docs_service.get_document_url(document_id)
-                    action_plan.google_doc_created = True
-                    action_plan.last_sync_time = timezone.now()
-                    action_plan.save()
-                    
-                    # Share document with team members
-                    self._share_document_with_team(action_plan, google_docs_service)
-                    
-            except Exception as e:
-                print(f"Error creating Google Docs document: {e}")
+        with transaction.atomic():
+            action_plan = serializer.save(user=self.request.user)
+            
+            # Create the Google Docs document (and share it with the team)
+            # in the background if project name is provided
+            if action_plan.impact_project_name:
+                enqueue_job(action_plan, GoogleDocsJob.KIND_CREATE)
 
 
 class SDGActionPlanRetrieveView(UserActionPlanQuerysetMixin, generics.RetrieveAPIView):
@@ -198,29 +178,41 @@ class SDGActionPlanUpdateView(UserActionPlanQuerysetMixin, generics.UpdateAPIVie
             serializer.is_valid(raise_exception=True)
             updated_instance = serializer.save()
             
-            # Sync with Google Docs if document exists
+            # Sync with Google Docs in the background if document exists
             if updated_instance.google_doc_id and updated_instance.google_doc_created:
-                try:
-                    google_docs_service = GoogleDocsService()
-                    content = {
-                        'impact_project_name': updated_instance.impact_project_name,
-                        'name_of_designers': updated_instance.name_of_designers,
-                        'description': updated_instance.description,
-                        'plan_content': updated_instance.plan_content
-                    }
-                    
-                    success = google_docs_service.update_document(
-                        updated_instance.google_doc_id, content)
-                    
-                    if success:
-                        updated_instance.last_sync_time = timezone.now()
-                        updated_instance.save()
-                        
-                except Exception as e:
-                    print(f"Error updating Google Docs document: {e}")
+                enqueue_job(updated_instance, GoogleDocsJob.KIND_UPDATE)
             
             return Response(serializer.data)
         
+class SDGActionPlanPatchView(UserActionPlanQuerysetMixin, generics.GenericAPIView):
+    """
+    PATCH /api/sdg-action-plan/<id>/patch/
+    Body: {"ops": [{"op": "replace", "path": "/plan_content/steps/input1", "value": "..."}]}
+    (a bare list of operations is accepted too). Paths are JSON Pointers or
+    dotted names; ops are add / replace / remove. Only the given paths are
+    written, so the response carries no plan body.
+    """
+    permission_classes = [CanEditActionPlan]
+    lookup_field = 'id'
+
+    def get_queryset(self):
+        return self.get_user_action_plans()
+
+    def patch(self, request, *args, **kwargs):
+        instance = self.get_object()
+        ops = request.data.get('ops') if isinstance(request.data, dict) else request.data
+        try:
+            with transaction.atomic():
+                found = patch_action_plan(instance.pk, ops)
+                if found and instance.google_doc_id and instance.google_doc_created:
+                    enqueue_job(instance, GoogleDocsJob.KIND_UPDATE)
+        except PatchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not found:
+            return Response({'error': 'Action plan not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'id': instance.pk, 'applied': len(ops)}, status=status.HTTP_200_OK)
+
+
 class SDGActionPlanDeleteView(UserActionPlanQuerysetMixin, generics.DestroyAPIView):
     serializer_class = SDGActionPlanSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -1,5 +1,7 @@
 import django_filters
-from django.db.models import Q
+from search.bitmask import filter_any, to_mask
+from search.engine import rank_queryset
+from search.indexes import action_fuzzy
 from .models import (
     ActionDb,
     LEVEL_CHOICES,
@@ -12,24 +14,34 @@ from .models import (
 class ActionFilter(django_filters.FilterSet):
     SDG_CHOICES = [(str(i), f"SDG {i}") for i in range(1, 18)]
 
-    def filter_sdgs(self, qs, name, value):
-        q = Q()
-        for v in value:
-            # regex to match the correct sdg number in a comma-separated list
-            pattern = rf"(^|,)\s*{v}\s*(,|$)"
-            q |= Q(**{f"{name}__iregex": pattern})
-        return qs.filter(q)
+    def filter_comma_list(self, qs, name, value):
+        # match any selected value via the bitmask kept next to the
+        # comma-separated column
+        if not value:
+            return qs
+        mask_field, choices = ActionDb.MASK_FIELDS[name]
+        return filter_any(qs, mask_field, to_mask(value, choices))
+
+    def filter_actions(self, qs, name, value):
+        # substring match first; fall back to trigram similarity on the
+        # title so misspellings still return the closest actions
+        if not value:
+            return qs
+        matches = qs.filter(actions__icontains=value)
+        if matches.exists():
+            return matches
+        return rank_queryset(qs, action_fuzzy.search_pks(value))
 
     sdgs = django_filters.MultipleChoiceFilter(
         field_name='sdgs',
         choices=SDG_CHOICES,
-        method='filter_sdgs',
+        method='filter_comma_list',
         label="Related SDGs"
     )
 
     actions = django_filters.CharFilter(
         field_name='actions',
-        lookup_expr='icontains',
+        method='filter_actions',
         label="Search text"
     )
 
@@ -60,6 +72,7 @@ class ActionFilter(django_filters.FilterSet):
     related_industry = django_filters.MultipleChoiceFilter(
         field_name='related_industry',
         choices=[(c[0], c[1]) for c in INDU_CHOICES],
+        method='filter_comma_list',
         label="Industry"
     )
 
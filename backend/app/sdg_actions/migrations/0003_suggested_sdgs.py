@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-17 07:39
+
+import multiselectfield.db.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdg_actions', '0002_sdg_bitmasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actiondb',
+            name='suggested_sdgs',
+            field=multiselectfield.db.fields.MultiSelectField(blank=True, choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5'), (6, '6'), (7, '7'), (8, '8'), (9, '9'), (10, '10'), (11, '11'), (12, '12'), (13, '13'), (14, '14'), (15, '15'), (16, '16'), (17, '17'), (18, 'ALL')], default='', max_length=64, verbose_name='Suggested SDGs'),
+        ),
+    ]
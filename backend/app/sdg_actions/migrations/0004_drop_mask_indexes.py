@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdg_actions', '0003_suggested_sdgs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='actiondb',
+            name='industry_mask',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='actiondb',
+            name='sdg_mask',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import validate_comma_separated_integer_list
 from multiselectfield import MultiSelectField
+from search.bitmask import ChoiceMaskMixin
 
 SDG_CHOICES = ((1, '1'),
                (2, '2'),
@@ -64,7 +65,7 @@ INDU_CHOICES = (
 )
 
 
-class ActionDb(models.Model):
+class ActionDb(ChoiceMaskMixin, models.Model):
     actions = models.CharField(db_column='Actions', max_length=255, blank=True, null=True, verbose_name='Action Title',
                                help_text='Warning: please check if there are similar items in the database.', error_messages={"unique": "The Action item you entered is not unique."})
     action_detail = models.TextField(
@@ -97,6 +98,22 @@ class ActionDb(models.Model):
         db_column='Column15', max_length=50, blank=True, null=True)
     id = models.BigAutoField(unique=True, primary_key=True)
 
+    # filled by `manage.py backfill_sdg_tags` from the SDG keyword matcher
+    suggested_sdgs = MultiSelectField(max_length=64, blank=True, default='', choices=SDG_CHOICES,
+                                      verbose_name='Suggested SDGs')
+
+    # denormalised bitmasks of the multi-select columns, kept in sync by save()
+    # so filters can use bitwise ANDs instead of regex scans; not indexed,
+    # since a b-tree index cannot answer `mask & bits > 0`
+    sdg_mask = models.IntegerField(default=0, editable=False)
+    industry_mask = models.IntegerField(default=0, editable=False)
+
+    # source field -> (mask field, choices)
+    MASK_FIELDS = {
+        'sdgs': ('sdg_mask', SDG_CHOICES),
+        'related_industry': ('industry_mask', INDU_CHOICES),
+    }
+
     class Meta:
         managed = True
         db_table = 'action_db'
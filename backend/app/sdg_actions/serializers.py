@@ -6,7 +6,7 @@ class ActionSerializer(serializers.ModelSerializer):
     type = serializers.SerializerMethodField()
     class Meta:
         model = ActionDb
-        fields = '__all__'
+        exclude = ['sdg_mask', 'industry_mask']
         extra_fields = ['type']
     def get_type(self, obj):
         return 'action'
@@ -4,12 +4,15 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from multiselectfield.db.fields import MultiSelectField
+from search.indexes import action_facets, action_fuzzy
 
 MultiSelectField.flatchoices = property(lambda self: self.choices)
 
 
 class SdgActionSearchAPITestCase(APITestCase):
     def setUp(self):
+        action_facets.reset()
+        action_fuzzy.reset()
         ActionDb.objects.create(
             id=1,
             actions="Get rid of paper bank statements",
@@ -172,6 +175,12 @@ class SdgActionSearchAPITestCase(APITestCase):
         self.assertEqual(len(data), 1)
         self.assertIn('climate', data[0]['actions'].lower())
 
+    def test_search_falls_back_to_fuzzy_match(self):
+        resp = self.client.get(
+            self.list_url, {'actions': 'electrcal applainces'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in resp.data['results']], [7])
+
     def test_filter_by_single_sdg(self):
         resp = self.client.get(self.list_url, {'sdgs': ['15']}, format='json')
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
@@ -208,3 +217,47 @@ class SdgActionSearchAPITestCase(APITestCase):
         ids1 = {i['id'] for i in page1['results']}
         ids2 = {i['id'] for i in page2['results']}
         self.assertTrue(ids1.isdisjoint(ids2))
+
+    def test_filter_by_multiple_sdgs_uses_mask(self):
+        resp = self.client.get(
+            self.list_url, {'sdgs': ['12', '13'], 'per_page': 20}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        ids = sorted(item['id'] for item in resp.data['results'])
+        self.assertEqual(ids, [2, 7, 8])
+        self.assertNotIn('sdg_mask', resp.data['results'][0])
+
+    def test_filter_by_industry(self):
+        ActionDb.objects.create(
+            id=9,
+            actions="Switch to green energy suppliers",
+            sdgs=["7"],
+            related_industry=["Manufacturing", "Construction"],
+        )
+        resp = self.client.get(
+            self.list_url, {'related_industry': ['Construction']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in resp.data['results']], [9])
+
+    def test_mask_follows_saved_sdgs(self):
+        action = ActionDb.objects.get(id=3)
+        self.assertEqual(action.sdg_mask, 1 << 9)
+        action.sdgs = ["1", "10"]
+        action.save(update_fields=['sdgs'])
+        action.refresh_from_db()
+        self.assertEqual(action.sdg_mask, (1 << 0) | (1 << 9))
+
+    def test_facet_counts(self):
+        resp = self.client.get(
+            self.list_url, {'facets': 'true', 'level': ['1']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['count'], 7)
+        self.assertEqual(resp.data['facets']['level']['2'], 1)
+        self.assertEqual(resp.data['facets']['sdgs']['18'], 2)
+        self.assertEqual(resp.data['facets']['sdgs']['11'], 1)
+
+    def test_facet_counts_follow_deletes(self):
+        self.client.get(self.list_url, {'facets': 'true'}, format='json')
+        ActionDb.objects.filter(id=8).delete()
+        resp = self.client.get(self.list_url, {'facets': 'true'}, format='json')
+        self.assertEqual(resp.data['count'], 7)
+        self.assertEqual(resp.data['facets']['sdgs']['13'], 1)
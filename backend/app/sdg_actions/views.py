@@ -6,7 +6,9 @@ from .models import ActionDb
 from .serializers import ActionSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 from .filters import ActionFilter
-from rest_framework.pagination import PageNumberPagination
+from search.indexes import action_facets
+from search.mixins import FacetCountMixin
+from search.pagination import OptionalCursorPagination
 
 # API view to search for actions in general, returns 10
 
@@ -49,13 +51,20 @@ class ActionRetrieveView(generics.RetrieveAPIView):
         return get_object_or_404(self.get_queryset(), id=action_id)
 
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(OptionalCursorPagination):
     page_size_query_param = 'per_page'
 
 # API view to search for actions with filters
 
 
-class ActionFilterSearchView(generics.ListAPIView):
+class ActionFilterSearchView(FacetCountMixin, generics.ListAPIView):
+    """
+    GET /api/sdg-actions/filter-search/?<filters>
+
+    Returns the paginated records matching the filters. With `facets=true`
+    returns the match count and per-value counts for every filter facet.
+    `pagination=cursor` switches to keyset pages with an opaque `next` link.
+    """
     authentication_classes = []
     permission_classes = [permissions.AllowAny]
     queryset = ActionDb.objects.all()
@@ -64,3 +73,4 @@ class ActionFilterSearchView(generics.ListAPIView):
     filter_backends = [DjangoFilterBackend]
     filterset_class = ActionFilter
     pagination_class = StandardResultsSetPagination
+    facet_index = action_facets
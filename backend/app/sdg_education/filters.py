@@ -1,6 +1,8 @@
 # filters.py
 import django_filters
-from django.db.models import Q
+from search.bitmask import filter_any, to_mask
+from search.engine import rank_queryset, tokenize
+from search.indexes import education_fuzzy, education_index
 from .models import (
     EducationDb,
     SDG_CHOICES,
@@ -59,24 +61,28 @@ class EducationFilter(django_filters.FilterSet):
 
     def filter_search(self, qs, name, value):
         """
-        Simple keyword search across several text fields.
+        Keyword search across title, description, aims and learning outcome.
+
+        Served from the in-process BM25 index; every term must match (the
+        last one as a prefix) and results are ordered by relevance. When
+        nothing matches, titles are searched by trigram similarity so
+        misspelt queries still find something.
         """
-        return qs.filter(
-            Q(title__icontains=value) |
-            Q(description__icontains=value) |
-            Q(aims__icontains=value) |
-            Q(learning_outcome__icontains=value)
-        )
+        if not tokenize(value):
+            return qs
+        ranked = (education_index.search_pks(value, prefix=True)
+                  or education_fuzzy.search_pks(value))
+        return rank_queryset(qs, ranked)
 
     def filter_comma_list(self, qs, name, values):
         """
-        Matches any selected value in a comma-separated MultiSelectField.
+        Matches any selected value in a comma-separated MultiSelectField,
+        using the bitmask column the model keeps alongside it.
         """
-        q = Q()
-        for v in values:
-            pattern = rf"(^|,)\s*{v}\s*(,|$)"
-            q |= Q(**{f"{name}__iregex": pattern})
-        return qs.filter(q)
+        if not values:
+            return qs
+        mask_field, choices = EducationDb.MASK_FIELDS[name]
+        return filter_any(qs, mask_field, to_mask(values, choices))
 
     class Meta:
         model = EducationDb
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.7 on 2026-10-17 07:23
+
+from django.db import migrations, models
+
+# source field -> mask field, as in EducationDb.MASK_FIELDS when this migration was written
+MASK_FIELDS = {
+    'sdgs_related': 'sdg_mask',
+    'type_label': 'type_mask',
+    'related_to_which_discipline': 'discipline_mask',
+    'useful_for_which_industries': 'industry_mask',
+}
+
+
+def to_mask(value, choices):
+    # same rules as search.bitmask.to_mask: case-insensitive keys or labels
+    bits = {}
+    for pos, (key, label) in enumerate(choices):
+        bits.setdefault(str(label).strip().casefold(), 1 << pos)
+        bits[str(key).strip().casefold()] = 1 << pos
+    if isinstance(value, str):
+        value = value.split(',')
+    mask = 0
+    for item in value or []:
+        mask |= bits.get(str(item).strip().casefold(), 0)
+    return mask
+
+
+def fill_masks(apps, schema_editor):
+    model = apps.get_model('sdg_education', 'EducationDb')
+    choices = {source: model._meta.get_field(source).choices for source in MASK_FIELDS}
+    batch = []
+    for obj in model.objects.iterator(chunk_size=500):
+        for source, mask_field in MASK_FIELDS.items():
+            setattr(obj, mask_field, to_mask(getattr(obj, source), choices[source]))
+        batch.append(obj)
+        if len(batch) >= 500:
+            model.objects.bulk_update(batch, list(MASK_FIELDS.values()))
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, list(MASK_FIELDS.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdg_education', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='educationdb',
+            name='discipline_mask',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='educationdb',
+            name='industry_mask',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='educationdb',
+            name='sdg_mask',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='educationdb',
+            name='type_mask',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_masks, migrations.RunPython.noop),
+    ]
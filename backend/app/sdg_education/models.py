@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import validate_comma_separated_integer_list
 from multiselectfield import MultiSelectField
+from search.bitmask import ChoiceMaskMixin
 
 SDG_CHOICES = ((1, '1'),
                (2, '2'),
@@ -128,7 +129,7 @@ INDU_CHOICES = (("Agriculture forestry and fishing", "Agriculture forestry and f
                 ("Arts and recreation services", "Arts and recreation services"))
 
 
-class EducationDb(models.Model):
+class EducationDb(ChoiceMaskMixin, models.Model):
     title = models.TextField(db_column='Title', blank=True, null=True)
     description = models.TextField(
         db_column='Description', blank=True, null=True)
@@ -161,6 +162,26 @@ class EducationDb(models.Model):
         db_column='Column16', max_length=50, blank=True, null=True)
     id = models.BigAutoField(unique=True, primary_key=True)
 
+    # filled by `manage.py backfill_sdg_tags` from the SDG keyword matcher
+    suggested_sdgs = MultiSelectField(max_length=64, blank=True, default='', choices=SDG_CHOICES,
+                                      verbose_name='Suggested SDGs')
+
+    # denormalised bitmasks of the multi-select columns, kept in sync by save()
+    # so filters can use bitwise ANDs instead of regex scans; not indexed,
+    # since a b-tree index cannot answer `mask & bits > 0`
+    sdg_mask = models.IntegerField(default=0, editable=False)
+    type_mask = models.IntegerField(default=0, editable=False)
+    discipline_mask = models.IntegerField(default=0, editable=False)
+    industry_mask = models.IntegerField(default=0, editable=False)
+
+    # source field -> (mask field, choices)
+    MASK_FIELDS = {
+        'sdgs_related': ('sdg_mask', SDG_CHOICES),
+        'type_label': ('type_mask', TYPE_CHOICES),
+        'related_to_which_discipline': ('discipline_mask', DISP_CHOICES),
+        'useful_for_which_industries': ('industry_mask', INDU_CHOICES),
+    }
+
     class Meta:
         managed = True
         db_table = 'education_db'
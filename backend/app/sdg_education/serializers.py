@@ -6,7 +6,7 @@ class EducationSerializer(serializers.ModelSerializer):
     type = serializers.SerializerMethodField()
     class Meta:
         model = EducationDb
-        fields = '__all__'
+        exclude = ['sdg_mask', 'type_mask', 'discipline_mask', 'industry_mask']
         extra_fields = ['type']
     def get_type(self, obj):
         return 'education'
@@ -3,11 +3,15 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from multiselectfield.db.fields import MultiSelectField
+from search.indexes import education_facets, education_fuzzy, education_index
 MultiSelectField.flatchoices = property(lambda self: self.choices)
 
 
 class EducationSearchAPITestCase(APITestCase):
     def setUp(self):
+        education_index.reset()
+        education_facets.reset()
+        education_fuzzy.reset()
         EducationDb.objects.create(
             id=1,
             title="Sir Rupert Myers Sustainability Award",
@@ -97,6 +101,37 @@ class EducationSearchAPITestCase(APITestCase):
         self.assertEqual(len(data), 1)
         self.assertIn('climate', data[0]['title'].lower())
 
+    def test_search_orders_by_relevance(self):
+        EducationDb.objects.create(
+            id=5, title="Pollinator gardens", aims="Plant flowers for honey bees")
+        resp = self.client.get(
+            self.list_url, {'search': 'honey'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        ids = [item['id'] for item in resp.data['results']]
+        # title match ranks above a match in aims only
+        self.assertEqual(ids, [4, 5])
+
+    def test_search_matches_word_prefix(self):
+        resp = self.client.get(
+            self.list_url, {'search': 'honey be'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in resp.data['results']], [4])
+
+    def test_search_sees_new_records(self):
+        self.client.get(self.list_url, {'search': 'beekeeping'}, format='json')
+        EducationDb.objects.create(id=5, title="Urban beekeeping workshop")
+        resp = self.client.get(
+            self.list_url, {'search': 'beekeeping'}, format='json')
+        ids = sorted(item['id'] for item in resp.data['results'])
+        self.assertEqual(ids, [4, 5])
+
+    def test_search_tolerates_typos(self):
+        resp = self.client.get(
+            self.list_url, {'search': 'sustainabilty awrd'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in resp.data['results']], [1])
+
     def test_filter_by_single_sdg(self):
         resp = self.client.get(
             self.list_url, {'sdgs': ['4']}, format='json')
@@ -122,6 +157,33 @@ class EducationSearchAPITestCase(APITestCase):
         ])
         self.assertEqual(titles, expected)
 
+    def test_filter_by_discipline_ignores_case(self):
+        resp = self.client.get(
+            self.list_url, {'discipline': ['Information Technology']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in resp.data['results']], [2])
+
+    def test_facet_counts(self):
+        resp = self.client.get(
+            self.list_url, {'facets': 'true', 'sdgs': ['12']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(resp.data['count'], 3)
+        facets = resp.data['facets']
+        self.assertEqual(facets['location']['Australia'], 2)
+        self.assertEqual(facets['location']['United States'], 1)
+        # the sdg facet ignores its own selection
+        self.assertEqual(facets['sdgs']['2'], 2)
+        self.assertEqual(facets['sdgs']['4'], 1)
+
+    def test_facet_counts_with_keyword_search(self):
+        resp = self.client.get(
+            self.list_url, {'facets': 'true', 'search': 'climate'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['count'], 1)
+        self.assertEqual(resp.data['facets']['educational_resources']['Initiative'], 1)
+        self.assertEqual(resp.data['facets']['educational_resources']['Event'], 0)
+
     def test_filter_by_location(self):
         resp = self.client.get(
             self.list_url,
@@ -156,3 +218,32 @@ class EducationSearchAPITestCase(APITestCase):
         ids1 = {item['id'] for item in page_data['results']}
         ids2 = {item['id'] for item in page2['results']}
         self.assertTrue(ids1.isdisjoint(ids2))
+
+    def test_cursor_pagination(self):
+        resp = self.client.get(
+            self.list_url, {'pagination': 'cursor', 'per_page': 3}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', resp.data)
+        self.assertEqual([item['id'] for item in resp.data['results']], [1, 2, 3])
+
+        resp2 = self.client.get(resp.data['next'], format='json')
+        self.assertEqual(resp2.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in resp2.data['results']], [4])
+        self.assertIsNone(resp2.data['next'])
+
+    def test_cursor_pagination_follows_relevance(self):
+        EducationDb.objects.create(
+            id=5, title="Pollinator gardens", aims="Plant flowers for honey bees")
+        resp = self.client.get(
+            self.list_url,
+            {'search': 'honey', 'pagination': 'cursor', 'per_page': 1, 'include_count': 'true'},
+            format='json')
+        self.assertEqual(resp.data['count'], 2)
+        self.assertEqual([item['id'] for item in resp.data['results']], [4])
+
+        resp2 = self.client.get(resp.data['next'], format='json')
+        self.assertEqual([item['id'] for item in resp2.data['results']], [5])
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(self.list_url, {'cursor': 'bogus'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
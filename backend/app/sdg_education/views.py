@@ -6,7 +6,9 @@ from .models import EducationDb
 from .serializers import EducationSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 from .filters import EducationFilter
-from rest_framework.pagination import PageNumberPagination
+from search.indexes import education_facets
+from search.mixins import FacetCountMixin
+from search.pagination import OptionalCursorPagination
 
 
 class EducationSearchView(generics.ListAPIView):
@@ -45,11 +47,18 @@ class EducationRetrieveView(generics.RetrieveAPIView):
         return get_object_or_404(self.get_queryset(), id=education_id)
 
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(OptionalCursorPagination):
     page_size_query_param = 'per_page'
 
 
-class EducationFilterSearchView(generics.ListAPIView):
+class EducationFilterSearchView(FacetCountMixin, generics.ListAPIView):
+    """
+    GET /api/sdg-education/filter-search/?<filters>
+
+    Returns the paginated records matching the filters. With `facets=true`
+    returns the match count and per-value counts for every filter facet.
+    `pagination=cursor` switches to keyset pages with an opaque `next` link.
+    """
     authentication_classes = []
     permission_classes = [permissions.AllowAny]
     queryset = EducationDb.objects.all()
@@ -58,3 +67,4 @@ class EducationFilterSearchView(generics.ListAPIView):
     filter_backends = [DjangoFilterBackend]
     filterset_class = EducationFilter
     pagination_class = StandardResultsSetPagination
+    facet_index = education_facets
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class SdgKeywordsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'sdg_keywords'
+
+    def ready(self):
+        # recompile the keyword classifier whenever a keyword table changes
+        from .classifier import connect_signals
+        connect_signals()
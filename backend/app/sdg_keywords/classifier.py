@@ -0,0 +1,216 @@
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+WORD_RE = re.compile(r"\w+")
+GOAL_RE = re.compile(r"\d+")
+
+# the per-goal keyword tables edited in the admin
+TARGET_MODELS = [f'sdg_targets.SDG{n}_Target' for n in range(1, 18)]
+
+Label = Tuple[str, str]
+
+
+def normalize(text: Optional[str]) -> str:
+    """
+    Case-folds text and collapses every run of non-word characters to one
+    space, padded on both sides, so keywords only match on word boundaries.
+    """
+    if not text:
+        return ' '
+    return ' ' + ' '.join(WORD_RE.findall(str(text).casefold())) + ' '
+
+
+def parse_goal(value) -> Optional[str]:
+    """Extracts the goal number from values such as "7", "SDG 7" or "7.2"."""
+    match = GOAL_RE.search(str(value or ''))
+    if not match:
+        return None
+    goal = str(int(match.group()))
+    return goal if 1 <= int(goal) <= 17 else None
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton: finds every occurrence of many patterns in one
+    left-to-right pass over the text, independent of the number of patterns.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        self._compiled = False
+
+    def add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        if pattern not in self._out[state]:
+            self._out[state].append(pattern)
+        self._compiled = False
+
+    def compile(self):
+        """Computes failure links breadth-first and merges their outputs."""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                # shallower states are done first, so the suffix's outputs are complete
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._compiled = True
+
+    def __len__(self):
+        return len(self._goto)
+
+    def iter_matches(self, text: str):
+        """Yields (end offset, pattern) for every occurrence in `text`."""
+        if not self._compiled:
+            self.compile()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern in out[state]:
+                yield i, pattern
+
+
+class SDGClassifier:
+    """
+    Maps free text to SDGs and targets using the keyword tables.
+
+    Keywords from `sdg_keywords.Keyword` and the SDG1..17_Target tables are
+    compiled into one Aho-Corasick automaton. The automaton is rebuilt
+    lazily on the next classification after any keyword row changes (see
+    `invalidate`, wired to model signals in apps.py).
+    """
+
+    def __init__(self, models: Optional[Iterable[str]] = None):
+        self.model_labels = list(models) if models is not None else ['sdg_keywords.Keyword'] + TARGET_MODELS
+        self._lock = threading.RLock()
+        self._automaton: Optional[AhoCorasick] = None
+        self._labels: Dict[str, Set[Label]] = {}
+
+    def get_models(self):
+        return [apps.get_model(label) for label in self.model_labels]
+
+    def iter_keywords(self):
+        """Yields (keyword, goal, target) rows from every keyword table."""
+        for model in self.get_models():
+            for keyword, goal, target in model._default_manager.values_list('keyword', 'sdggoal', 'target'):
+                yield keyword, goal, target
+
+    def invalidate(self, *args, **kwargs):
+        with self._lock:
+            self._automaton = None
+            self._labels = {}
+
+    def collect_labels(self) -> Dict[str, Set[Label]]:
+        """Maps each normalised keyword to the (goal, target) pairs it indicates."""
+        labels: Dict[str, Set[Label]] = {}
+        for keyword, goal, target in self.iter_keywords():
+            pattern = normalize(keyword)
+            goal = parse_goal(goal)
+            if pattern == ' ' or goal is None:
+                continue
+            target = str(target or '').strip().upper()
+            if parse_goal(target) != goal:
+                target = ''
+            labels.setdefault(pattern, set()).add((goal, target))
+        return labels
+
+    def load(self, labels: Dict[str, Set[Label]]) -> AhoCorasick:
+        automaton = AhoCorasick()
+        for pattern in labels:
+            automaton.add(pattern)
+        automaton.compile()
+        with self._lock:
+            self._automaton = automaton
+            self._labels = {pattern: set(pairs) for pattern, pairs in labels.items()}
+        return automaton
+
+    def compile(self) -> AhoCorasick:
+        return self.load(self.collect_labels())
+
+    def snapshot(self) -> Dict[str, List[Label]]:
+        """Picklable copy of the keyword labels, for building copies elsewhere."""
+        _, labels = self.get_automaton()
+        return {pattern: sorted(pairs) for pattern, pairs in labels.items()}
+
+    @classmethod
+    def from_snapshot(cls, labels: Dict[str, List[Label]]) -> 'SDGClassifier':
+        """Builds a classifier that never reads the database."""
+        instance = cls(models=[])
+        instance.load(labels)
+        return instance
+
+    def get_automaton(self) -> Tuple[AhoCorasick, Dict[str, Set[Label]]]:
+        with self._lock:
+            if self._automaton is None:
+                self.compile()
+            return self._automaton, self._labels
+
+    def classify(self, text: Optional[str], top: Optional[int] = None) -> Dict:
+        """
+        Returns matched SDGs, targets and keywords with hit counts, most hits
+        first. A keyword mapped to several goals counts towards each of them.
+        `top` keeps only the best N goals and their targets.
+        """
+        automaton, labels = self.get_automaton()
+        keyword_hits: Dict[str, int] = {}
+        # text and patterns are space-padded, so only whole words match
+        for _, pattern in automaton.iter_matches(normalize(text)):
+            keyword_hits[pattern] = keyword_hits.get(pattern, 0) + 1
+
+        goal_hits: Dict[str, int] = {}
+        target_hits: Dict[Label, int] = {}
+        for pattern, hits in keyword_hits.items():
+            for goal in {goal for goal, _ in labels[pattern]}:
+                goal_hits[goal] = goal_hits.get(goal, 0) + hits
+            for goal, target in labels[pattern]:
+                if target:
+                    target_hits[(goal, target)] = target_hits.get((goal, target), 0) + hits
+
+        sdgs = sorted(goal_hits.items(), key=lambda item: (-item[1], int(item[0])))
+        targets = sorted(target_hits.items(), key=lambda item: (-item[1], int(item[0][0]), item[0][1]))
+        keywords = sorted(keyword_hits.items(), key=lambda item: (-item[1], item[0]))
+        if top:
+            sdgs = sdgs[:top]
+            kept = {goal for goal, _ in sdgs}
+            targets = [item for item in targets if item[0][0] in kept]
+        return {
+            'sdgs': [{'sdg': goal, 'hits': hits} for goal, hits in sdgs],
+            'targets': [{'sdg': goal, 'target': target, 'hits': hits}
+                        for (goal, target), hits in targets],
+            'keywords': [{'keyword': pattern.strip(), 'hits': hits} for pattern, hits in keywords],
+        }
+
+
+classifier = SDGClassifier()
+
+
+def connect_signals():
+    for model in classifier.get_models():
+        uid = f'sdg-classifier-{model._meta.label}'
+        post_save.connect(classifier.invalidate, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(classifier.invalidate, sender=model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sdg_actions.models import ActionDb
+from sdg_education.models import EducationDb
+from sdg_keywords.classifier import classifier
+from sdg_keywords.tagging import document_text
+
+# name -> (model, text fields fed to the matcher)
+TARGETS = {
+    'education': (EducationDb, ['title', 'description', 'aims']),
+    'actions': (ActionDb, ['actions', 'action_detail']),
+}
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise CommandError(f"Cannot read checkpoint {path}: {e}")
+
+
+def save_checkpoint(path, state):
+    # write-then-rename so an interrupted run never leaves a torn file
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills `suggested_sdgs` on EducationDb and ActionDb by running the SDG "
+        "keyword matcher over their text. Works in primary-key order in small "
+        "batches and records progress in a checkpoint file, so it can be "
+        "stopped and resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='*',
+                            help=f"Tables to backfill: {', '.join(TARGETS)} (default: all)")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Rows read and updated per transaction (default: 500)")
+        parser.add_argument('--checkpoint', default='backfill_sdg_tags.json',
+                            help="Progress file (default: ./backfill_sdg_tags.json)")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore saved progress and start from the first row")
+        parser.add_argument('--top', type=int, default=3,
+                            help="Suggest at most N SDGs per row (default: 3)")
+        parser.add_argument('--min-hits', type=int, default=1,
+                            help="Keyword hits an SDG needs to be suggested (default: 1)")
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Seconds to pause between batches to limit database load")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Classify and report without writing rows or the checkpoint")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        unknown = set(options['targets']) - set(TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown table(s): {', '.join(sorted(unknown))}")
+        state = {} if options['restart'] else load_checkpoint(options['checkpoint'])
+
+        # a finished run resumes after its last row, so reruns only tag new rows
+        for name in options['targets'] or list(TARGETS):
+            model, fields = TARGETS[name]
+            progress = state.setdefault(name, {'last_pk': None, 'rows': 0, 'updated': 0})
+            self.backfill(name, model, fields, progress, state, options)
+
+    def backfill(self, name, model, fields, progress, state, options):
+        queryset = model._default_manager.only('pk', 'suggested_sdgs', *fields).order_by('pk')
+        started = time.monotonic()
+        while True:
+            batch_qs = queryset
+            if progress['last_pk'] is not None:
+                batch_qs = batch_qs.filter(pk__gt=progress['last_pk'])
+            rows = list(batch_qs[:options['batch_size']])
+            if not rows:
+                break
+
+            changed = []
+            for row in rows:
+                suggested = self.suggest(row, fields, options)
+                if sorted(map(str, row.suggested_sdgs or []), key=int) != suggested:
+                    row.suggested_sdgs = suggested
+                    changed.append(row)
+            if not options['dry_run']:
+                with transaction.atomic():
+                    model._default_manager.bulk_update(changed, ['suggested_sdgs'])
+
+            progress['last_pk'] = rows[-1].pk
+            progress['rows'] += len(rows)
+            progress['updated'] += len(changed)
+            if not options['dry_run']:
+                save_checkpoint(options['checkpoint'], state)
+            self.stdout.write(f"{name}: {progress['rows']} rows scanned, "
+                              f"{progress['updated']} updated (last pk {progress['last_pk']})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{name}: complete in {time.monotonic() - started:.1f}s"))
+
+    def suggest(self, row, fields, options):
+        text = document_text({field: getattr(row, field) for field in fields}, fields)
+        sdgs = classifier.classify(text, top=options['top'])['sdgs']
+        return sorted((s['sdg'] for s in sdgs if s['hits'] >= options['min_hits']), key=int)
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sdg_keywords.tagging import read_documents, tag_documents, text_stream, to_jsonl
+
+
+class Command(BaseCommand):
+    help = (
+        "Tags a JSONL or CSV stream of documents with SDGs and targets from the "
+        "keyword tables, writing one JSON line per document."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-',
+                            help="Input file, or - for stdin (default)")
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            help="Input format (default: from the file extension, else jsonl)")
+        parser.add_argument('--output', '-o', default='-',
+                            help="Output file, or - for stdout (default)")
+        parser.add_argument('--fields',
+                            help="Comma-separated fields to classify (default: `text`, else all text fields)")
+        parser.add_argument('--id-field', default='id',
+                            help="Field holding the document id (default: id)")
+        parser.add_argument('--top', type=int,
+                            help="Keep only the N best-matching SDGs per document")
+        parser.add_argument('--workers', type=int,
+                            help="Worker processes (default: one per CPU; 1 disables the pool)")
+        parser.add_argument('--chunksize', type=int, default=64,
+                            help="Documents sent to a worker at a time (default: 64)")
+
+    def handle(self, *args, **options):
+        path = options['input']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        fields = [f.strip() for f in (options['fields'] or '').split(',') if f.strip()]
+
+        try:
+            source = text_stream(sys.stdin.buffer) if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}")
+        if options['output'] == '-':
+            target, write = self.stdout, lambda line: self.stdout.write(line, ending='')
+        else:
+            target = open(options['output'], 'w', encoding='utf-8')
+            write = target.write
+
+        started = time.monotonic()
+        count = 0
+        try:
+            results = tag_documents(
+                read_documents(source, fmt),
+                fields=fields or None,
+                id_field=options['id_field'],
+                top=options['top'],
+                workers=options['workers'],
+                chunksize=options['chunksize'],
+            )
+            for line in to_jsonl(results):
+                write(line)
+                count += 1
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if path != '-':
+                source.close()
+            if target is not self.stdout:
+                target.close()
+
+        elapsed = time.monotonic() - started
+        self.stderr.write(f"Tagged {count} documents in {elapsed:.2f}s "
+                          f"with {options['workers'] or os.cpu_count() or 1} worker(s)")
@@ -0,0 +1,171 @@
+import atexit
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+
+from .classifier import SDGClassifier, classifier
+
+# classifier rebuilt in each worker process from the parent's snapshot
+_worker_classifier: Optional[SDGClassifier] = None
+
+# process pool shared by requests, with the automaton its workers were built from
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_source = None
+
+
+def read_jsonl(lines: Iterable) -> Iterator[Dict]:
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+        if not isinstance(doc, dict):
+            raise ValueError(f"Line {number} is not a JSON object")
+        yield doc
+
+
+def read_csv(stream) -> Iterator[Dict]:
+    """
+    Reads CSV rows as dicts; `stream` is a text stream (open with utf-8-sig).
+    Fields may be as long as SDG_TAGGING_CSV_FIELD_LIMIT characters (whole
+    reports); csv.Error is raised for longer or malformed ones.
+    """
+    csv.field_size_limit(getattr(settings, 'SDG_TAGGING_CSV_FIELD_LIMIT', 16 * 1024 * 1024))
+    yield from csv.DictReader(stream)
+
+
+def read_documents(stream, fmt: str) -> Iterator[Dict]:
+    if fmt == 'jsonl':
+        return read_jsonl(stream)
+    if fmt == 'csv':
+        return read_csv(stream)
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def document_text(doc: Dict, fields: Optional[List[str]] = None, id_field: str = 'id') -> str:
+    """
+    The text to classify: the given fields, else a `text` field, else every
+    other string value of the document.
+    """
+    if fields:
+        values = [doc.get(field) for field in fields]
+    elif 'text' in doc:
+        values = [doc['text']]
+    else:
+        values = [value for key, value in doc.items() if key != id_field]
+    return '\n'.join(str(v) for v in values if isinstance(v, str) and v)
+
+
+def tag_text(tagger: SDGClassifier, doc_id, text: str, top: Optional[int] = None) -> Dict:
+    result = tagger.classify(text, top=top)
+    return {'id': doc_id, 'sdgs': result['sdgs'], 'targets': result['targets']}
+
+
+def _init_worker(labels):
+    global _worker_classifier
+    _worker_classifier = SDGClassifier.from_snapshot(labels)
+
+
+def _tag_in_worker(item):
+    doc_id, text, top = item
+    return tag_text(_worker_classifier, doc_id, text, top)
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # forkserver, not fork: a fork of the threaded web server would inherit
+    # locks (database, logging, cache) held by other request threads and can
+    # deadlock. The workers only need the snapshot passed to _init_worker.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'),
+                               initializer=_init_worker, initargs=(classifier.snapshot(),))
+
+
+def shared_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool reused across calls, so a request does not pay for
+    starting workers. The workers hold a snapshot of the keyword tables;
+    once the classifier has been rebuilt (or another size is asked for) the
+    next call gets a new pool and the old one winds down after its work.
+    """
+    global _pool, _pool_source
+    automaton, _ = classifier.get_automaton()
+    with _pool_lock:
+        if _pool is None or _pool_source != (automaton, workers):
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = _new_pool(workers)
+            _pool_source = (automaton, workers)
+        return _pool
+
+
+@atexit.register
+def shutdown_shared_pool():
+    global _pool, _pool_source
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = _pool_source = None
+
+
+def tag_documents(documents: Iterable[Dict], fields: Optional[List[str]] = None, id_field: str = 'id',
+                  top: Optional[int] = None, workers: Optional[int] = None,
+                  chunksize: int = 64, shared: bool = False) -> Iterator[Dict]:
+    """
+    Tags documents with SDGs and targets, yielding one result per document
+    in input order.
+
+    With more than one worker the matching runs in a process pool; each
+    worker compiles the automaton once from a snapshot of the keyword
+    tables, so workers never touch the database. Input is consumed in
+    windows, so arbitrarily long streams are tagged in bounded memory.
+    With `shared` the windows go to shared_pool() instead of a pool started
+    for this call.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    items = (
+        (doc.get(id_field, position), document_text(doc, fields, id_field), top)
+        for position, doc in enumerate(documents)
+    )
+    if workers <= 1:
+        for doc_id, text, limit in items:
+            yield tag_text(classifier, doc_id, text, limit)
+        return
+
+    window = workers * chunksize * 4
+    if shared:
+        while True:
+            batch = list(islice(items, window))
+            if not batch:
+                break
+            yield from shared_pool(workers).map(_tag_in_worker, batch, chunksize=chunksize)
+        return
+
+    with _new_pool(workers) as executor:
+        while True:
+            batch = list(islice(items, window))
+            if not batch:
+                break
+            yield from executor.map(_tag_in_worker, batch, chunksize=chunksize)
+
+
+def to_jsonl(results: Iterable[Dict]) -> Iterator[str]:
+    for result in results:
+        yield json.dumps(result, ensure_ascii=False) + '\n'
+
+
+def text_stream(binary) -> io.TextIOWrapper:
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
@@ -0,0 +1,177 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from sdg_actions.models import ActionDb
+from sdg_education.models import EducationDb
+from sdg_targets.models import SDG14_Target
+from .classifier import AhoCorasick, classifier
+from .models import Keyword
+from .tagging import shared_pool, shutdown_shared_pool, tag_documents
+
+
+class AhoCorasickTestCase(TestCase):
+    def test_finds_overlapping_patterns_in_one_pass(self):
+        automaton = AhoCorasick()
+        for pattern in ("he", "she", "his", "hers"):
+            automaton.add(pattern)
+        matches = sorted(automaton.iter_matches("ushers"))
+        self.assertEqual(matches, [(3, "he"), (3, "she"), (5, "hers")])
+
+
+class ClassifierTestCase(APITestCase):
+    def setUp(self):
+        classifier.invalidate()
+        Keyword.objects.create(keyword="Renewable energy", sdggoal="7", target="7.2")
+        Keyword.objects.create(keyword="energy", sdggoal="7", target="7.1")
+        Keyword.objects.create(keyword="Climate change", sdggoal="SDG 13", target="13.2")
+        SDG14_Target.objects.create(keyword="Ocean acidification", sdggoal="14", target="14.3")
+        self.url = reverse('keyword-classify')
+
+    def test_counts_goals_targets_and_keywords(self):
+        result = classifier.classify(
+            "Renewable energy slows climate change; energy storage helps. "
+            "Ocean acidification is a climate change problem too.")
+        self.assertEqual(result['sdgs'], [
+            {'sdg': '7', 'hits': 3},
+            {'sdg': '13', 'hits': 2},
+            {'sdg': '14', 'hits': 1},
+        ])
+        self.assertIn({'sdg': '7', 'target': '7.1', 'hits': 2}, result['targets'])
+        self.assertIn({'keyword': 'renewable energy', 'hits': 1}, result['keywords'])
+
+    def test_matches_whole_words_only(self):
+        self.assertEqual(classifier.classify("synergy and energyless")['sdgs'], [])
+
+    def test_recompiles_when_keywords_change(self):
+        self.assertEqual(classifier.classify("plastic pollution")['sdgs'], [])
+        Keyword.objects.create(keyword="plastic pollution", sdggoal="12", target="12.5")
+        self.assertEqual(classifier.classify("plastic pollution")['sdgs'], [{'sdg': '12', 'hits': 1}])
+        Keyword.objects.filter(keyword="plastic pollution").delete()
+        self.assertEqual(classifier.classify("plastic pollution")['sdgs'], [])
+
+    def test_classify_endpoint(self):
+        resp = self.client.post(self.url, {'text': 'Ocean acidification'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['targets'], [{'sdg': '14', 'target': '14.3', 'hits': 1}])
+
+        resp = self.client.post(self.url, {'text': ''}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchTagTestCase(APITestCase):
+    def setUp(self):
+        classifier.invalidate()
+        Keyword.objects.create(keyword="Renewable energy", sdggoal="7", target="7.2")
+        Keyword.objects.create(keyword="Climate change", sdggoal="13", target="13.2")
+        self.url = reverse('keyword-batch-tag')
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='tagger', password='password'))
+
+    def stream_lines(self, resp):
+        return [json.loads(line) for line in b''.join(resp.streaming_content).decode().splitlines()]
+
+    def test_tags_jsonl_in_order(self):
+        body = '{"id": 7, "text": "Climate change"}\n\n{"id": 3, "text": "Renewable energy"}\n'
+        resp = self.client.post(self.url, data=body, content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = self.stream_lines(resp)
+        self.assertEqual([r['id'] for r in results], [7, 3])
+        self.assertEqual(results[0]['sdgs'], [{'sdg': '13', 'hits': 1}])
+
+    def test_tags_csv_fields(self):
+        body = 'id,Title,Notes\n1,Renewable energy,Climate change\n'
+        resp = self.client.post(self.url + '?fields=Title', data=body, content_type='text/csv')
+        self.assertEqual(self.stream_lines(resp), [
+            {'id': '1', 'sdgs': [{'sdg': '7', 'hits': 1}], 'targets': [{'sdg': '7', 'target': '7.2', 'hits': 1}]},
+        ])
+
+    def test_rejects_invalid_input(self):
+        resp = self.client.post(self.url, data='{"id": 1}\nnot json\n', content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.post(self.url, {'documents': 'text'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SDG_TAGGING_PARALLEL_MIN_DOCS=1, SDG_TAGGING_WORKERS=1)
+    def test_late_invalid_line_ends_stream(self):
+        body = '{"id": 1, "text": "Climate change"}\n{"id": 2}\nnot json\n{"id": 4}\n'
+        resp = self.client.post(self.url, data=body, content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = self.stream_lines(resp)
+        self.assertEqual([r.get('id') for r in results], [1, 2, None])
+        self.assertEqual(results[-1], {'error': 'Line 3 is not valid JSON'})
+
+    def test_csv_fields_longer_than_the_csv_default(self):
+        report = 'Climate change ' + 'x' * 200000
+        resp = self.client.post(self.url, data=f'id,text\n1,{report}\n', content_type='text/csv')
+        self.assertEqual(self.stream_lines(resp)[0]['sdgs'], [{'sdg': '13', 'hits': 1}])
+
+    @override_settings(SDG_TAGGING_CSV_FIELD_LIMIT=100)
+    def test_oversized_csv_field(self):
+        long_row = '2,' + 'x' * 200
+        resp = self.client.post(self.url, data=f'id,text\n{long_row}\n', content_type='text/csv')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(SDG_TAGGING_PARALLEL_MIN_DOCS=1, SDG_TAGGING_WORKERS=1):
+            resp = self.client.post(self.url, data=f'id,text\n1,Climate change\n{long_row}\n',
+                                    content_type='text/csv')
+            results = self.stream_lines(resp)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(results[0]['id'], '1')
+        self.assertIn('field larger than field limit', results[-1]['error'])
+
+    def test_shared_pool_is_reused_until_keywords_change(self):
+        self.addCleanup(shutdown_shared_pool)
+        pool = shared_pool(2)
+        self.assertIs(shared_pool(2), pool)
+        Keyword.objects.create(keyword="Ocean acidification", sdggoal="14", target="14.3")
+        replaced = shared_pool(2)
+        self.assertIsNot(replaced, pool)
+        docs = [{'id': 1, 'text': "Ocean acidification"}]
+        self.assertEqual(list(tag_documents(docs, workers=2, shared=True))[0]['sdgs'],
+                         [{'sdg': '14', 'hits': 1}])
+
+    def test_process_pool_matches_in_process_results(self):
+        docs = [{'id': i, 'text': text} for i, text in enumerate(["Climate change", "Renewable energy", ""] * 5)]
+        self.assertEqual(list(tag_documents(docs, workers=2, chunksize=2)),
+                         list(tag_documents(docs, workers=1)))
+
+
+class BackfillSdgTagsTestCase(TestCase):
+    def setUp(self):
+        classifier.invalidate()
+        Keyword.objects.create(keyword="Renewable energy", sdggoal="7", target="7.2")
+        Keyword.objects.create(keyword="Climate change", sdggoal="13", target="13.2")
+        EducationDb.objects.create(id=1, title="Renewable energy", aims="Tackle climate change")
+        EducationDb.objects.create(id=2, title="Art history")
+        EducationDb.objects.create(id=3, title="Climate change law")
+        ActionDb.objects.create(id=1, actions="Install solar panels", action_detail="Renewable energy at home")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, 'progress.json')
+
+    def backfill(self, *args):
+        call_command('backfill_sdg_tags', *args, '--checkpoint', self.checkpoint, stdout=StringIO())
+
+    def test_writes_suggestions_in_batches(self):
+        self.backfill('--batch-size', '2')
+        self.assertEqual(list(EducationDb.objects.get(id=1).suggested_sdgs), ['7', '13'])
+        self.assertEqual(list(EducationDb.objects.get(id=2).suggested_sdgs), [])
+        self.assertEqual(list(ActionDb.objects.get(id=1).suggested_sdgs), ['7'])
+        with open(self.checkpoint) as f:
+            progress = json.load(f)
+        self.assertEqual(progress['education'], {'last_pk': 3, 'rows': 3, 'updated': 2})
+
+    def test_resumes_after_checkpoint(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'education': {'last_pk': 1, 'rows': 1, 'updated': 0}}, f)
+        self.backfill('education')
+        self.assertEqual(list(EducationDb.objects.get(id=1).suggested_sdgs), [])
+        self.assertEqual(list(EducationDb.objects.get(id=3).suggested_sdgs), ['13'])
+
+        self.backfill('education', '--restart')
+        self.assertEqual(list(EducationDb.objects.get(id=1).suggested_sdgs), ['7', '13'])
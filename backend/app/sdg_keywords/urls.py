@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import KeywordListCreateView, KeywordRetrieveUpdateDestroyView
+from .views import BatchTagView, ClassifyTextView, KeywordListCreateView, KeywordRetrieveUpdateDestroyView
 
 urlpatterns = [
     path('keywords/', KeywordListCreateView.as_view(), name='keyword-list-create'),
     path('keywords/<int:pk>/', KeywordRetrieveUpdateDestroyView.as_view(), name='keyword-detail'),
+    path('classify/', ClassifyTextView.as_view(), name='keyword-classify'),
+    path('tag/', BatchTagView.as_view(), name='keyword-batch-tag'),
 ]
@@ -1,7 +1,17 @@
-from rest_framework import generics, filters
+import codecs
+import csv
+import json
+from itertools import chain, islice
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import generics, filters, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .classifier import classifier
+from .tagging import read_csv, read_jsonl, tag_documents, to_jsonl
 from .models import Keyword
 from .serializers import KeywordSerializer
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 
 class KeywordListCreateView(generics.ListCreateAPIView):
     queryset = Keyword.objects.all().order_by('-updated_at')
@@ -15,3 +25,75 @@ class KeywordRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Keyword.objects.all()
     serializer_class = KeywordSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+
+class ClassifyTextView(APIView):
+    """
+    POST /api/sdg_keywords/classify/ {"text": "..."}
+    Returns the SDGs, targets and keywords found in the text, with hit
+    counts, most hits first.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        text = request.data.get('text')
+        if not isinstance(text, str) or not text.strip():
+            return Response({"message": "'text' must be a non-empty string."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(classifier.classify(text))
+
+
+class BatchTagView(APIView):
+    """
+    POST /api/sdg_keywords/tag/
+    Tags many documents at once. The body is JSON Lines
+    (Content-Type: application/x-ndjson), CSV (text/csv) or JSON
+    {"documents": [...]}; each document is tagged from `fields` (query
+    parameter, comma-separated), else its `text`, else all its text values.
+    Streams back one JSON line per document:
+    {"id": ..., "sdgs": [...], "targets": [...]}
+
+    JSON Lines and CSV bodies are read as they are tagged rather than
+    buffered. Once SDG_TAGGING_PARALLEL_MIN_DOCS documents have been read
+    the rest go to the shared worker pool; a malformed document among the
+    first ones is a 400, a later one ends the stream with an
+    {"error": ...} line. Very large files are better tagged offline with
+    `manage.py tag_documents`.
+    """
+    permission_classes = [IsAuthenticated]
+    JSONL_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+    def post(self, request):
+        try:
+            documents = self.get_documents(request)
+            head = list(islice(documents, settings.SDG_TAGGING_PARALLEL_MIN_DOCS))
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = [f.strip() for f in request.query_params.get('fields', '').split(',') if f.strip()]
+        workers = 1
+        if len(head) >= settings.SDG_TAGGING_PARALLEL_MIN_DOCS:
+            workers = settings.SDG_TAGGING_WORKERS
+        results = tag_documents(
+            chain(head, documents),
+            fields=fields or None,
+            id_field=request.query_params.get('id_field', 'id'),
+            workers=workers,
+            shared=True,
+        )
+        return StreamingHttpResponse(self.stream(results), content_type='application/x-ndjson')
+
+    def stream(self, results):
+        try:
+            yield from to_jsonl(results)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            yield json.dumps({"error": str(e)}) + '\n'
+
+    def get_documents(self, request):
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type in self.JSONL_TYPES:
+            return read_jsonl(request.stream or [])
+        if content_type == 'text/csv':
+            return read_csv(codecs.iterdecode(request.stream or [], 'utf-8-sig'))
+        documents = request.data.get('documents') if hasattr(request.data, 'get') else None
+        if not isinstance(documents, list) or not all(isinstance(d, dict) for d in documents):
+            raise ValueError("'documents' must be a list of objects.")
+        return iter(documents)
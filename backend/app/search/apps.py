@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'search'
+
+    def ready(self):
+        # keep the in-process indexes in sync with model saves/deletes
+        from .indexes import connect_signals
+        connect_signals()
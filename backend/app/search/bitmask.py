@@ -0,0 +1,71 @@
+from typing import Dict, Iterable, List, Union
+
+from django.db.models import F
+
+
+def choice_bits(choices) -> Dict[str, int]:
+    """
+    Maps each choice key (case-folded, as a string) to its bit, in the order
+    the choices are declared. Labels are accepted as aliases of their key.
+    """
+    bits = {}
+    for pos, (key, label) in enumerate(choices):
+        bits.setdefault(str(label).strip().casefold(), 1 << pos)
+        bits[str(key).strip().casefold()] = 1 << pos
+    return bits
+
+
+def split_values(values: Union[str, Iterable, None]) -> List[str]:
+    """Normalises a MultiSelectField value (list or comma string) to a list."""
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = values.split(',')
+    return [str(v).strip() for v in values if str(v).strip()]
+
+
+def to_mask(values, choices) -> int:
+    """
+    ORs together the bits of the given values. Matching is case-insensitive,
+    like the regex filters this replaces; unknown values are ignored.
+    """
+    bits = choice_bits(choices)
+    mask = 0
+    for value in split_values(values):
+        mask |= bits.get(value.casefold(), 0)
+    return mask
+
+
+def from_mask(mask: int, choices) -> List[str]:
+    return [str(key) for pos, (key, _) in enumerate(choices) if mask & (1 << pos)]
+
+
+class ChoiceMaskMixin:
+    """
+    Model mixin that keeps integer bitmask columns in sync with multi-select
+    columns on save(). Models declare MASK_FIELDS as
+    {source field: (mask field, choices)}.
+    """
+    MASK_FIELDS = {}
+
+    def update_masks(self):
+        for source, (mask_field, choices) in self.MASK_FIELDS.items():
+            setattr(self, mask_field, to_mask(getattr(self, source), choices))
+
+    def save(self, *args, **kwargs):
+        self.update_masks()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                mask_field for source, (mask_field, _) in self.MASK_FIELDS.items()
+                if source in update_fields
+            }
+        super().save(*args, **kwargs)
+
+
+def filter_any(queryset, mask_field: str, mask: int):
+    """Rows whose mask column shares at least one bit with `mask`."""
+    if not mask:
+        return queryset.none()
+    alias = f'{mask_field}_hit'
+    return queryset.alias(**{alias: F(mask_field).bitand(mask)}).filter(**{f'{alias}__gt': 0})
@@ -0,0 +1,609 @@
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models.signals import post_delete, post_save
+
+TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or
+that the their this to was were will with
+""".split())
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-cases text and splits it into word tokens, dropping stopwords."""
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(str(text).casefold()) if t not in STOPWORDS]
+
+
+class RankedQuerySetMixin:
+    """
+    Queryset restricted to and ordered by a list of ranked primary keys.
+
+    The ranking stays in Python instead of becoming a CASE / IN clause with
+    one branch per hit: `ranked_pks()` reads the primary keys that pass the
+    other filters with one pk-only query and keeps the ranked ones, and
+    counting, slicing and iteration fetch just the rows they need (a page)
+    and put them in rank order in memory. Each row gets its position in
+    the ranking as `search_rank`.
+    """
+    ranking: List = []
+    base_class = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.ranking = self.ranking
+        return clone
+
+    def _plain(self):
+        queryset = self._chain()
+        queryset.__class__ = self.base_class
+        return queryset
+
+    @property
+    def ordered(self):
+        return True
+
+    def ranked_pks(self) -> List:
+        """The ranked primary keys of rows matching the queryset's filters, best first."""
+        if getattr(self, '_ranked_pks', None) is None:
+            present = set(self._plain().values_list('pk', flat=True))
+            self._ranked_pks = [pk for pk in self.ranking if pk in present]
+        return self._ranked_pks
+
+    def in_rank_order(self, pks: List) -> List:
+        """Fetches the rows with the given primary keys, ordered by rank."""
+        if not pks:
+            return []
+        rows = list(self._plain().filter(pk__in=pks))
+        if rows and hasattr(rows[0], '_meta'):
+            position = {pk: pos for pos, pk in enumerate(self.ranking)}
+            for row in rows:
+                row.search_rank = position[row.pk]
+            rows.sort(key=lambda row: row.search_rank)
+        return rows
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            self._result_cache = self.in_rank_order(self.ranked_pks())
+        super()._fetch_all()
+
+    def __getitem__(self, k):
+        if self._result_cache is not None:
+            return self._result_cache[k]
+        if isinstance(k, slice):
+            return self.in_rank_order(self.ranked_pks()[k])
+        return self.in_rank_order([self.ranked_pks()[k]])[0]
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        return len(self.ranked_pks())
+
+    def exists(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        return bool(self.ranked_pks())
+
+
+_ranked_classes: Dict[type, type] = {}
+
+
+def rank_queryset(queryset, ranked_pks: List):
+    """
+    Restricts a queryset to the given primary keys and orders it by their
+    position in the list (see RankedQuerySetMixin). A paginated view only
+    fetches the rows of the requested page.
+    """
+    if not ranked_pks:
+        return queryset.none()
+    ranking = list(dict.fromkeys(ranked_pks))
+    base = type(queryset)
+    if issubclass(base, RankedQuerySetMixin):
+        # ranking a ranked queryset keeps the rows of both, in the new order
+        previous = set(queryset.ranking)
+        ranking = [pk for pk in ranking if pk in previous]
+        base = base.base_class
+    ranked_class = _ranked_classes.get(base)
+    if ranked_class is None:
+        ranked_class = _ranked_classes[base] = type(
+            f'Ranked{base.__name__}', (RankedQuerySetMixin, base), {'base_class': base})
+    ranked = queryset._chain()
+    ranked.__class__ = ranked_class
+    ranked.ranking = ranking
+    return ranked
+
+
+class ModelIndex:
+    """
+    Base class for in-process indexes over a Django model.
+
+    The index is built lazily from the database on first use and afterwards
+    kept current by post_save / post_delete handlers (see `connect`). It
+    lives in the memory of one process and only sees writes made through
+    the ORM's save() and delete() in that process: bulk `update()` /
+    `bulk_create()`, raw SQL and writes from other
+    workers or management commands leave it stale until `reset()` is called
+    or the process restarts. Results from a stale index are still checked
+    against the database (see rank_queryset), so deleted rows never show
+    up, but changed text is not re-scored.
+    Subclasses implement `add`, `discard` and `clear`.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.RLock()
+        self._built = False
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def add(self, instance):
+        raise NotImplementedError
+
+    def discard(self, pk):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if self._built:
+                return
+            self.clear()
+            for instance in self.get_queryset().iterator():
+                self.add(instance)
+            self._built = True
+
+    def reset(self):
+        """Drops the index contents; it is rebuilt on next use."""
+        with self._lock:
+            self.clear()
+            self._built = False
+
+    def update(self, instance):
+        with self._lock:
+            # nothing to do until the index has been built from the db
+            if not self._built:
+                return
+            self.discard(instance.pk)
+            self.add(instance)
+
+    def remove(self, pk):
+        with self._lock:
+            if self._built:
+                self.discard(pk)
+
+    def _handle_save(self, sender, instance, **kwargs):
+        self.update(instance)
+
+    def _handle_delete(self, sender, instance, **kwargs):
+        self.remove(instance.pk)
+
+    def _dispatch_uid(self):
+        return f'{type(self).__name__}-{self.model._meta.label}-{id(self)}'
+
+    def connect(self):
+        uid = self._dispatch_uid()
+        post_save.connect(self._handle_save, sender=self.model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self._handle_delete, sender=self.model, weak=False, dispatch_uid=uid)
+
+    def disconnect(self):
+        uid = self._dispatch_uid()
+        post_save.disconnect(sender=self.model, dispatch_uid=uid)
+        post_delete.disconnect(sender=self.model, dispatch_uid=uid)
+
+
+class TextIndex(ModelIndex):
+    """
+    Inverted index with BM25 ranking over weighted text fields of a model.
+
+    `fields` maps field names to weights; a term occurring in a field with
+    weight 3.0 counts as three occurrences (a simplified BM25F).
+    """
+
+    def __init__(self, model, fields: Dict[str, float], k1: float = 1.2, b: float = 0.75):
+        super().__init__(model)
+        self.fields = fields
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def get_queryset(self):
+        return super().get_queryset().only('pk', *self.fields)
+
+    def clear(self):
+        self._postings: Dict[str, Dict[object, float]] = {}
+        self._doc_terms: Dict[object, List[str]] = {}
+        self._doc_len: Dict[object, float] = {}
+        self._total_len = 0.0
+        self._vocab: Optional[List[str]] = None
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def add(self, instance):
+        self.add_document(instance.pk, {f: getattr(instance, f, None) for f in self.fields})
+
+    def add_document(self, pk, values: Dict[str, Optional[str]]):
+        freqs: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in self.fields.items():
+            for term in tokenize(values.get(field)):
+                freqs[term] = freqs.get(term, 0.0) + weight
+                length += weight
+        with self._lock:
+            self.discard(pk)
+            for term, tf in freqs.items():
+                if term not in self._postings:
+                    self._postings[term] = {}
+                    self._vocab = None
+                self._postings[term][pk] = tf
+            self._doc_terms[pk] = list(freqs)
+            self._doc_len[pk] = length
+            self._total_len += length
+
+    def discard(self, pk):
+        with self._lock:
+            terms = self._doc_terms.pop(pk, None)
+            if terms is None:
+                return
+            self._total_len -= self._doc_len.pop(pk)
+            for term in terms:
+                postings = self._postings[term]
+                postings.pop(pk, None)
+                if not postings:
+                    del self._postings[term]
+                    self._vocab = None
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        if self._vocab is None:
+            self._vocab = sorted(self._postings)
+        vocab = self._vocab
+        matches = []
+        i = bisect_left(vocab, prefix)
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            matches.append(vocab[i])
+            i += 1
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = None, require_all: bool = True,
+               prefix: bool = False) -> List[Tuple[object, float]]:
+        """
+        Returns (pk, score) pairs, best first.
+
+        With `require_all` only documents containing every query term are
+        returned. With `prefix` the last query term also matches any indexed
+        term it is a prefix of, which suits search-as-you-type.
+        """
+        self.ensure_built()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avgdl = (self._total_len / n_docs) or 1.0
+            scores: Dict[object, float] = {}
+            matched: Dict[object, int] = {}
+            for i, term in enumerate(terms):
+                expanded = [term]
+                if prefix and i == len(terms) - 1:
+                    expanded = self._expand_prefix(term) or expanded
+                term_scores: Dict[object, float] = {}
+                for t in expanded:
+                    postings = self._postings.get(t)
+                    if not postings:
+                        continue
+                    df = len(postings)
+                    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                    for pk, tf in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_len[pk] / avgdl)
+                        s = idf * tf * (self.k1 + 1) / (tf + norm)
+                        # prefix expansions of one term are alternatives, keep the best
+                        if s > term_scores.get(pk, 0.0):
+                            term_scores[pk] = s
+                for pk, s in term_scores.items():
+                    scores[pk] = scores.get(pk, 0.0) + s
+                    matched[pk] = matched.get(pk, 0) + 1
+
+        if require_all:
+            scores = {pk: s for pk, s in scores.items() if matched[pk] == len(terms)}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+    def search_pks(self, query: str, **kwargs) -> List:
+        return [pk for pk, _ in self.search(query, **kwargs)]
+
+
+class FacetIndex(ModelIndex):
+    """
+    Per-value posting lists (sets of primary keys) for the facet fields of a
+    model, so facet counts are computed by set intersection in memory.
+
+    `facets` maps a facet name (the filter parameter) to (field, choices).
+    """
+
+    def __init__(self, model, facets: Dict[str, Tuple[str, tuple]]):
+        super().__init__(model)
+        self.facets = facets
+        self._keys = {
+            name: {str(alias).strip().casefold(): str(key)
+                   for key, label in choices for alias in (label, key)}
+            for name, (_, choices) in facets.items()
+        }
+        self.clear()
+
+    def get_queryset(self):
+        return super().get_queryset().only('pk', *[field for field, _ in self.facets.values()])
+
+    def clear(self):
+        self._postings: Dict[str, Dict[str, set]] = {
+            name: {str(key): set() for key, _ in choices}
+            for name, (_, choices) in self.facets.items()
+        }
+        self._doc_values: Dict[object, List[Tuple[str, str]]] = {}
+
+    def canonical(self, name: str, values) -> List[str]:
+        """Maps raw field or query values to declared choice keys."""
+        if values is None or values == '':
+            return []
+        if isinstance(values, str):
+            values = values.split(',')
+        elif not isinstance(values, (list, tuple, set)):
+            values = [values]
+        keys = self._keys[name]
+        found = (keys.get(str(v).strip().casefold()) for v in values)
+        return list(dict.fromkeys(k for k in found if k is not None))
+
+    def add(self, instance):
+        entries = []
+        for name, (field, _) in self.facets.items():
+            for key in self.canonical(name, getattr(instance, field, None)):
+                self._postings[name][key].add(instance.pk)
+                entries.append((name, key))
+        with self._lock:
+            self._doc_values[instance.pk] = entries
+
+    def discard(self, pk):
+        with self._lock:
+            for name, key in self._doc_values.pop(pk, []):
+                self._postings[name][key].discard(pk)
+
+    def all_pks(self) -> set:
+        self.ensure_built()
+        return set(self._doc_values)
+
+    def matching(self, name: str, values) -> set:
+        """Primary keys having any of the given values for a facet."""
+        self.ensure_built()
+        result = set()
+        for key in self.canonical(name, values):
+            result |= self._postings[name][key]
+        return result
+
+    def counts(self, selections: Dict[str, List], base: Optional[set] = None) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        """
+        Returns the number of matching rows and the per-value counts for
+        every facet.
+
+        `base` restricts counting to rows matching the non-facet filters.
+        Counts are disjunctive: a facet's own selection is ignored when
+        counting its values, so every checkbox shows how many results it
+        would add.
+        """
+        self.ensure_built()
+        with self._lock:
+            universe = set(self._doc_values) if base is None else set(base) & set(self._doc_values)
+            selected = {name: self.matching(name, values)
+                        for name, values in selections.items() if values}
+
+            total = universe
+            for pks in selected.values():
+                total = total & pks
+
+            counts = {}
+            for name in self.facets:
+                candidates = universe
+                for other, pks in selected.items():
+                    if other != name:
+                        candidates = candidates & pks
+                counts[name] = {key: len(pks & candidates)
+                                for key, pks in self._postings[name].items()}
+        return len(total), counts
+
+
+def normalize_phrase(text: Optional[str]) -> str:
+    """Case-folds text and collapses it to space-separated word tokens."""
+    if not text:
+        return ''
+    return ' '.join(TOKEN_RE.findall(str(text).casefold()))
+
+
+class PrefixIndex(ModelIndex):
+    """
+    Sorted arrays of normalised phrases for prefix (autocomplete) lookups.
+
+    Each record contributes one key per word start of its text, so "energy"
+    completes "Switch to renewable energy" as well as "Energy policy". Keys
+    are kept in one sorted array per word position; a lookup bisects each
+    array in turn and reads every key in the prefix range, stopping once
+    the earlier positions have given `limit` records, so matches at the
+    start of a text are never crowded out by later ones. Updates are insort
+    / bisect deletions, so the index refreshes incrementally.
+    """
+
+    def __init__(self, model, field: str, max_words: int = 8):
+        super().__init__(model)
+        self.field = field
+        self.max_words = max_words
+        self.clear()
+
+    def get_queryset(self):
+        return super().get_queryset().only('pk', self.field)
+
+    def clear(self):
+        self._keys: List[List[Tuple[str, object]]] = [[] for _ in range(self.max_words)]
+        self._doc_keys: Dict[object, List[Tuple[int, Tuple[str, object]]]] = {}
+        self._text: Dict[object, str] = {}
+
+    def add(self, instance):
+        text = getattr(instance, self.field, None)
+        words = normalize_phrase(text).split()
+        if not words:
+            return
+        entries = [(i, (' '.join(words[i:]), instance.pk))
+                   for i in range(min(len(words), self.max_words))]
+        with self._lock:
+            self.discard(instance.pk)
+            for pos, entry in entries:
+                insort(self._keys[pos], entry)
+            self._doc_keys[instance.pk] = entries
+            self._text[instance.pk] = str(text).strip()
+
+    def discard(self, pk):
+        with self._lock:
+            for pos, entry in self._doc_keys.pop(pk, []):
+                keys = self._keys[pos]
+                i = bisect_left(keys, entry)
+                if i < len(keys) and keys[i] == entry:
+                    del keys[i]
+            self._text.pop(pk, None)
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[object, str, int]]:
+        """
+        Returns up to `limit` (pk, text, word position) completions. Matches
+        at the start of the text come first, then shorter texts.
+        """
+        self.ensure_built()
+        prefix = normalize_phrase(prefix)
+        if not prefix or limit <= 0:
+            return []
+        best: Dict[object, int] = {}
+        with self._lock:
+            for pos, keys in enumerate(self._keys):
+                if len(best) >= limit:
+                    break
+                i = bisect_left(keys, (prefix,))
+                while i < len(keys) and keys[i][0].startswith(prefix):
+                    best.setdefault(keys[i][1], pos)
+                    i += 1
+            ranked = sorted(best.items(), key=lambda item: (item[1], len(self._text[item[0]]), item[0]))
+            return [(pk, self._text[pk], pos) for pk, pos in ranked[:limit]]
+
+
+def trigrams(word: str) -> set:
+    """Character trigrams of a word, padded as in pg_trgm ("  word ")."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex(ModelIndex):
+    """
+    Character-trigram index over the words of a short text field, for
+    typo-tolerant matching ("sustainabilty", "renewable enrgy").
+
+    Each query word is compared with the indexed vocabulary by trigram
+    similarity (shared / union of the two trigram sets). A record scores the
+    mean, over the query words, of the best similarity among its own words.
+    """
+
+    def __init__(self, model, field: str, word_threshold: float = 0.3):
+        super().__init__(model)
+        self.field = field
+        self.word_threshold = word_threshold
+        self.clear()
+
+    def get_queryset(self):
+        return super().get_queryset().only('pk', self.field)
+
+    def clear(self):
+        self._doc_words: Dict[object, set] = {}
+        self._word_docs: Dict[str, set] = {}
+        self._word_grams: Dict[str, int] = {}
+        self._gram_words: Dict[str, set] = {}
+
+    def add(self, instance):
+        words = set(tokenize(getattr(instance, self.field, None)))
+        with self._lock:
+            self.discard(instance.pk)
+            for word in words:
+                docs = self._word_docs.get(word)
+                if docs is None:
+                    docs = self._word_docs[word] = set()
+                    grams = trigrams(word)
+                    self._word_grams[word] = len(grams)
+                    for gram in grams:
+                        self._gram_words.setdefault(gram, set()).add(word)
+                docs.add(instance.pk)
+            self._doc_words[instance.pk] = words
+
+    def discard(self, pk):
+        with self._lock:
+            for word in self._doc_words.pop(pk, ()):
+                docs = self._word_docs[word]
+                docs.discard(pk)
+                if docs:
+                    continue
+                del self._word_docs[word]
+                del self._word_grams[word]
+                for gram in trigrams(word):
+                    words = self._gram_words[gram]
+                    words.discard(word)
+                    if not words:
+                        del self._gram_words[gram]
+
+    def similar_words(self, word: str, threshold: Optional[float] = None) -> Dict[str, float]:
+        """Indexed words whose trigram similarity to `word` reaches the threshold."""
+        self.ensure_built()
+        threshold = self.word_threshold if threshold is None else threshold
+        grams = trigrams(word)
+        shared: Dict[str, int] = {}
+        with self._lock:
+            for gram in grams:
+                for candidate in self._gram_words.get(gram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            similar = {}
+            for candidate, n in shared.items():
+                sim = n / (len(grams) + self._word_grams[candidate] - n)
+                if sim >= threshold:
+                    similar[candidate] = sim
+        return similar
+
+    def search(self, query: str, limit: Optional[int] = None,
+               threshold: float = 0.3) -> List[Tuple[object, float]]:
+        """Returns (pk, similarity) pairs scoring at least `threshold`, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        scores: Dict[object, float] = {}
+        with self._lock:
+            for term in terms:
+                best: Dict[object, float] = {}
+                for word, sim in self.similar_words(term).items():
+                    for pk in self._word_docs[word]:
+                        if sim > best.get(pk, 0.0):
+                            best[pk] = sim
+                for pk, sim in best.items():
+                    scores[pk] = scores.get(pk, 0.0) + sim
+        ranked = sorted(((pk, s / len(terms)) for pk, s in scores.items()),
+                        key=lambda item: (-item[1], item[0]))
+        ranked = [(pk, s) for pk, s in ranked if s >= threshold]
+        return ranked[:limit] if limit else ranked
+
+    def search_pks(self, query: str, **kwargs) -> List:
+        return [pk for pk, _ in self.search(query, **kwargs)]
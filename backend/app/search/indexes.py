@@ -0,0 +1,106 @@
+import logging
+import threading
+from django.conf import settings
+from django.db import connection
+from sdg_actions import models as action_models
+from sdg_actions.models import ActionDb
+from sdg_education import models as education_models
+from sdg_education.models import EducationDb
+from sdg_keywords.models import Keyword
+from .engine import FacetIndex, PrefixIndex, TextIndex, TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+# title matches weigh more than matches buried in long descriptions
+education_index = TextIndex(EducationDb, fields={
+    'title': 3.0,
+    'aims': 1.5,
+    'description': 1.0,
+    'learning_outcome': 1.0,
+})
+
+action_index = TextIndex(ActionDb, fields={
+    'actions': 3.0,
+    'action_detail': 1.0,
+    'sources': 0.5,
+})
+
+keyword_index = TextIndex(Keyword, fields={
+    'keyword': 3.0,
+    'sdggoal': 1.0,
+    'target': 1.0,
+    'note': 1.0,
+    'reference1': 0.5,
+    'reference2': 0.5,
+})
+
+# keyed on the filter-search query parameter names
+education_facets = FacetIndex(EducationDb, facets={
+    'sdgs': ('sdgs_related', education_models.SDG_CHOICES),
+    'location': ('location', education_models.REGION_CHOICES),
+    'discipline': ('related_to_which_discipline', education_models.DISP_CHOICES),
+    'industries': ('useful_for_which_industries', education_models.INDU_CHOICES),
+    'educational_resources': ('type_label', education_models.TYPE_CHOICES),
+})
+
+action_facets = FacetIndex(ActionDb, facets={
+    'sdgs': ('sdgs', action_models.SDG_CHOICES),
+    'level': ('level', action_models.LEVEL_CHOICES),
+    'award': ('award', action_models.YNB_CHOICES),
+    'individual_organization': ('individual_organization', action_models.YNB_CHOICES),
+    'digital_actions': ('digital_actions', action_models.DIGITAL_CHOICES),
+    'related_industry': ('related_industry', action_models.INDU_CHOICES),
+})
+
+# title / keyword completion for search-as-you-type
+action_titles = PrefixIndex(ActionDb, 'actions')
+education_titles = PrefixIndex(EducationDb, 'title')
+keyword_terms = PrefixIndex(Keyword, 'keyword')
+
+# typo-tolerant fallback when exact term matching finds nothing
+action_fuzzy = TrigramIndex(ActionDb, 'actions')
+education_fuzzy = TrigramIndex(EducationDb, 'title')
+keyword_fuzzy = TrigramIndex(Keyword, 'keyword')
+
+INDEXES = [
+    education_index,
+    action_index,
+    keyword_index,
+    education_facets,
+    action_facets,
+    action_titles,
+    education_titles,
+    keyword_terms,
+    action_fuzzy,
+    education_fuzzy,
+    keyword_fuzzy,
+]
+
+
+def connect_signals():
+    for index in INDEXES:
+        index.connect()
+
+
+def warm_indexes():
+    """Builds every index up front so the first request does not pay for it."""
+    for index in INDEXES:
+        index.ensure_built()
+
+
+def _warm_and_release():
+    try:
+        warm_indexes()
+        logger.info("Search indexes warmed")
+    except Exception as e:
+        # the indexes build lazily on first use instead
+        logger.error(f"Failed to warm search indexes: {str(e)}")
+    finally:
+        connection.close()
+
+
+def warm_indexes_in_background():
+    """Called from the WSGI/ASGI entry points so server start is not delayed."""
+    if not getattr(settings, 'SEARCH_WARM_ON_STARTUP', True):
+        return
+    threading.Thread(target=_warm_and_release, name='search-index-warmup', daemon=True).start()
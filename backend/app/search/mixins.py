@@ -0,0 +1,50 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .engine import RankedQuerySetMixin
+
+TRUTHY = ('1', 'true', 'yes')
+
+
+class FacetCountMixin:
+    """
+    Adds a facet-aggregation mode to a filtered list view.
+
+    GET ...?facets=true&<filters> returns
+        {"count": <matching rows>, "facets": {<facet>: {<value>: <count>}}}
+    in one pass. Facet filters are resolved from the view's `facet_index`
+    posting lists; any other filters (e.g. keyword search) are applied once
+    through the filterset to get the base set of primary keys.
+    """
+    facet_index = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('facets', '').lower() not in TRUTHY:
+            return super().list(request, *args, **kwargs)
+        count, facets = self.get_facet_counts()
+        return Response({'count': count, 'facets': facets})
+
+    def get_facet_counts(self):
+        params = self.request.query_params
+        facet_names = set(self.facet_index.facets)
+        selections = {name: params.getlist(name) for name in facet_names if params.getlist(name)}
+
+        filterset = self.filterset_class(params, queryset=self.get_queryset(), request=self.request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        base = None
+        other_filters = [name for name in filterset.filters
+                         if name not in facet_names and params.get(name)]
+        if other_filters:
+            remaining = params.copy()
+            for name in facet_names:
+                remaining.pop(name, None)
+            filterset = self.filterset_class(remaining, queryset=self.get_queryset(), request=self.request)
+            queryset = filterset.qs
+            if isinstance(queryset, RankedQuerySetMixin):
+                base = set(queryset.ranked_pks())
+            else:
+                base = set(queryset.values_list('pk', flat=True))
+
+        return self.facet_index.counts(selections, base=base)
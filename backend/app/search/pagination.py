@@ -0,0 +1,109 @@
+import base64
+import json
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .engine import RankedQuerySetMixin
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode.
+
+    ?pagination=cursor starts cursor mode; each response carries an opaque
+    `next` link containing ?cursor=<token>. Pages are fetched with
+    `WHERE key > last_key ORDER BY key LIMIT n`, keyed on the relevance
+    position (`search_rank`) when the queryset is ranked and on the primary
+    key otherwise. The COUNT(*) is skipped unless ?include_count=true.
+
+    Ranked querysets (search.engine.rank_queryset) are paged over their
+    primary key list in memory, so only the rows of the page are fetched.
+    """
+    page_size_query_param = 'per_page'
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    count_query_param = 'include_count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.cursor_mode = (params.get(self.mode_query_param) == 'cursor'
+                            or self.cursor_query_param in params)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if isinstance(queryset, RankedQuerySetMixin):
+            return self.paginate_ranked(queryset, page_size)
+        key = 'pk'
+        queryset = queryset.order_by(key)
+
+        self.count = None
+        if params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        token = params.get(self.cursor_query_param)
+        if token:
+            last = self.decode_cursor(token, key)
+            queryset = queryset.filter(**{f'{key}__gt': last})
+
+        self.key = key
+        rows = list(queryset[:page_size + 1])
+        self.next_key = getattr(rows[page_size - 1], key) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def paginate_ranked(self, queryset, page_size):
+        params = self.request.query_params
+        self.key = 'search_rank'
+        position = {pk: pos for pos, pk in enumerate(queryset.ranking)}
+        pks = queryset.ranked_pks()
+
+        self.count = None
+        if params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = len(pks)
+
+        token = params.get(self.cursor_query_param)
+        if token:
+            last = self.decode_cursor(token, self.key)
+            pks = [pk for pk in pks if position[pk] > last]
+
+        self.next_key = position[pks[page_size - 1]] if len(pks) > page_size else None
+        return queryset.in_rank_order(pks[:page_size])
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        body = OrderedDict()
+        if self.count is not None:
+            body['count'] = self.count
+        body['next'] = self.get_next_link()
+        body['results'] = data
+        return Response(body)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_key is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_key))
+
+    def encode_cursor(self, value):
+        raw = json.dumps([self.key, value], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token, key):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            cursor_key, value = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # a cursor is only valid for the ordering it was issued under
+        if cursor_key != key or not isinstance(value, int):
+            raise NotFound(self.invalid_cursor_message)
+        return value
@@ -0,0 +1,227 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from sdg_actions.models import ActionDb
+from sdg_education.models import EducationDb
+from sdg_keywords.models import Keyword
+from .bitmask import from_mask, to_mask
+from .engine import PrefixIndex, TextIndex, TrigramIndex, rank_queryset, tokenize
+from .indexes import INDEXES
+
+
+class TokenizeTestCase(TestCase):
+    def test_lowercases_and_drops_stopwords(self):
+        self.assertEqual(tokenize("The Climate of Change"), ["climate", "change"])
+        self.assertEqual(tokenize(None), [])
+
+
+class BitmaskTestCase(TestCase):
+    CHOICES = ((1, '1'), (2, '2'), ("Health", "Health (Medicine)"))
+
+    def test_to_mask_is_case_insensitive(self):
+        self.assertEqual(to_mask(["1", " health"], self.CHOICES), 0b101)
+        self.assertEqual(to_mask("2,Unknown", self.CHOICES), 0b010)
+        self.assertEqual(to_mask(None, self.CHOICES), 0)
+
+    def test_from_mask_round_trips(self):
+        self.assertEqual(from_mask(0b101, self.CHOICES), ['1', 'Health'])
+
+
+class RankQuerysetTestCase(TestCase):
+    def setUp(self):
+        for i in range(1, 7):
+            EducationDb.objects.create(id=i, title=f"Course {i}", location="Asia" if i % 2 else "Europe")
+        self.ranking = [5, 2, 9, 3, 6, 1]  # 9 does not exist
+
+    def test_orders_by_ranking(self):
+        ranked = rank_queryset(EducationDb.objects.all(), self.ranking)
+        self.assertEqual([e.id for e in ranked], [5, 2, 3, 6, 1])
+        self.assertEqual([e.search_rank for e in ranked], [0, 1, 3, 4, 5])
+        self.assertEqual(ranked.count(), 5)
+
+    def test_later_filters_apply(self):
+        ranked = rank_queryset(EducationDb.objects.all(), self.ranking).filter(location="Asia")
+        self.assertEqual(ranked.ranked_pks(), [5, 3, 1])
+        self.assertEqual([e.id for e in ranked[1:3]], [3, 1])
+
+    def test_page_fetches_only_its_rows(self):
+        ranked = rank_queryset(EducationDb.objects.all(), list(range(1, 2000)))
+        with CaptureQueriesContext(connection) as queries:
+            page = ranked[2:4]
+        self.assertEqual([e.id for e in page], [3, 4])
+        # one pk-only query and one for the page; the ranking is not sent as SQL
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all(len(q['sql']) < 1000 for q in queries))
+
+
+class TextIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = TextIndex(EducationDb, fields={'title': 3.0, 'description': 1.0})
+        self.index.connect()
+        self.addCleanup(self.index.disconnect)
+        EducationDb.objects.create(id=1, title="Ocean plastics",
+                                   description="Reducing plastic waste in the ocean")
+        EducationDb.objects.create(id=2, title="Climate policy",
+                                   description="Carbon pricing and climate policy design")
+        EducationDb.objects.create(id=3, title="Urban planning",
+                                   description="Climate resilient cities")
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.index.search_pks("climate"), [2, 3])
+
+    def test_all_terms_required(self):
+        self.assertEqual(self.index.search_pks("climate cities"), [3])
+        self.assertEqual(self.index.search_pks("climate cities", require_all=False)[0], 3)
+
+    def test_prefix_matches_last_term(self):
+        self.assertEqual(self.index.search_pks("plast"), [])
+        self.assertEqual(self.index.search_pks("plast", prefix=True), [1])
+
+    def test_signals_update_built_index(self):
+        self.index.ensure_built()
+        edu = EducationDb.objects.create(id=4, title="Coral reef climate")
+        self.assertIn(4, self.index.search_pks("coral"))
+        edu.title = "Seagrass meadows"
+        edu.save()
+        self.assertEqual(self.index.search_pks("coral"), [])
+        edu.delete()
+        self.assertEqual(self.index.search_pks("seagrass"), [])
+        self.assertEqual(len(self.index), 3)
+
+
+class TrigramIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = TrigramIndex(ActionDb, 'actions')
+        self.index.connect()
+        self.addCleanup(self.index.disconnect)
+        ActionDb.objects.create(id=1, actions="Switch to renewable energy")
+        ActionDb.objects.create(id=2, actions="Learn about sustainability")
+        ActionDb.objects.create(id=3, actions="Reduce food waste")
+
+    def test_matches_misspelt_words(self):
+        self.assertEqual(self.index.search_pks("sustainabilty"), [2])
+        self.assertEqual(self.index.search_pks("renewable enrgy"), [1])
+        self.assertEqual(self.index.search_pks("quantum physics"), [])
+
+    def test_exact_match_scores_highest(self):
+        (pk, score), = self.index.search("food waste")
+        self.assertEqual((pk, score), (3, 1.0))
+
+    def test_signals_update_built_index(self):
+        self.index.ensure_built()
+        action = ActionDb.objects.get(id=3)
+        action.actions = "Compost kitchen scraps"
+        action.save()
+        self.assertEqual(self.index.search_pks("compst"), [3])
+        self.assertEqual(self.index.search_pks("food wast"), [])
+
+
+class PrefixIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex(ActionDb, 'actions')
+        self.index.connect()
+        self.addCleanup(self.index.disconnect)
+
+    def test_title_start_matches_past_many_later_words(self):
+        # 600 titles with a word starting "s" after the first sort before "switch ..."
+        ActionDb.objects.bulk_create(
+            ActionDb(id=i, actions=f"Reduce s{i:04d} waste") for i in range(1, 601))
+        ActionDb.objects.create(id=1000, actions="Switch to renewable energy")
+        results = self.index.complete("s", limit=3)
+        self.assertEqual(results[0], (1000, "Switch to renewable energy", 0))
+        self.assertEqual([pos for _, _, pos in results], [0, 1, 1])
+
+    def test_later_positions_fill_the_limit(self):
+        ActionDb.objects.create(id=1, actions="Energy policy")
+        ActionDb.objects.create(id=2, actions="Save energy at home")
+        ActionDb.objects.create(id=3, actions="Switch to renewable energy")
+        self.assertEqual([pk for pk, _, _ in self.index.complete("ener")], [1, 2, 3])
+        ActionDb.objects.get(id=1).delete()
+        self.assertEqual([pk for pk, _, _ in self.index.complete("ener", limit=1)], [2])
+
+
+class UnifiedSearchAPITestCase(APITestCase):
+    def setUp(self):
+        for index in INDEXES:
+            index.reset()
+        Keyword.objects.create(keyword="renewable energy", sdggoal="7", target="7.2")
+        Keyword.objects.create(keyword="solar power", sdggoal="7", target="7.1")
+        ActionDb.objects.create(id=1, actions="Switch to renewable energy",
+                                action_detail="Choose a renewable energy supplier.")
+        ActionDb.objects.create(id=2, actions="Recycle batteries")
+        EducationDb.objects.create(id=1, title="Energy policy",
+                                   description="Transition to renewable energy systems")
+        self.url = reverse('unified-search')
+
+    def test_merges_typed_results(self):
+        resp = self.client.get(self.url, {'q': 'renewable energy'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['counts'], {'keywords': 1, 'actions': 1, 'education': 1})
+        types = {r['type'] for r in resp.data['results']}
+        self.assertEqual(types, {'keyword', 'action', 'education'})
+        scores = [r['score'] for r in resp.data['results']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        # scores are relative to the best hit of each corpus
+        self.assertEqual(scores, [1.0, 1.0, 1.0])
+
+    def test_scores_are_normalized_per_corpus(self):
+        ActionDb.objects.create(id=3, actions="Energy audit",
+                                action_detail="Check the energy use of a building.")
+        resp = self.client.get(self.url, {'q': 'energy', 'types': 'keywords,actions'})
+        by_type = {}
+        for result in resp.data['results']:
+            by_type.setdefault(result['type'], []).append(result['score'])
+        self.assertEqual(by_type['keyword'], [1.0])
+        self.assertEqual(by_type['action'][0], 1.0)
+        self.assertLess(by_type['action'][1], 1.0)
+        # a weaker action does not sit above the best keyword just for its corpus' idf
+        self.assertEqual(resp.data['results'][-1]['type'], 'action')
+
+        resp = self.client.get(self.url, {'q': 'energy', 'types': 'actions', 'actions_limit': 1})
+        self.assertEqual(resp.data['counts'], {'actions': 2})
+        self.assertEqual(len(resp.data['results']), 1)
+
+    def test_per_corpus_limits_and_types(self):
+        resp = self.client.get(self.url, {'q': 'energy', 'types': 'keywords,actions',
+                                          'actions_limit': 0})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        # counts are matches in the corpus, not hits returned
+        self.assertEqual(resp.data['counts'], {'keywords': 1, 'actions': 1})
+        self.assertEqual([r['type'] for r in resp.data['results']], ['keyword'])
+        self.assertEqual(resp.data['results'][0]['item']['keyword'], "renewable energy")
+
+    def test_unknown_corpus(self):
+        resp = self.client.get(self.url, {'q': 'energy', 'types': 'teams'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AutocompleteAPITestCase(APITestCase):
+    def setUp(self):
+        for index in INDEXES:
+            index.reset()
+        Keyword.objects.create(keyword="Energy efficiency", sdggoal="7", target="7.3")
+        Keyword.objects.create(keyword="energy efficiency", sdggoal="7", target="7.B")
+        ActionDb.objects.create(id=1, actions="Switch to renewable energy")
+        EducationDb.objects.create(id=1, title="Energy policy and markets")
+        self.url = reverse('search-autocomplete')
+
+    def test_prefix_completions(self):
+        resp = self.client.get(self.url, {'q': 'ener'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        texts = [r['text'] for r in resp.data['results']]
+        # title-start matches first, duplicate keywords collapsed
+        self.assertEqual(texts, ["Energy efficiency", "Energy policy and markets",
+                                 "Switch to renewable energy"])
+
+    def test_completions_refresh_on_save(self):
+        self.client.get(self.url, {'q': 'ener'})
+        action = ActionDb.objects.get(id=1)
+        action.actions = "Install solar panels"
+        action.save()
+        resp = self.client.get(self.url, {'q': 'solar p'})
+        self.assertEqual([r['id'] for r in resp.data['results']], [1])
+        resp = self.client.get(self.url, {'q': 'renewable'})
+        self.assertEqual(resp.data['results'], [])
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import AutocompleteView, UnifiedSearchView
+
+urlpatterns = [
+    path('', UnifiedSearchView.as_view(), name='unified-search'),
+    path('autocomplete/', AutocompleteView.as_view(), name='search-autocomplete'),
+]
@@ -0,0 +1,133 @@
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from sdg_actions.serializers import ActionSerializer
+from sdg_education.serializers import EducationSerializer
+from sdg_keywords.serializers import KeywordSerializer
+from .indexes import (
+    action_index,
+    action_titles,
+    education_index,
+    education_titles,
+    keyword_index,
+    keyword_terms,
+)
+
+# corpus name -> (result type, index, serializer)
+CORPORA = {
+    'keywords': ('keyword', keyword_index, KeywordSerializer),
+    'actions': ('action', action_index, ActionSerializer),
+    'education': ('education', education_index, EducationSerializer),
+}
+
+# result type -> prefix index used for autocomplete
+COMPLETIONS = {
+    'keyword': keyword_terms,
+    'action': action_titles,
+    'education': education_titles,
+}
+
+DEFAULT_CORPUS_LIMIT = 10
+MAX_LIMIT = 100
+
+
+def _int_param(params, name, default):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be an integer.'})
+    return max(0, min(value, MAX_LIMIT))
+
+
+class UnifiedSearchView(APIView):
+    """
+    GET /api/search/?q=<search_term>
+
+    Searches keywords, actions and education records in one round trip
+    using the shared in-memory indexes. Each corpus has its own index, so
+    its BM25 scores (idf, average length) are not comparable with the
+    others': a hit's `score` is its BM25 score divided by the best score in
+    its corpus, and the hits are merged by that. `counts` is the number of
+    matches in each corpus, before the per-corpus limit.
+
+    Optional parameters:
+        types=keywords,actions,education   corpora to search (default all)
+        <corpus>_limit=<n>                 max hits per corpus (default 10)
+        limit=<n>                          max merged hits (default: sum of corpus limits)
+        match=any                          match any term instead of all
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        query = params.get('q', '').strip()
+        names = [n.strip() for n in params.get('types', '').split(',') if n.strip()] or list(CORPORA)
+        unknown = [n for n in names if n not in CORPORA]
+        if unknown:
+            raise ValidationError({'types': f"Unknown corpus: {', '.join(unknown)}"})
+        require_all = params.get('match', 'all') != 'any'
+
+        hits = []
+        counts = {}
+        for name in names:
+            result_type, index, serializer_class = CORPORA[name]
+            corpus_limit = _int_param(params, f'{name}_limit', DEFAULT_CORPUS_LIMIT)
+            matches = index.search(query, require_all=require_all, prefix=True) if query else []
+            counts[name] = len(matches)
+            ranked = matches[:corpus_limit]
+            if not ranked:
+                continue
+            best = ranked[0][1] or 1.0
+            objects = index.model._default_manager.in_bulk([pk for pk, _ in ranked])
+            for pk, score in ranked:
+                obj = objects.get(pk)
+                # the index can briefly lag a delete made by another process
+                if obj is not None:
+                    hits.append((score / best, result_type, serializer_class(obj).data))
+
+        hits.sort(key=lambda hit: -hit[0])
+        limit = _int_param(params, 'limit', len(hits))
+        results = [
+            {'type': result_type, 'score': round(score, 4), 'item': data}
+            for score, result_type, data in hits[:limit]
+        ]
+        return Response({'query': query, 'counts': counts, 'results': results})
+
+
+class AutocompleteView(APIView):
+    """
+    GET /api/search/autocomplete/?q=<prefix>&limit=<n>
+
+    Returns up to `limit` (default 10) completions from action titles,
+    education titles and keywords, answered from in-memory sorted prefix
+    arrays. Completions matching the start of a title come first.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        limit = _int_param(request.query_params, 'limit', DEFAULT_CORPUS_LIMIT)
+
+        candidates = []
+        for result_type, index in COMPLETIONS.items():
+            for pk, text, pos in index.complete(query, limit=limit):
+                candidates.append((pos, len(text), result_type, pk, text))
+        candidates.sort(key=lambda c: c[:2])
+
+        results = []
+        seen = set()
+        for _, _, result_type, pk, text in candidates:
+            # the same keyword is often listed under several targets
+            if (result_type, text.casefold()) in seen:
+                continue
+            seen.add((result_type, text.casefold()))
+            results.append({'type': result_type, 'id': pk, 'text': text})
+            if len(results) >= limit:
+                break
+        return Response({'query': query, 'results': results})
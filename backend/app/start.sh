@@ -2,4 +2,9 @@
 
 cd /backend/app
 python manage.py migrate --fake-initial
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+# rebuild the chatbot retrieval index from the current tables (fails harmlessly on an empty database)
+python manage.py build_chatbot_index
+# Google Docs jobs run in a background worker, restarted if it exits
+(while true; do python manage.py run_google_docs_worker; sleep 5; done) &
+# served over ASGI so the streaming chat endpoint holds no thread per open stream
+exec uvicorn _config.asgi:application --host 0.0.0.0 --port 8000
\ No newline at end of file